@@ -1,11 +1,58 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
-from .models import PersonalDetails, FamilyDetails, NomineeDetails, AccountDetails
+from django.db import transaction
+from django.utils import timezone
+from .forms import BlindIndexUniqueMixin
+from .pagination import EstimatedCountPaginator
+from . import customers, ids, search, stats
+from .models import PersonalDetails, FamilyDetails, NomineeDetails, AccountDetails, InterestRate, MaturityRun, DuplicateMatch, Job, AuditEntry
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist settings for the customer tables, which hold the whole book:
+    page counts come from EstimatedCountPaginator instead of COUNT(*) over
+    the table, and the search box goes through the customer search-token
+    index (prefix match on names, account number, CIF ID and mobile; exact email)
+    rather than leading-wildcard LIKEs across joins. ``customer_lookup``
+    is the path from the listed model to PersonalDetails.
+    """
+    customer_lookup = 'personal_details'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_help_text = 'Prefix of the customer name, account number, CIF ID or mobile number, or their exact email'
+
+    def customer_field(self, name):
+        return name if self.customer_lookup == 'pk' else f'{self.customer_lookup}__{name}'
+
+    def get_search_results(self, request, queryset, search_term):
+        if '@' in search_term:
+            # Emails are unique: one indexed equality lookup
+            return queryset.filter(**{self.customer_field('email_id'): search_term.strip()}), False
+        ranked = search.ranked_query(search_term, limit=getattr(settings, 'ADMIN_SEARCH_LIMIT', 1000))
+        if ranked is None:
+            return queryset, False
+        return queryset.filter(**{self.customer_field('pk__in'): [pk for pk, _ in ranked]}), False
+
+def set_account_flags(queryset, **changes):
+    """Bulk-set account flags with one UPDATE, keeping the dashboard rollup and customer cache current"""
+    with transaction.atomic():
+        customers.invalidate_customers(queryset.values_list('personal_details_id', flat=True))
+        return stats.update_accounts(queryset, **changes)
+
+class PersonalDetailsAdminForm(BlindIndexUniqueMixin, forms.ModelForm):
+    class Meta:
+        model = PersonalDetails
+        fields = '__all__'
 
 @admin.register(PersonalDetails)
-class PersonalDetailsAdmin(admin.ModelAdmin):
+class PersonalDetailsAdmin(LargeTableAdmin):
+    form = PersonalDetailsAdminForm
+    customer_lookup = 'pk'
+    search_fields = [*search.SEARCH_FIELDS, 'email_id']
     list_display = ['first_name', 'last_name', 'account_number', 'mobile_number', 'email_id', 'created_at']
     list_filter = ['gender', 'created_at']
-    search_fields = ['first_name', 'last_name', 'account_number', 'mobile_number', 'email_id']
+    actions = ['approve_accounts', 'activate_accounts']
     readonly_fields = ['leg_number', 'account_number', 'cif_id', 'asacass_number', 'created_at', 'updated_at']
     fieldsets = (
         ('Personal Information', {
@@ -30,24 +77,114 @@ class PersonalDetailsAdmin(admin.ModelAdmin):
         }),
     )
 
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        if object_id is None and request.method == 'POST':
+            # The admin saves inside a transaction, so reserve the new customer's IDs first
+            ids.reserve_ids(1)
+        return super().changeform_view(request, object_id, form_url, extra_context)
+
+    @admin.action(description="Approve the selected customers' accounts")
+    def approve_accounts(self, request, queryset):
+        count = set_account_flags(AccountDetails.objects.filter(personal_details__in=queryset), is_approved=True)
+        self.message_user(request, f'{count} accounts approved.')
+
+    @admin.action(description="Activate the selected customers' accounts")
+    def activate_accounts(self, request, queryset):
+        count = set_account_flags(AccountDetails.objects.filter(personal_details__in=queryset), is_active=True)
+        self.message_user(request, f'{count} accounts activated.')
+
 @admin.register(FamilyDetails)
-class FamilyDetailsAdmin(admin.ModelAdmin):
+class FamilyDetailsAdmin(LargeTableAdmin):
     list_display = ['personal_details', 'father_name', 'mother_name', 'emergency_contact_name']
     list_filter = ['created_at']
-    search_fields = ['personal_details__first_name', 'personal_details__last_name', 'father_name', 'mother_name']
+    search_fields = [f'personal_details__{field}' for field in (*search.SEARCH_FIELDS, 'email_id')]
+    list_select_related = ['personal_details']
+    raw_id_fields = ['personal_details']
     readonly_fields = ['created_at', 'updated_at']
 
 @admin.register(NomineeDetails)
-class NomineeDetailsAdmin(admin.ModelAdmin):
+class NomineeDetailsAdmin(LargeTableAdmin):
     list_display = ['personal_details', 'nominee_name', 'nominee_relation', 'nominee_mobile_number']
     list_filter = ['nominee_relation', 'created_at']
-    search_fields = ['personal_details__first_name', 'personal_details__last_name', 'nominee_name']
+    search_fields = [f'personal_details__{field}' for field in (*search.SEARCH_FIELDS, 'email_id')]
+    list_select_related = ['personal_details']
+    raw_id_fields = ['personal_details']
     readonly_fields = ['created_at', 'updated_at']
 
 @admin.register(AccountDetails)
-class AccountDetailsAdmin(admin.ModelAdmin):
+class AccountDetailsAdmin(LargeTableAdmin):
     list_display = ['personal_details', 'account_type', 'scheme_type', 'deposit_amount', 'current_balance', 'is_active', 'is_approved']
     list_filter = ['account_type', 'scheme_type', 'is_active', 'is_approved', 'date_of_opening']
-    search_fields = ['personal_details__first_name', 'personal_details__last_name', 'personal_details__account_number']
+    search_fields = [f'personal_details__{field}' for field in (*search.SEARCH_FIELDS, 'email_id')]
+    list_select_related = ['personal_details']
+    raw_id_fields = ['personal_details']
     readonly_fields = ['date_of_opening', 'created_at', 'updated_at']
     list_editable = ['is_active', 'is_approved']
+    actions = ['approve', 'activate', 'deactivate']
+
+    @admin.action(description='Approve selected accounts')
+    def approve(self, request, queryset):
+        self.message_user(request, f'{set_account_flags(queryset, is_approved=True)} accounts approved.')
+
+    @admin.action(description='Activate selected accounts')
+    def activate(self, request, queryset):
+        self.message_user(request, f'{set_account_flags(queryset, is_active=True)} accounts activated.')
+
+    @admin.action(description='Deactivate selected accounts')
+    def deactivate(self, request, queryset):
+        self.message_user(request, f'{set_account_flags(queryset, is_active=False)} accounts deactivated.')
+
+@admin.register(InterestRate)
+class InterestRateAdmin(admin.ModelAdmin):
+    list_display = ['account_type', 'scheme_type', 'rate']
+    list_filter = ['account_type', 'scheme_type']
+    list_editable = ['rate']
+
+@admin.register(MaturityRun)
+class MaturityRunAdmin(admin.ModelAdmin):
+    list_display = ['as_of', 'worker', 'processed', 'batches', 'credited', 'elapsed_seconds', 'accounts_per_sec', 'finished_at']
+    list_filter = ['as_of']
+    readonly_fields = [f.name for f in MaturityRun._meta.fields]
+
+@admin.register(DuplicateMatch)
+class DuplicateMatchAdmin(admin.ModelAdmin):
+    list_display = ['customer', 'duplicate_of', 'score', 'reasons', 'source', 'status', 'created_at']
+    list_filter = ['status', 'source']
+    list_editable = ['status']
+    list_select_related = ['customer', 'duplicate_of']
+    raw_id_fields = ['customer', 'duplicate_of']
+    ordering = ['-score']
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'name']
+    readonly_fields = [f.name for f in Job._meta.fields]
+    ordering = ['-id']
+    actions = ['retry_jobs']
+
+    @admin.action(description='Queue selected jobs to run again now')
+    def retry_jobs(self, request, queryset):
+        count = queryset.exclude(status='RUNNING').update(status='QUEUED', run_at=timezone.now(), attempts=0)
+        self.message_user(request, f'{count} jobs queued.')
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+    """Read-only: the trail is only ever appended to by accounts.audit"""
+    list_display = ['changed_at', 'personal_id', 'model', 'object_id', 'action', 'field', 'old_value', 'new_value', 'changed_by']
+    list_filter = ['model', 'action']
+    # Ids follow write order, so the primary key serves this without a sort
+    ordering = ['-id']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    search_fields = ['=personal_id']
+    search_help_text = 'Customer ID'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,96 @@
+"""
+Async JSON API for typeahead search, customer lookup, pincode autofill and
+dashboard stats.
+
+These views use the async ORM and cache APIs, so under an ASGI server
+(``bank_system.asgi:application``) one process can keep many concurrent
+polling and typeahead requests in flight instead of tying up a sync worker
+per call. Under WSGI they still work, one request at a time.
+"""
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import Http404, JsonResponse
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_GET
+
+from .encryption import VIEW_IDENTITY_PERMISSION, BlindIndexField, EncryptedCharField, mask
+from .models import PersonalDetails
+from . import customers, pincodes, search, stats
+
+MAX_SEARCH_RESULTS = 50
+
+
+def _fields(instance, unmasked=False):
+    if instance is None:
+        return None
+    values = {}
+    for field in instance._meta.concrete_fields:
+        # Blind indexes are keyed hashes of identity numbers, matchable across systems: never sent out
+        if isinstance(field, BlindIndexField):
+            continue
+        value = getattr(instance, field.attname)
+        if isinstance(field, EncryptedCharField) and not unmasked:
+            value = mask(value)
+        values[field.attname] = value
+    return values
+
+
+def search_result(customer, score):
+    """One typeahead hit, in the same shape as views.search_accounts returns"""
+    return {
+        'id': customer.id,
+        'name': f"{customer.first_name} {customer.last_name}",
+        'account_number': customer.account_number,
+        'cif_id': customer.cif_id,
+        'mobile': customer.mobile_number,
+        'score': score,
+    }
+
+
+@require_GET
+async def api_search(request):
+    """GET /api/search/?q=<term>[&limit=10] -> ranked matches"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 10)), 1), MAX_SEARCH_RESULTS)
+    except ValueError:
+        return JsonResponse({'error': 'limit must be a number.'}, status=400)
+    hits = await search.asearch(request.GET.get('q', ''), limit=limit)
+    return JsonResponse({'results': [search_result(customer, score) for customer, score in hits]})
+
+
+def serialize_customer(aggregate, unmasked=False):
+    """
+    A customer aggregate (see customers.get_customer) as plain column dicts,
+    with Aadhaar/PAN numbers cut to their last four digits unless ``unmasked``
+    """
+    return {name: _fields(instance, unmasked) for name, instance in aggregate.items()}
+
+
+@staff_member_required
+@require_GET
+async def api_customer(request, personal_id):
+    """GET /api/customers/<id>/ -> the customer with family, nominee and account details (staff only)"""
+    try:
+        aggregate = await customers.aget_customer(personal_id)
+    except PersonalDetails.DoesNotExist:
+        return JsonResponse({'error': 'No customer matches the given query.'}, status=404)
+    user = await request.auser()
+    return JsonResponse(serialize_customer(aggregate, unmasked=await user.ahas_perm(VIEW_IDENTITY_PERMISSION)))
+
+
+@require_GET
+@cache_control(max_age=86400)
+async def api_pincode(request, pincode):
+    """GET /api/pincodes/<pincode>/ -> the pincode's district (as city) and state, from memory"""
+    entry = pincodes.get_directory().lookup(pincode)
+    if entry is None:
+        raise Http404('Unknown pincode.')
+    city, state = entry
+    return JsonResponse({'pincode': pincode, 'city': city, 'state': state})
+
+
+@require_GET
+async def api_stats(request):
+    """GET /api/stats/ -> the dashboard rollup by dimension"""
+    rollup = await stats.aread()
+    return JsonResponse({dimension: dict(sorted(rows.items())) for dimension, rows in rollup.items()})
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AccountsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'accounts'
+
+    def ready(self):
+        # metrics installs its query timer on every new database connection; tasks registers the job handlers
+        from . import metrics, pincodes, signals, tasks  # noqa: F401
+
+        # Expand the pincode directory once per process, before the first request needs it
+        pincodes.get_directory()
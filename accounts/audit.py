@@ -0,0 +1,333 @@
+"""
+Write-behind audit trail of customer record changes.
+
+Saving a PersonalDetails, FamilyDetails, NomineeDetails or AccountDetails
+row (edit pages, admin, batch API, and the bulk writes of the importer and
+the admin actions) records one AuditEntry per changed
+field, with the old and new value, the user and the time. Entries are not
+written with the change: once its transaction commits they go into an
+in-process buffer that a background thread writes with one bulk_create
+every AUDIT_FLUSH_INTERVAL seconds, or sooner once AUDIT_BATCH_SIZE are
+waiting, so an edit costs one extra indexed SELECT rather than an INSERT
+per field.
+
+Whatever is still buffered is written when the process exits (atexit, and
+gunicorn's worker_exit hook). Entries that cannot be written, then or
+during a database outage, are spooled as NDJSON under AUDIT_SPOOL_DIR and
+loaded by the next successful flush of any process. Only a hard kill
+(SIGKILL, power loss) can lose the last interval's entries; set
+AUDIT_WRITE_BEHIND=false to write them in the change's own transaction
+instead.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+from contextvars import ContextVar
+from datetime import date, datetime
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import close_old_connections, models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .encryption import BlindIndexField, EncryptedCharField, mask
+from .models import AuditEntry, PersonalDetails
+from .pagination import decode_cursor, encode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Bookkeeping columns that change on every save
+SKIPPED_FIELDS = {'id', 'personal_details', 'created_at', 'updated_at'}
+
+# The request being handled, for the user to credit changes to
+current_request = ContextVar('audit_request', default=None)
+
+
+def is_write_behind():
+    return getattr(settings, 'AUDIT_WRITE_BEHIND', True)
+
+
+def batch_size():
+    return getattr(settings, 'AUDIT_BATCH_SIZE', 500)
+
+
+def flush_interval():
+    return getattr(settings, 'AUDIT_FLUSH_INTERVAL', 1.0)
+
+
+def spool_dir():
+    return getattr(settings, 'AUDIT_SPOOL_DIR', os.path.join(settings.BASE_DIR, '.cache', 'audit-spool'))
+
+
+def audited_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if field.name not in SKIPPED_FIELDS and not isinstance(field, BlindIndexField)
+    ]
+
+
+def snapshot(instance):
+    """{attname: value} of the audited fields as they are on the instance"""
+    return {field.attname: getattr(instance, field.attname) for field in audited_fields(type(instance))}
+
+
+def stored_snapshot(instance):
+    """The audited fields of the instance's saved row, or None for a new one"""
+    if instance.pk is None:
+        return None
+    names = [field.attname for field in audited_fields(type(instance))]
+    return type(instance)._default_manager.filter(pk=instance.pk).values(*names).first()
+
+
+def _text(field, value):
+    if value is None or value == '':
+        return value
+    if isinstance(field, EncryptedCharField):
+        # Identity numbers stay encrypted at rest: only their last digits go in the trail
+        return mask(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def changed_by():
+    request = current_request.get()
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return ''
+    return user.get_username()
+
+
+def diff(instance, before, only=None):
+    """
+    Unsaved AuditEntry rows for the fields of ``instance`` that differ from
+    ``before`` (a snapshot; None when the row is new), limited to the field
+    names in ``only`` when given.
+    """
+    model = type(instance)
+    personal_id = instance.pk if model is PersonalDetails else instance.personal_details_id
+    action = 'UPDATE' if before is not None else 'CREATE'
+    now = timezone.now()
+    user = changed_by()
+    entries = []
+    for field in audited_fields(model):
+        if only is not None and field.name not in only:
+            continue
+        old = before.get(field.attname) if before is not None else None
+        new = getattr(instance, field.attname)
+        if old == new or (before is None and new in (None, '')):
+            continue
+        entries.append(AuditEntry(
+            personal_id=personal_id, model=model.__name__, object_id=instance.pk, action=action,
+            field=field.name, old_value=_text(field, old), new_value=_text(field, new),
+            changed_by=user, changed_at=now,
+        ))
+    return entries
+
+
+def record(entries):
+    """Queue entries for writing once the current transaction commits (rolled-back changes leave no trail)"""
+    if not entries:
+        return
+    if not is_write_behind():
+        AuditEntry.objects.bulk_create(entries)
+        return
+    transaction.on_commit(lambda: buffer.add(entries))
+
+
+def record_changes(instances):
+    """Audit instances written without save() (bulk_update), against their ``_audit_before`` snapshots"""
+    record([entry for instance in instances for entry in diff(instance, getattr(instance, '_audit_before', None))])
+
+
+def record_update(queryset, **changes):
+    """
+    Audit a ``queryset.update(**changes)`` about to run in this transaction:
+    the changed columns of its rows are read (and locked) first, and every
+    row and field the update alters gets an UPDATE entry.
+    """
+    model = queryset.model
+    fields = [field for field in audited_fields(model) if field.name in changes]
+    if not fields:
+        return
+    customer = 'pk' if model is PersonalDetails else 'personal_details_id'
+    rows = queryset.select_for_update().order_by('pk').values('pk', customer, *[field.attname for field in fields])
+    now = timezone.now()
+    user = changed_by()
+    entries = []
+    for row in rows:
+        for field in fields:
+            old, new = row[field.attname], changes[field.name]
+            if old == new:
+                continue
+            entries.append(AuditEntry(
+                personal_id=row[customer], model=model.__name__, object_id=row['pk'], action='UPDATE',
+                field=field.name, old_value=_text(field, old), new_value=_text(field, new),
+                changed_by=user, changed_at=now,
+            ))
+    record(entries)
+
+
+class AuditBuffer:
+    """Entries waiting to be written, and the thread that writes them"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = []
+        self.pid = None
+        self.wake = threading.Event()
+        self.check_spool = True
+
+    def add(self, entries):
+        with self.lock:
+            if self.pid != os.getpid():
+                # First entry in this process (or in a worker forked after the parent buffered some)
+                self.pid = os.getpid()
+                self.entries = []
+                self.check_spool = True
+                threading.Thread(target=self.run, name='audit-writer', daemon=True).start()
+            self.entries.extend(entries)
+            full = len(self.entries) >= batch_size()
+        if full:
+            self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.wait(flush_interval())
+            self.wake.clear()
+            close_old_connections()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Audit flush failed')
+
+    def flush(self):
+        """Write the buffered entries (and any spooled ones); returns how many were written"""
+        with self.lock:
+            entries, self.entries = self.entries, []
+        written = 0
+        if entries:
+            try:
+                AuditEntry.objects.bulk_create(entries, batch_size=batch_size())
+                written = len(entries)
+            except Exception:
+                logger.exception('Could not write %s audit entries; spooling them to %s', len(entries), spool_dir())
+                spool(entries)
+                self.check_spool = True
+                return 0
+        if self.check_spool:
+            self.check_spool = False
+            try:
+                written += replay_spool()
+            except Exception:
+                self.check_spool = True
+                raise
+        return written
+
+
+buffer = AuditBuffer()
+
+
+def flush():
+    """Write this process's buffered entries now"""
+    return buffer.flush()
+
+
+def spool(entries):
+    """Append entries to this process's spool file, fsynced, for a later flush to load"""
+    os.makedirs(spool_dir(), exist_ok=True)
+    path = os.path.join(spool_dir(), f'audit-{os.getpid()}.ndjson')
+    names = [field.attname for field in AuditEntry._meta.concrete_fields if field.name != 'id']
+    with open(path, 'a') as handle:
+        for entry in entries:
+            handle.write(json.dumps({name: getattr(entry, name) for name in names}, cls=DjangoJSONEncoder) + '\n')
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+def replay_spool():
+    """Write the spooled entries of every process; returns how many were written"""
+    written = 0
+    for path in glob.glob(os.path.join(spool_dir(), 'audit-*.ndjson')):
+        # Renaming claims the file, so two processes never load the same one
+        claimed = f'{path}.{os.getpid()}.loading'
+        try:
+            os.rename(path, claimed)
+        except OSError:
+            continue
+        with open(claimed) as handle:
+            rows = [json.loads(line) for line in handle if line.strip()]
+        for row in rows:
+            row['changed_at'] = parse_datetime(row['changed_at'])
+        try:
+            AuditEntry.objects.bulk_create([AuditEntry(**row) for row in rows], batch_size=batch_size())
+        except Exception:
+            os.rename(claimed, path)
+            raise
+        os.unlink(claimed)
+        written += len(rows)
+    return written
+
+
+@atexit.register
+def shutdown():
+    """Write what is buffered before the process exits; spooled if the database is unavailable"""
+    if buffer.pid == os.getpid() and buffer.entries:
+        buffer.flush()
+
+
+def history(personal_id, cursor=None, limit=50):
+    """
+    A customer's audit entries newest-first, one page at a time: returns
+    (entries, next_cursor), seeking on (changed_at, id) through the
+    audit_customer_time_idx index. This process's buffer is flushed first,
+    so its own recent changes are included; other processes' show up
+    within AUDIT_FLUSH_INTERVAL.
+    """
+    flush()
+    queryset = AuditEntry.objects.filter(personal_id=personal_id).order_by('-changed_at', '-id')
+    position = decode_cursor(cursor)
+    if position:
+        changed_at, pk = position
+        queryset = queryset.filter(
+            models.Q(changed_at__lt=changed_at) | models.Q(changed_at=changed_at, id__lt=pk)
+        )
+    entries = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1].changed_at, entries[-1].pk)
+    return entries, next_cursor
+
+
+class AuditUserMiddleware:
+    """Make the request available to the audit trail, to credit changes to its user"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_request.reset(token)
@@ -0,0 +1,277 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.utils import timezone
+
+from .forms import PersonalDetailsForm, FamilyDetailsForm, NomineeDetailsForm, AccountDetailsForm
+from .models import PersonalDetails, FamilyDetails, NomineeDetails, AccountDetails
+from . import audit, customers, dedup, encryption, search, stats
+from .importer import UNIQUE_FIELDS
+
+# Updatable sections of a customer as (key, attribute on the aggregate, model, form); the
+# forms decide which columns each section accepts, the same ones the edit pages allow
+SECTIONS = [
+    ('personal', 'personal_detail', PersonalDetails, PersonalDetailsForm),
+    ('family', 'family_detail', FamilyDetails, FamilyDetailsForm),
+    ('nominee', 'nominee_detail', NomineeDetails, NomineeDetailsForm),
+    ('account', 'account_detail', AccountDetails, AccountDetailsForm),
+]
+
+
+def max_items():
+    return getattr(settings, 'BATCH_API_MAX_ITEMS', 500)
+
+
+def load_customers(ids=(), account_numbers=()):
+    """Customers matching any of the ids or account numbers, with their details, in one joined query"""
+    ids = list(ids)
+    account_numbers = list(account_numbers)
+    if not ids and not account_numbers:
+        return []
+    return list(
+        PersonalDetails.objects.select_related(*customers.RELATED)
+        .filter(models.Q(pk__in=ids) | models.Q(account_number__in=account_numbers))
+    )
+
+
+def fetch(ids=(), account_numbers=()):
+    """
+    Look up a batch of customers. Returns one result per requested key, in
+    request order: ``{'id': ...}`` or ``{'account_number': ...}`` plus either
+    ``customer`` (the aggregate from customers.load_customer) or ``error``.
+    """
+    found = load_customers(ids, account_numbers)
+    by_id = {personal.pk: personal for personal in found}
+    by_number = {personal.account_number: personal for personal in found}
+
+    results = []
+    for key, values, index in (('id', ids, by_id), ('account_number', account_numbers, by_number)):
+        for value in values:
+            personal = index.get(value)
+            if personal is None:
+                results.append({key: value, 'error': 'Customer not found.'})
+            else:
+                results.append({key: value, 'customer': customers.build_aggregate(personal)})
+    return results
+
+
+def clean_section(instance, form_class, data):
+    """
+    Apply a partial update to one model instance in place, validating only
+    the given fields with the form's field rules and the model's own
+    validation. Returns (changed field names, errors by field).
+    """
+    fields = form_class.base_fields
+    errors = {name: ['Unknown or read-only field.'] for name in data if name not in fields}
+    changed = []
+    for name, value in data.items():
+        if name in errors:
+            continue
+        field = fields[name]
+        try:
+            value = field.clean(field.widget.value_from_datadict({name: value}, {}, name))
+        except ValidationError as exc:
+            errors[name] = list(exc.messages)
+            continue
+        if getattr(instance, name) != value:
+            setattr(instance, name, value)
+            changed.append(name)
+
+    exclude = {f.name for f in instance._meta.fields if f.name not in changed}
+    try:
+        instance.full_clean(exclude=exclude, validate_unique=False, validate_constraints=False)
+    except ValidationError as exc:
+        for name, messages in exc.message_dict.items():
+            errors.setdefault(name, []).extend(messages)
+    return changed, errors
+
+
+def _find_taken(personals_by_field):
+    """Owners of the wanted unique values, as {(field, value): {pk, ...}}, from one query"""
+    stored = {}
+    for field, values in personals_by_field.items():
+        for value in values:
+            # Encrypted fields are matched through their blind index column
+            column, stored_value = encryption.lookup(PersonalDetails, field, value)
+            stored[(column, stored_value)] = (field, value)
+    if not stored:
+        return {}
+    columns = {column for column, _ in stored}
+    query = models.Q()
+    for column in columns:
+        query |= models.Q(**{f'{column}__in': [value for name, value in stored if name == column]})
+    taken = {}
+    for row in PersonalDetails.objects.filter(query).values('pk', *columns):
+        for column in columns:
+            key = stored.get((column, row[column]))
+            if key is not None:
+                taken.setdefault(key, set()).add(row['pk'])
+    return taken
+
+
+def update(items):
+    """
+    Apply a batch of partial updates. Each item names a customer by ``id`` or
+    ``account_number`` and carries any of the ``personal``, ``family``,
+    ``nominee`` and ``account`` sections as {field: value}.
+
+    Items are validated independently and every item gets its own result
+    (``updated``, ``unchanged``, ``not_found`` or ``invalid`` with errors).
+    The valid items are then written together in one transaction (see
+    ``_write``); since bulk_update skips signals the search index,
+    dashboard rollup, customer cache and audit trail are updated here.
+    """
+    results = [{'index': index} for index in range(len(items))]
+    ids = []
+    account_numbers = []
+    for result, item in zip(results, items):
+        if not isinstance(item, dict):
+            result.update(status='invalid', errors={'__all__': ['Item must be an object.']})
+        elif item.get('id') is not None:
+            result['id'] = item['id']
+            if not isinstance(item['id'], int):
+                result.update(status='invalid', errors={'id': ['Must be an integer.']})
+                continue
+            ids.append(item['id'])
+        elif item.get('account_number'):
+            result['account_number'] = item['account_number']
+            account_numbers.append(item['account_number'])
+        else:
+            result.update(status='invalid', errors={'__all__': ['Give an "id" or "account_number".']})
+
+    found = load_customers(ids, account_numbers)
+    by_id = {personal.pk: personal for personal in found}
+    by_number = {personal.account_number: personal for personal in found}
+
+    pending = []
+    claimed = {}
+    for result, item in zip(results, items):
+        if 'status' in result:
+            continue
+        personal = by_id.get(item.get('id')) if 'id' in result else by_number.get(item['account_number'])
+        if personal is None:
+            result['status'] = 'not_found'
+            continue
+        result['id'] = personal.pk
+        if personal.pk in claimed:
+            result.update(status='invalid', errors={'__all__': [f"Customer is also updated by item {claimed[personal.pk]}."]})
+            continue
+        claimed[personal.pk] = result['index']
+
+        aggregate = customers.build_aggregate(personal)
+        changes = {}
+        errors = {}
+        for key, attribute, model, form_class in SECTIONS:
+            data = item.get(key)
+            if data is None:
+                continue
+            instance = aggregate[attribute]
+            if not isinstance(data, dict):
+                errors[key] = {'__all__': ['Section must be an object.']}
+            elif instance is None:
+                errors[key] = {'__all__': [f'Customer has no {model._meta.verbose_name_plural.lower()}.']}
+            else:
+                changed, section_errors = clean_section(instance, form_class, data)
+                if section_errors:
+                    errors[key] = section_errors
+                elif changed:
+                    changes[model] = (instance, changed)
+        if errors:
+            result.update(status='invalid', errors=errors)
+        elif changes:
+            pending.append((result, personal, changes))
+        else:
+            result['status'] = 'unchanged'
+
+    _check_unique(pending)
+    written = [(result, personal, changes) for result, personal, changes in pending if 'status' not in result]
+    _write(written)
+    for result, _, _ in written:
+        result.setdefault('status', 'updated')
+    return results
+
+
+def _check_unique(pending):
+    """Mark items invalid whose new unique values clash with another customer or another item"""
+    wanted = {}
+    for result, personal, changes in pending:
+        _, changed = changes.get(PersonalDetails, (None, []))
+        for field in set(changed) & set(UNIQUE_FIELDS):
+            wanted.setdefault(field, {}).setdefault(getattr(personal, field), []).append((result, personal))
+    taken = _find_taken({field: values.keys() for field, values in wanted.items()})
+
+    for field, values in wanted.items():
+        for value, claimants in values.items():
+            for result, personal in claimants:
+                others = taken.get((field, value), set()) - {personal.pk}
+                if others or len(claimants) > 1:
+                    result['status'] = 'invalid'
+                    result.setdefault('errors', {}).setdefault('personal', {})[field] = [
+                        f'Another customer already has this {PersonalDetails._meta.get_field(field).verbose_name}.'
+                    ]
+
+
+def _write(written):
+    """
+    Write the valid items in one transaction. Their rows are reloaded under
+    select_for_update and only each item's own changed fields are copied
+    onto them, then saved with one bulk_update per distinct set of fields,
+    so a column another request changed since the rows were first read is
+    never written back with the stale value. Items whose rows have been
+    deleted meanwhile are marked ``not_found``.
+    """
+    if not written:
+        return
+    pks = {}
+    for _, _, changes in written:
+        for model, (instance, _) in changes.items():
+            pks.setdefault(model, []).append(instance.pk)
+
+    now = timezone.now()
+    groups = {}
+    with transaction.atomic():
+        # Lock model by model in a fixed order, rows in pk order, so concurrent batches cannot deadlock
+        locked = {
+            model: model.objects.select_for_update().order_by('pk').in_bulk(pks[model])
+            for _, _, model, _ in SECTIONS if model in pks
+        }
+        for result, _, changes in written:
+            if any(instance.pk not in locked[model] for model, (instance, _) in changes.items()):
+                result['status'] = 'not_found'
+                continue
+            for model, (instance, changed) in changes.items():
+                row = locked[model][instance.pk]
+                row._audit_before = audit.snapshot(row)
+                if model is AccountDetails:
+                    row._stats_before = stats.account_values(row)
+                for name in changed:
+                    setattr(row, name, getattr(instance, name))
+                fields = {*changed, *encryption.refresh_blind_indexes(row, changed), 'updated_at'}
+                if model is AccountDetails:
+                    row.set_maturity_date()
+                    fields.add('maturity_date')
+                # bulk_update does not apply auto_now
+                row.updated_at = now
+                groups.setdefault((model, tuple(sorted(fields))), []).append(row)
+
+        reindex, rekey, accounts, rows = [], [], [], []
+        for (model, fields), instances in groups.items():
+            model.objects.bulk_update(instances, fields, batch_size=500)
+            rows.extend(instances)
+            if model is PersonalDetails:
+                if set(fields) & set(search.SEARCH_FIELDS):
+                    reindex.extend(instances)
+                if set(fields) & dedup.KEY_FIELDS:
+                    rekey.extend(instances)
+            elif model is AccountDetails:
+                accounts.extend(instances)
+
+        search.index_customers(reindex)
+        dedup.index_customers(rekey)
+        if accounts:
+            stats.record_account_changes(
+                [account._stats_before for account in accounts],
+                [stats.account_values(account) for account in accounts],
+            )
+        customers.invalidate_customers([personal.pk for result, personal, _ in written if 'status' not in result])
+        audit.record_changes(rows)
@@ -0,0 +1,132 @@
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import PersonalDetails, AccountDetails
+
+# Bump when the shape of the cached aggregate changes so old entries are ignored
+AGGREGATE_FORMAT = 1
+RELATED = ['family_details', 'nominee_details', 'account_details']
+# The alias Django's {% cache %} tag stores fragments in
+FRAGMENT_CACHE_ALIAS = 'template_fragments'
+
+
+def get_cache():
+    return caches[getattr(settings, 'CUSTOMER_CACHE_ALIAS', 'customers')]
+
+
+def _version_key(personal_id):
+    return f'customer-version:{personal_id}'
+
+
+def _aggregate_key(personal_id, version):
+    return f'customer:{AGGREGATE_FORMAT}:{personal_id}:{version}'
+
+
+def customer_version(personal_id):
+    """
+    Current cache version of a customer. Missing versions start from the
+    clock rather than 1, so an evicted counter can never line up with
+    entries written under an earlier version.
+    """
+    cache = get_cache()
+    key = _version_key(personal_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+async def acustomer_version(personal_id):
+    cache = get_cache()
+    key = _version_key(personal_id)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key)
+    return version
+
+
+def build_aggregate(personal):
+    """The {personal,family,nominee,account}_detail dict views and the API render"""
+    aggregate = {'personal_detail': personal}
+    for name in RELATED:
+        try:
+            related = getattr(personal, name)
+        except PersonalDetails._meta.get_field(name).related_model.DoesNotExist:
+            related = None
+        aggregate[name.replace('_details', '_detail')] = related
+    return aggregate
+
+
+def load_customer(personal_id):
+    """Customer plus family, nominee and account details in one joined query"""
+    return build_aggregate(PersonalDetails.objects.select_related(*RELATED).get(pk=personal_id))
+
+
+def _cache_options(aggregate):
+    # A replica may not have the write that bumped the version yet, so keep what it returned only briefly
+    if aggregate['personal_detail']._state.db != 'default':
+        return {'timeout': getattr(settings, 'DATABASE_REPLICA_PIN_SECONDS', 10)}
+    return {}
+
+
+def _get_customer(personal_id):
+    cache = get_cache()
+    version = customer_version(personal_id)
+    key = _aggregate_key(personal_id, version)
+    aggregate = cache.get(key)
+    if aggregate is None:
+        aggregate = load_customer(personal_id)
+        cache.set(key, aggregate, **_cache_options(aggregate))
+    return aggregate, version
+
+
+def get_customer(personal_id):
+    """
+    The customer aggregate, served from cache when the stored copy matches
+    the customer's current version. Raises PersonalDetails.DoesNotExist.
+    """
+    return _get_customer(personal_id)[0]
+
+
+def page_context(personal_id):
+    """
+    get_customer() plus what the summary/detail templates key their
+    ``{% cache %}`` fragments on: ``customer_version``, so any change to the
+    customer renders afresh, and ``fragment_timeout``.
+    """
+    aggregate, version = _get_customer(personal_id)
+    timeout = _cache_options(aggregate).get('timeout', caches[FRAGMENT_CACHE_ALIAS].default_timeout)
+    return {**aggregate, 'customer_version': version, 'fragment_timeout': timeout}
+
+
+async def aget_customer(personal_id):
+    """get_customer() for async views, using the async cache and ORM APIs"""
+    cache = get_cache()
+    key = _aggregate_key(personal_id, await acustomer_version(personal_id))
+    aggregate = await cache.aget(key)
+    if aggregate is None:
+        personal = await PersonalDetails.objects.select_related(*RELATED).aget(pk=personal_id)
+        aggregate = build_aggregate(personal)
+        await cache.aset(key, aggregate, **_cache_options(aggregate))
+    return aggregate
+
+
+def invalidate_customers(personal_ids):
+    """Move the given customers to a new version once the current transaction commits"""
+    keys = [_version_key(personal_id) for personal_id in set(personal_ids)]
+    if keys:
+        transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def invalidate_accounts(account_ids):
+    """Invalidate the owners of AccountDetails rows changed by bulk_update"""
+    account_ids = list(account_ids)
+    if account_ids:
+        invalidate_customers(
+            AccountDetails.objects.filter(pk__in=account_ids).values_list('personal_details_id', flat=True)
+        )
@@ -0,0 +1,311 @@
+"""
+Near-duplicate customer detection.
+
+Every customer gets blocking keys in DedupKey: a phonetic code of the name
+plus date of birth, and a hash of the normalized address plus pincode. Two
+customers are only compared when they share a key, so checking an
+applicant costs one indexed query for its block instead of a scan of the
+book. Candidates in a block are scored on name similarity, date of birth,
+address overlap and pincode; pairs at or above DEDUP_THRESHOLD are recorded
+as DuplicateMatch rows for staff review.
+"""
+
+import hashlib
+import multiprocessing
+import re
+import time
+from difflib import SequenceMatcher
+from itertools import combinations
+
+import django
+from django.conf import settings
+from django.db import models, transaction
+
+from .models import PersonalDetails, DedupKey, DuplicateMatch
+
+# Columns needed to build keys and score a pair
+COLUMNS = ['id', 'first_name', 'last_name', 'date_of_birth', 'address1', 'address2', 'pincode']
+KEY_FIELDS = set(COLUMNS) - {'id'}
+WEIGHTS = {'name': 0.50, 'date_of_birth': 0.30, 'address': 0.15, 'pincode': 0.05}
+NAME_MATCH = 0.85
+ADDRESS_MATCH = 0.6
+
+SOUNDEX_CODES = {
+    letter: digit
+    for digit, letters in {'1': 'bfpv', '2': 'cgjkqsxz', '3': 'dt', '4': 'l', '5': 'mn', '6': 'r'}.items()
+    for letter in letters
+}
+# Common transliteration variants of Indian names, folded before comparing (Lakshmi/Laxmi, Jyoti/Jyothi)
+SPELLINGS = [('ksh', 'x'), ('ph', 'f'), ('th', 't'), ('dh', 'd'), ('bh', 'b'), ('ee', 'i'), ('oo', 'u'), ('w', 'v')]
+# Address words that vary between spellings of the same place
+ADDRESS_ALIASES = {
+    'road': 'rd', 'street': 'st', 'nagar': 'ngr', 'apartment': 'apt', 'apartments': 'apt',
+    'flat': '', 'no': '', 'house': '', 'opp': '', 'near': '', 'the': '',
+}
+NON_ALPHA = re.compile(r'[^a-z]+')
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def threshold():
+    return getattr(settings, 'DEDUP_THRESHOLD', 0.75)
+
+
+def max_block_size():
+    return getattr(settings, 'DEDUP_MAX_BLOCK_SIZE', 200)
+
+
+def fold_name(value):
+    value = NON_ALPHA.sub(' ', (value or '').lower()).strip()
+    for spelling, replacement in SPELLINGS:
+        value = value.replace(spelling, replacement)
+    return value
+
+
+def soundex(word):
+    letters = [letter for letter in word if letter in SOUNDEX_CODES or letter in 'aeiouyhw']
+    if not letters:
+        return ''
+    code = letters[0].upper()
+    previous = SOUNDEX_CODES.get(letters[0])
+    for letter in letters[1:]:
+        digit = SOUNDEX_CODES.get(letter)
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if letter not in 'hw':
+            previous = digit
+    return code.ljust(4, '0')
+
+
+def address_tokens(customer):
+    text = f"{customer.address1 or ''} {customer.address2 or ''}".lower()
+    tokens = {ADDRESS_ALIASES.get(token, token) for token in NON_ALNUM.split(text)}
+    tokens.discard('')
+    return tokens
+
+
+def keys_for(customer):
+    """(kind, key) blocking keys of a customer"""
+    keys = []
+    # First given name and last surname only, so middle names and initials don't split a block
+    first, last = fold_name(customer.first_name).split(), fold_name(customer.last_name).split()
+    names = sorted(soundex(part) for part in first[:1] + last[-1:])
+    if names and customer.date_of_birth:
+        # Sorted, so a swapped first/last name lands in the same block
+        keys.append(('name_dob', f"{'-'.join(names)}:{customer.date_of_birth}"))
+    tokens = address_tokens(customer)
+    if tokens and customer.pincode:
+        digest = hashlib.sha1(' '.join(sorted(tokens)).encode()).hexdigest()
+        keys.append(('address', f"{customer.pincode.strip()}:{digest}"))
+    return keys
+
+
+def build_keys(customers, key_model=DedupKey):
+    return [
+        key_model(personal_details_id=customer.pk, kind=kind, key=key)
+        for customer in customers for kind, key in keys_for(customer)
+    ]
+
+
+def index_customers(customers, batch_size=1000):
+    """(Re)build the blocking keys of the given saved customers"""
+    customers = list(customers)
+    if not customers:
+        return 0
+    rows = build_keys(customers)
+    with transaction.atomic():
+        DedupKey.objects.filter(personal_details_id__in=[c.pk for c in customers]).delete()
+        DedupKey.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild_keys(chunk_size=2000, personal_model=PersonalDetails, key_model=DedupKey):
+    """Rebuild every customer's blocking keys, streaming the book in chunks"""
+    key_model.objects.all().delete()
+    total = 0
+    batch = []
+    for customer in personal_model.objects.only(*COLUMNS).order_by('id').iterator(chunk_size=chunk_size):
+        batch.append(customer)
+        if len(batch) >= chunk_size:
+            key_model.objects.bulk_create(build_keys(batch, key_model), batch_size=chunk_size)
+            total += len(batch)
+            batch = []
+    if batch:
+        key_model.objects.bulk_create(build_keys(batch, key_model), batch_size=chunk_size)
+        total += len(batch)
+    return total
+
+
+def compare(a, b):
+    """(score, reasons) for two customers; score is 0..1"""
+    name_a = fold_name(f'{a.first_name} {a.last_name}')
+    name_b = fold_name(f'{b.first_name} {b.last_name}')
+    swapped_a = ' '.join(reversed(name_a.split()))
+    name = max(SequenceMatcher(None, name_a, name_b).ratio(), SequenceMatcher(None, swapped_a, name_b).ratio())
+
+    tokens_a, tokens_b = address_tokens(a), address_tokens(b)
+    address = len(tokens_a & tokens_b) / len(tokens_a | tokens_b) if tokens_a | tokens_b else 0.0
+
+    parts = {
+        'name': name,
+        'date_of_birth': 1.0 if a.date_of_birth and a.date_of_birth == b.date_of_birth else 0.0,
+        'address': address,
+        'pincode': 1.0 if a.pincode and (a.pincode or '').strip() == (b.pincode or '').strip() else 0.0,
+    }
+    score = sum(WEIGHTS[part] * value for part, value in parts.items())
+    reasons = [
+        part for part, value in parts.items()
+        if value >= {'name': NAME_MATCH, 'address': ADDRESS_MATCH}.get(part, 1.0)
+    ]
+    return round(score, 4), reasons
+
+
+def block_condition(blocks, prefix=''):
+    """Q matching DedupKey rows (through ``prefix``) in any of the (kind, key) blocks, one IN list per kind"""
+    keys_by_kind = {}
+    for kind, key in blocks:
+        keys_by_kind.setdefault(kind, []).append(key)
+    condition = models.Q()
+    for kind, keys in keys_by_kind.items():
+        condition |= models.Q(**{f'{prefix}kind': kind, f'{prefix}key__in': keys})
+    return condition
+
+
+def find_candidates(customers):
+    """
+    Existing customers sharing a block with each of ``customers`` (saved or
+    not), scoring at or above the threshold. Returns one list of
+    (other, score, reasons), best first, per customer; all blocks are
+    fetched with one query.
+    """
+    customers = list(customers)
+    wanted = {}
+    for position, customer in enumerate(customers):
+        for kind, key in keys_for(customer):
+            wanted.setdefault((kind, key), []).append(position)
+    found = [{} for _ in customers]
+    if not wanted:
+        return [[] for _ in customers]
+
+    others = PersonalDetails.objects.filter(block_condition(wanted, 'dedup_keys__')).annotate(
+        block_kind=models.F('dedup_keys__kind'), block_key=models.F('dedup_keys__key'),
+    ).only(*COLUMNS)
+
+    for other in others:
+        for position in wanted.get((other.block_kind, other.block_key), []):
+            customer = customers[position]
+            if customer.pk == other.pk or other.pk in found[position]:
+                continue
+            score, reasons = compare(customer, other)
+            if score >= threshold():
+                found[position][other.pk] = (other, score, reasons)
+    return [sorted(matches.values(), key=lambda match: -match[1]) for matches in found]
+
+
+def _pair(a_id, b_id, score, reasons, source):
+    newer, older = max(a_id, b_id), min(a_id, b_id)
+    return DuplicateMatch(customer_id=newer, duplicate_of_id=older, score=score,
+                          reasons=','.join(reasons), source=source)
+
+
+def flag_new_customers(customers):
+    """Onboarding-time check: index the new customers and queue any near-duplicates for review"""
+    customers = list(customers)
+    index_customers(customers)
+    pairs = {}
+    for customer, candidates in zip(customers, find_candidates(customers)):
+        for other, score, reasons in candidates:
+            match = _pair(customer.pk, other.pk, score, reasons, 'ONBOARDING')
+            pairs[(match.customer_id, match.duplicate_of_id)] = match
+    DuplicateMatch.objects.bulk_create(pairs.values(), ignore_conflicts=True)
+    return len(pairs)
+
+
+def duplicate_blocks():
+    """(kind, key) of every block with more than one customer, largest first"""
+    return list(
+        DedupKey.objects.values_list('kind', 'key')
+        .annotate(size=models.Count('id')).filter(size__gt=1).order_by('-size')
+    )
+
+
+def scan_blocks(blocks):
+    """
+    Compare every pair inside each of the given (kind, key) blocks; returns
+    (pairs compared, {(newer, older): (score, reasons)}). Run in a worker
+    process by scan().
+    """
+    members = {}
+    rows = DedupKey.objects.filter(block_condition(blocks)).values_list('kind', 'key', 'personal_details_id')
+    for kind, key, personal_id in rows:
+        members.setdefault((kind, key), []).append(personal_id)
+    customers = PersonalDetails.objects.only(*COLUMNS).in_bulk(
+        {pk for ids in members.values() for pk in ids}
+    )
+
+    compared = 0
+    matches = {}
+    for ids in members.values():
+        for a_id, b_id in combinations(sorted(ids), 2):
+            pair = (b_id, a_id)
+            if pair in matches:
+                continue
+            compared += 1
+            score, reasons = compare(customers[a_id], customers[b_id])
+            if score >= threshold():
+                matches[pair] = (score, reasons)
+    return compared, matches
+
+
+def scan(workers=4, blocks_per_task=200, progress=None):
+    """
+    Full-book batch scan: split the multi-customer blocks across ``workers``
+    processes, compare the pairs inside each block and record new matches.
+    Blocks larger than DEDUP_MAX_BLOCK_SIZE (a shared hostel address, say)
+    are skipped and counted, since comparing them pairwise would dominate
+    the run. Returns a summary dict.
+    """
+    started = time.perf_counter()
+    limit = max_block_size()
+    blocks = duplicate_blocks()
+    skipped = [block for block in blocks if block[2] > limit]
+    tasks = [block[:2] for block in blocks if block[2] <= limit]
+    chunks = [tasks[i:i + blocks_per_task] for i in range(0, len(tasks), blocks_per_task)]
+
+    compared = 0
+    matches = {}
+    if workers > 1 and len(chunks) > 1:
+        # Spawn rather than fork (Linux's default): a forked worker would share this process's
+        # database connections and inherit threads such as the audit writer mid-flight. A spawned
+        # one starts a fresh interpreter, so it sets Django up before unpickling any task
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(workers, initializer=django.setup) as pool:
+            for done, (chunk_compared, chunk_matches) in enumerate(pool.imap_unordered(scan_blocks, chunks), 1):
+                compared += chunk_compared
+                matches.update(chunk_matches)
+                if progress:
+                    progress(done, len(chunks))
+    else:
+        for done, chunk in enumerate(chunks, 1):
+            chunk_compared, chunk_matches = scan_blocks(chunk)
+            compared += chunk_compared
+            matches.update(chunk_matches)
+            if progress:
+                progress(done, len(chunks))
+
+    # Pairs already on record (from onboarding or an earlier scan) keep their review status
+    DuplicateMatch.objects.bulk_create(
+        [_pair(newer, older, score, reasons, 'SCAN') for (newer, older), (score, reasons) in matches.items()],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    elapsed = time.perf_counter() - started
+    return {
+        'blocks': len(tasks),
+        'skipped_blocks': len(skipped),
+        'largest_skipped': skipped[0][2] if skipped else 0,
+        'pairs_compared': compared,
+        'matches': len(matches),
+        'elapsed_seconds': round(elapsed, 3),
+        'pairs_per_sec': round(compared / elapsed, 1) if elapsed else 0.0,
+    }
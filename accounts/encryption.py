@@ -0,0 +1,180 @@
+"""
+Encrypted identity-number columns with HMAC blind indexes.
+
+``EncryptedCharField`` stores a Fernet token instead of the plaintext, so
+the column can no longer be compared or made unique. Each one is paired
+with a ``BlindIndexField`` holding a keyed HMAC of the normalized value:
+equal numbers hash equal, so uniqueness, duplicate checks and lookups by
+Aadhaar/PAN stay single indexed queries on the hash column, while the hash
+alone reveals nothing without BLIND_INDEX_KEY.
+
+Keys come from FIELD_ENCRYPTION_KEYS (newest first; older keys still
+decrypt, see ``encrypt_identity_numbers --rotate``) and BLIND_INDEX_KEY.
+Leaving either unset raises ImproperlyConfigured, except where
+FIELD_ENCRYPTION_DERIVED_KEYS (default: DEBUG) allows keys derived from
+SECRET_KEY, which is fine for development and tests but ties the data to
+that secret.
+"""
+
+import base64
+import hashlib
+import re
+from functools import lru_cache
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import models
+from django.dispatch import receiver
+from django.utils.crypto import salted_hmac
+
+# Every Fernet token starts with its version byte 0x80, i.e. "gAAAAA" in base64;
+# anything else in an encrypted column is a plaintext row not yet migrated
+TOKEN_PREFIX = 'gAAAAA'
+SEPARATORS = re.compile(r'[\s-]+')
+MASK = '****'
+# Held by the staff allowed to see whole Aadhaar/PAN numbers in exports and the API
+VIEW_IDENTITY_PERMISSION = 'accounts.view_identity_numbers'
+
+
+def _derived_key(name):
+    """Stand-in for an unset key setting, where FIELD_ENCRYPTION_DERIVED_KEYS allows one"""
+    if not getattr(settings, 'FIELD_ENCRYPTION_DERIVED_KEYS', settings.DEBUG):
+        raise ImproperlyConfigured(f'Set {name}: keys derived from SECRET_KEY are only used in development.')
+    return settings.SECRET_KEY
+
+
+@lru_cache(maxsize=None)
+def get_fernet():
+    keys = getattr(settings, 'FIELD_ENCRYPTION_KEYS', None)
+    if not keys:
+        secret = _derived_key('FIELD_ENCRYPTION_KEYS')
+        keys = [base64.urlsafe_b64encode(hashlib.sha256(f'{secret}:field-encryption'.encode()).digest())]
+    try:
+        return MultiFernet([Fernet(key) for key in keys])
+    except ValueError as exc:
+        raise ImproperlyConfigured(f'FIELD_ENCRYPTION_KEYS must be Fernet keys: {exc}')
+
+
+@receiver(setting_changed)
+def reset_keys(setting, **kwargs):
+    if setting in ('FIELD_ENCRYPTION_KEYS', 'FIELD_ENCRYPTION_DERIVED_KEYS', 'SECRET_KEY', 'DEBUG'):
+        get_fernet.cache_clear()
+
+
+def encrypt(value):
+    return get_fernet().encrypt(value.encode()).decode()
+
+
+def decrypt(value):
+    if not value.startswith(TOKEN_PREFIX):
+        return value
+    try:
+        return get_fernet().decrypt(value.encode()).decode()
+    except InvalidToken:
+        raise ImproperlyConfigured('An encrypted column could not be decrypted with FIELD_ENCRYPTION_KEYS.')
+
+
+def is_encrypted(value):
+    return bool(value) and value.startswith(TOKEN_PREFIX)
+
+
+def normalize(value):
+    """Aadhaar/PAN as compared for equality: no spaces or hyphens, upper case"""
+    return SEPARATORS.sub('', str(value)).upper()
+
+
+def mask(value):
+    """An identity number cut to its last four characters"""
+    if value in (None, ''):
+        return value
+    return MASK + str(value)[-4:]
+
+
+def blind_index(kind, value):
+    """Keyed hash of a value; the same number gives the same hash for every column of that kind"""
+    if value in (None, ''):
+        return None
+    secret = getattr(settings, 'BLIND_INDEX_KEY', '') or _derived_key('BLIND_INDEX_KEY')
+    return salted_hmac(f'accounts.blind_index.{kind}', normalize(value), secret=secret, algorithm='sha256').hexdigest()
+
+
+class EncryptedCharField(models.CharField):
+    """
+    CharField stored encrypted in a text column. ``max_length`` limits the
+    plaintext. Only ``isnull`` lookups work; query the paired
+    BlindIndexField to find rows by value.
+    """
+
+    def get_internal_type(self):
+        return 'TextField'
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decrypt(value)
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if value in (None, ''):
+            return value
+        return encrypt(value)
+
+    def get_lookup(self, lookup_name):
+        if lookup_name != 'isnull':
+            return None
+        return super().get_lookup(lookup_name)
+
+
+class BlindIndexField(models.CharField):
+    """HMAC of another field's value, filled in on every save and bulk_create"""
+
+    def __init__(self, *args, source=None, kind=None, **kwargs):
+        self.source = source
+        self.kind = kind
+        kwargs.setdefault('max_length', 64)
+        kwargs.setdefault('editable', False)
+        # Null for rows the encryption migration could not index (see encrypt_identity_numbers)
+        kwargs.setdefault('null', True)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.update(source=self.source, kind=self.kind)
+        for key, default in (('max_length', 64), ('editable', False), ('null', True)):
+            if kwargs.get(key) == default:
+                del kwargs[key]
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = blind_index(self.kind, getattr(model_instance, self.source))
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def blind_index_fields(model):
+    return [field for field in model._meta.concrete_fields if isinstance(field, BlindIndexField)]
+
+
+def index_field_for(model, name):
+    """The BlindIndexField paired with field ``name``, or None for ordinary fields"""
+    return next((field for field in blind_index_fields(model) if field.source == name), None)
+
+
+def lookup(model, name, value):
+    """(column, value) to match ``name == value`` with an indexed equality query"""
+    index = index_field_for(model, name)
+    if index is None:
+        return name, value
+    return index.name, blind_index(index.kind, value)
+
+
+def refresh_blind_indexes(instance, names):
+    """Recompute the indexes of changed fields before bulk_update (which skips pre_save); returns their names"""
+    refreshed = []
+    for index in blind_index_fields(type(instance)):
+        if index.source in names:
+            index.pre_save(instance, False)
+            refreshed.append(index.name)
+    return refreshed
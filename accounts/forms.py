@@ -1,7 +1,25 @@
 from django import forms
+from django.utils.text import capfirst
 from .models import PersonalDetails, FamilyDetails, NomineeDetails, AccountDetails
+from . import encryption
 
-class PersonalDetailsForm(forms.ModelForm):
+class BlindIndexUniqueMixin:
+    """
+    ModelForm mixin that enforces uniqueness of encrypted fields, which the
+    database only guarantees through their blind index columns.
+    """
+    def validate_unique(self):
+        super().validate_unique()
+        model = self._meta.model
+        for index in encryption.blind_index_fields(model):
+            if not index.unique or index.source not in self.cleaned_data or self.has_error(index.source):
+                continue
+            value = encryption.blind_index(index.kind, self.cleaned_data[index.source])
+            if value and model._default_manager.filter(**{index.name: value}).exclude(pk=self.instance.pk).exists():
+                label = model._meta.get_field(index.source).verbose_name
+                self.add_error(index.source, f'{capfirst(model._meta.verbose_name)} with this {label} already exists.')
+
+class PersonalDetailsForm(BlindIndexUniqueMixin, forms.ModelForm):
     class Meta:
         model = PersonalDetails
         fields = [
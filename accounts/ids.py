@@ -0,0 +1,164 @@
+import os
+import threading
+import uuid
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Bank-generated ID kinds as field name -> (prefix, digits before the check digit)
+ID_FORMATS = {
+    'leg_number': ('LEG', 10),
+    'account_number': ('ACC', 12),
+    'cif_id': ('CIF', 11),
+    'asacass_number': ('ASA', 15),
+}
+
+
+def luhn_check_digit(number):
+    """Luhn (mod 10) check digit for a string of digits"""
+    total = 0
+    for i, digit in enumerate(reversed(number)):
+        value = int(digit)
+        if i % 2 == 0:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return str((10 - total % 10) % 10)
+
+
+def format_id(kind, value):
+    """Render a sequence value as prefix + zero-padded digits + check digit"""
+    prefix, width = ID_FORMATS[kind]
+    digits = str(value).zfill(width)
+    return f"{prefix}{digits}{luhn_check_digit(digits)}"
+
+
+def is_valid_id(kind, generated_id):
+    """True if ``generated_id`` has the right prefix, length and check digit"""
+    prefix, width = ID_FORMATS[kind]
+    digits = generated_id[len(prefix):]
+    return (
+        generated_id.startswith(prefix) and len(digits) == width + 1 and digits.isdigit()
+        and luhn_check_digit(digits[:-1]) == digits[-1]
+    )
+
+
+class IdAllocator:
+    """Hands out bank-generated IDs; subclass and point ID_ALLOCATOR at it to swap schemes"""
+
+    def allocate(self, kind, count=1):
+        raise NotImplementedError
+
+
+class UUIDIdAllocator(IdAllocator):
+    """The original scheme: random truncated UUIDs, unique only by luck"""
+
+    LENGTHS = {'leg_number': 8, 'account_number': 12, 'cif_id': 10, 'asacass_number': 15}
+
+    def allocate(self, kind, count=1):
+        prefix = ID_FORMATS[kind][0]
+        return [f"{prefix}{str(uuid.uuid4())[:self.LENGTHS[kind]].upper()}" for _ in range(count)]
+
+
+class BlockIdAllocator(IdAllocator):
+    """
+    Sequential IDs reserved in blocks from the IdSequence counter table.
+
+    Each process takes ``block_size`` numbers at a time with one locked
+    counter update and serves IDs from memory until the block runs out, so
+    bulk inserts need no round trip per ID and new keys always append to the
+    end of the unique indexes. Unused numbers are simply skipped, never reused.
+
+    Reservations commit in their own short transaction so the counter row is
+    never held locked for the length of a caller's transaction; code that
+    allocates inside ``transaction.atomic()`` must top up with ``reserve()``
+    before entering it.
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or getattr(settings, 'ID_BLOCK_SIZE', 100)
+        self._lock = threading.Lock()
+        self._blocks = {}
+        self._pid = os.getpid()
+
+    def allocate(self, kind, count=1):
+        return [format_id(kind, value) for value in self.allocate_numbers(kind, count)]
+
+    def allocate_numbers(self, kind, count):
+        numbers = self._take_cached(kind, count)
+        missing = count - len(numbers)
+        if missing:
+            first = self._reserve(kind, missing + self.block_size)
+            numbers.extend(range(first, first + missing))
+            self._release(kind, first + missing, first + missing + self.block_size)
+        return numbers
+
+    def reserve(self, kind, count):
+        """Make sure at least ``count`` numbers are cached; must run outside any transaction"""
+        with self._lock:
+            cached = sum(end - start for start, end in self._blocks.get(kind, []))
+        if cached < count:
+            size = count - cached + self.block_size
+            first = self._reserve(kind, size)
+            self._release(kind, first, first + size)
+
+    def _take_cached(self, kind, count):
+        numbers = []
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker: the parent's blocks are shared with its siblings
+                self._blocks = {}
+                self._pid = os.getpid()
+            blocks = self._blocks.get(kind, [])
+            while blocks and len(numbers) < count:
+                start, end = blocks.pop()
+                take = min(count - len(numbers), end - start)
+                numbers.extend(range(start, start + take))
+                if start + take < end:
+                    blocks.append((start + take, end))
+        return numbers
+
+    def _release(self, kind, start, end):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._blocks.setdefault(kind, []).append((start, end))
+
+    def _reserve(self, kind, size):
+        IdSequence = apps.get_model('accounts', 'IdSequence')
+        # durable: raises RuntimeError rather than lock the counter until an outer commit
+        with transaction.atomic(durable=True):
+            sequence, _ = IdSequence.objects.select_for_update().get_or_create(name=kind)
+            first = sequence.next_value
+            sequence.next_value = first + size
+            sequence.save(update_fields=['next_value'])
+        return first
+
+
+@lru_cache(maxsize=None)
+def get_allocator():
+    """The process-wide allocator configured by ID_ALLOCATOR"""
+    path = getattr(settings, 'ID_ALLOCATOR', 'accounts.ids.BlockIdAllocator')
+    return import_string(path)()
+
+
+def reserve_ids(count):
+    """Top up every ID kind for ``count`` new customers ahead of a transaction that will create them"""
+    allocator = get_allocator()
+    if hasattr(allocator, 'reserve'):
+        for kind in ID_FORMATS:
+            allocator.reserve(kind, count)
+
+
+def assign_ids(personals):
+    """Fill in missing bank-generated IDs on many customers with one allocation per kind"""
+    personals = list(personals)
+    allocator = get_allocator()
+    for kind in ID_FORMATS:
+        missing = [personal for personal in personals if not getattr(personal, kind)]
+        if missing:
+            for personal, generated_id in zip(missing, allocator.allocate(kind, len(missing))):
+                setattr(personal, kind, generated_id)
@@ -0,0 +1,272 @@
+import csv
+import io
+import json
+import time
+
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
+
+from .forms import PersonalDetailsForm, FamilyDetailsForm, NomineeDetailsForm, AccountDetailsForm
+from .models import PersonalDetails, FamilyDetails, NomineeDetails, AccountDetails
+from . import audit, encryption, ids, ledger, search, stats, tasks
+
+# Unique PersonalDetails columns, checked in bulk per chunk instead of per row
+UNIQUE_FIELDS = ['mobile_number', 'email_id', 'aadhar_number', 'pan_card_number']
+
+
+class StepValidator:
+    """
+    Apply one onboarding ModelForm's rules (form field cleaning plus model
+    validation) to a plain dict. Unlike instantiating the form per row this
+    reuses the class-level fields instead of deep-copying them, and it skips
+    the per-row unique queries; the importer checks a whole chunk at once.
+    """
+
+    def __init__(self, form_class):
+        self.model = form_class._meta.model
+        self.fields = form_class.base_fields
+        self.exclude = {f.name for f in self.model._meta.fields if f.name not in self.fields}
+
+    def clean(self, data):
+        cleaned = {}
+        errors = {}
+        for name, field in self.fields.items():
+            value = field.widget.value_from_datadict(data, {}, name)
+            try:
+                cleaned[name] = field.clean(value)
+            except ValidationError as exc:
+                errors[name] = list(exc.messages)
+
+        instance = self.model(**cleaned)
+        try:
+            instance.full_clean(exclude=self.exclude | set(errors), validate_unique=False, validate_constraints=False)
+        except ValidationError as exc:
+            for name, messages in exc.message_dict.items():
+                errors.setdefault(name, []).extend(messages)
+        return instance, errors
+
+
+# Onboarding steps as (key, validator, required); optional steps are skipped when all their columns are blank
+STEPS = [
+    ('personal', StepValidator(PersonalDetailsForm), True),
+    ('family', StepValidator(FamilyDetailsForm), False),
+    ('nominee', StepValidator(NomineeDetailsForm), False),
+    ('account', StepValidator(AccountDetailsForm), True),
+]
+
+
+class ImportResult:
+    """Outcome of an import run: created count, per-row errors and throughput"""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+        self.elapsed = 0.0
+
+    def add_error(self, row_number, errors):
+        self.errors.append({'row': row_number, 'errors': errors})
+
+    @property
+    def rows_per_sec(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'rows': self.rows,
+            'created': self.created,
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+
+
+def detect_format(name):
+    """Guess the file format from its name; defaults to CSV"""
+    return 'ndjson' if name.lower().endswith(('.ndjson', '.jsonl', '.json')) else 'csv'
+
+
+def read_rows(stream, fmt='csv'):
+    """Yield (row_number, dict) from a CSV or NDJSON text stream without loading it whole"""
+    if fmt == 'ndjson':
+        for row_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as exc:
+                row = {'__error__': f'Invalid JSON: {exc}'}
+            yield row_number, row
+    else:
+        # Row 1 is the header line
+        for row_number, row in enumerate(csv.DictReader(stream), start=2):
+            yield row_number, row
+
+
+def validate_row(row):
+    """Run the onboarding ModelForms over a flat row; returns (instances, errors)"""
+    if not isinstance(row, dict):
+        return None, {'__all__': ['Row must be an object']}
+    if '__error__' in row:
+        return None, {'__all__': [row['__error__']]}
+
+    instances = {}
+    errors = {}
+    for key, validator, required in STEPS:
+        data = {name: row.get(name) for name in validator.fields if row.get(name) not in (None, '')}
+        if not data and not required:
+            instances[key] = None
+            continue
+        instance, step_errors = validator.clean(data)
+        instances[key] = instance
+        errors.update(step_errors)
+    return (None, errors) if errors else (instances, None)
+
+
+def unique_key(field, value):
+    """A unique field's value as its unique index compares it: the blind index hash for Aadhaar/PAN"""
+    return encryption.lookup(PersonalDetails, field, value)[1]
+
+
+def find_existing(values_by_field):
+    """Map each unique field to the keys (see unique_key) of its values already in the database"""
+    existing = {}
+    for field, values in values_by_field.items():
+        # Encrypted fields are matched through their blind index column
+        column, _ = encryption.lookup(PersonalDetails, field, None)
+        keys = {unique_key(field, value) for value in values} - {None}
+        if keys:
+            existing[field] = set(
+                PersonalDetails.objects.filter(**{f'{column}__in': list(keys)}).values_list(column, flat=True)
+            )
+        else:
+            existing[field] = set()
+    return existing
+
+
+def write_chunk(chunk, welcome=False):
+    """
+    Insert one chunk of validated customers, all four models, in one
+    transaction, which also counts them in the dashboard rollup; the
+    duplicate check and (with ``welcome``) welcome emails are queued as
+    background jobs in the same transaction.
+    """
+    personals = [instances['personal'] for _, instances in chunk]
+    ids.assign_ids(personals)
+
+    with transaction.atomic():
+        PersonalDetails.objects.bulk_create(personals)
+
+        children = {FamilyDetails: [], NomineeDetails: [], AccountDetails: []}
+        for _, instances in chunk:
+            personal = instances['personal']
+            for key, model in (('family', FamilyDetails), ('nominee', NomineeDetails), ('account', AccountDetails)):
+                instance = instances[key]
+                if instance is None:
+                    continue
+                instance.personal_details = personal
+                if model is AccountDetails:
+                    instance.current_balance = instance.deposit_amount
+                    instance.set_maturity_date()
+                children[model].append(instance)
+        for model, instances in children.items():
+            model.objects.bulk_create(instances)
+        ledger.post_opening_entries(children[AccountDetails])
+
+        # bulk_create skips save() and post_save, so audit, index and count the new customers here and queue the rest
+        audit.record_changes([*personals, *[instance for instances in children.values() for instance in instances]])
+        search.index_customers(personals)
+        stats.record_new(personals, children[AccountDetails])
+        tasks.queue_new_customers(personals, welcome=welcome)
+    return len(personals)
+
+
+def flush(pending, seen, result, dry_run):
+    """Drop rows that clash with existing customers, then write the rest"""
+    existing = find_existing({
+        field: [getattr(instances['personal'], field) for _, instances in pending]
+        for field in UNIQUE_FIELDS
+    })
+    chunk = []
+    for row_number, instances in pending:
+        personal = instances['personal']
+        errors = {}
+        for field in UNIQUE_FIELDS:
+            if unique_key(field, getattr(personal, field)) in existing[field]:
+                errors[field] = [f'A customer with this {PersonalDetails._meta.get_field(field).verbose_name} already exists.']
+        if errors:
+            result.add_error(row_number, errors)
+        else:
+            chunk.append((row_number, instances))
+
+    if dry_run or not chunk:
+        result.created += len(chunk)
+        return
+    try:
+        result.created += write_chunk(chunk)
+    except DatabaseError as exc:
+        for row_number, instances in chunk:
+            result.add_error(row_number, {'__all__': [f'Database error: {exc}']})
+        # These values never reached the database, so later rows may reuse them
+        for _, instances in chunk:
+            for field in UNIQUE_FIELDS:
+                seen[field].discard(unique_key(field, getattr(instances['personal'], field)))
+
+
+def import_customers(stream, fmt='csv', chunk_size=500, dry_run=False):
+    """
+    Stream customers from ``stream`` and create all four onboarding records
+    per row in chunked transactions.
+
+    Rows are validated with the onboarding forms' rules. Unique fields are
+    checked (Aadhaar/PAN by blind index) against earlier rows in memory and
+    against the database with one query per field per chunk. Invalid rows
+    are reported, not raised.
+    """
+    result = ImportResult()
+    started = time.perf_counter()
+    seen = {field: set() for field in UNIQUE_FIELDS}
+    pending = []
+
+    for row_number, row in read_rows(stream, fmt):
+        result.rows += 1
+        instances, errors = validate_row(row)
+        if errors:
+            result.add_error(row_number, errors)
+            continue
+
+        # Compared as the unique indexes compare them, so 'abcde1234f' clashes with 'ABCDE1234F'
+        keys = {field: unique_key(field, getattr(instances['personal'], field)) for field in UNIQUE_FIELDS}
+        duplicates = {
+            field: ['Duplicate of an earlier row in this file.']
+            for field in UNIQUE_FIELDS if keys[field] in seen[field]
+        }
+        if duplicates:
+            result.add_error(row_number, duplicates)
+            continue
+        for field in UNIQUE_FIELDS:
+            seen[field].add(keys[field])
+
+        pending.append((row_number, instances))
+        if len(pending) >= chunk_size:
+            flush(pending, seen, result, dry_run)
+            pending = []
+
+    if pending:
+        flush(pending, seen, result, dry_run)
+
+    result.errors.sort(key=lambda error: error['row'])
+    result.elapsed = time.perf_counter() - started
+    return result
+
+
+def import_uploaded_file(uploaded_file, fmt=None, **kwargs):
+    """Run an import over a Django UploadedFile, decoding it as it streams"""
+    fmt = fmt or detect_format(uploaded_file.name)
+    stream = io.TextIOWrapper(uploaded_file.file, encoding='utf-8-sig', newline='')
+    try:
+        return import_customers(stream, fmt, **kwargs)
+    finally:
+        stream.detach()
@@ -0,0 +1,137 @@
+import calendar
+import time
+from decimal import Decimal
+
+from django.db import transaction
+
+from .models import AccountDetails, InterestRate
+from . import customers, ledger
+
+# Accrued interest is carried in 1/10000 rupee; balances are handled in paise
+UNITS_PER_PAISE = 100
+# paise * basis points * days / DAY_COUNT_DIVISOR = accrued units (actual/365)
+DAY_COUNT_DIVISOR = 365 * 100
+
+ACCOUNT_COLUMNS = [
+    'pk', 'account_type', 'scheme_type', 'interest_rate', 'accrued_interest',
+    'last_accrual_date', 'date_of_opening', 'maturity_date', 'ledger_balance',
+]
+
+
+def to_basis_points(rate):
+    """3.50 (% per annum) -> 350"""
+    return int(Decimal(rate).scaleb(2))
+
+
+def load_rates():
+    """Map (account_type, scheme_type) -> annual rate in basis points"""
+    return {
+        (account_type, scheme_type): to_basis_points(rate)
+        for account_type, scheme_type, rate in InterestRate.objects.values_list('account_type', 'scheme_type', 'rate')
+    }
+
+
+def is_month_end(day):
+    return day.day == calendar.monthrange(day.year, day.month)[1]
+
+
+def accrue(balances, rates, days):
+    """
+    Interest for whole columns of accounts at once, in exact integer units.
+
+    ``balances`` are paise, ``rates`` basis points and ``days`` whole days;
+    each result is rounded half-up to 1/10000 rupee. Non-positive balances,
+    rates or periods accrue nothing.
+    """
+    return [
+        (2 * b * r * d + DAY_COUNT_DIVISOR) // (2 * DAY_COUNT_DIVISOR) if b > 0 and r > 0 and d > 0 else 0
+        for b, r, d in zip(balances, rates, days)
+    ]
+
+
+def split_credit(accrued_units):
+    """Whole paise to credit now and the sub-paise remainder carried forward, per account"""
+    return [divmod(units, UNITS_PER_PAISE) if units > 0 else (0, units) for units in accrued_units]
+
+
+def run_accrual(as_of, capitalize=None, chunk_size=2000, dry_run=False):
+    """
+    Accrue interest on every active account up to ``as_of`` and, at month
+    end (or when ``capitalize`` is set), credit whole paise to the ledger.
+
+    Accounts are streamed by primary key in chunks. Each chunk's balances,
+    rates and periods are computed as columns, then written back with one
+    bulk_update plus one batch of INTEREST ledger entries. Re-running for
+    the same date accrues nothing twice because ``last_accrual_date`` moves.
+    """
+    if capitalize is None:
+        capitalize = is_month_end(as_of)
+    rates = load_rates()
+    stats = {'accounts': 0, 'updated': 0, 'accrued': Decimal('0'), 'credited': Decimal('0')}
+    started = time.perf_counter()
+
+    last_pk = 0
+    while True:
+        rows = list(
+            ledger.with_balances(AccountDetails.objects.filter(is_active=True, pk__gt=last_pk).order_by('pk'))
+            .values_list(*ACCOUNT_COLUMNS)[:chunk_size]
+        )
+        if not rows:
+            break
+        last_pk = rows[-1][0]
+        stats['accounts'] += len(rows)
+
+        pks, account_types, scheme_types, own_rates, carried, last_dates, opened, matures, balances = zip(*rows)
+        rate_column = [
+            rates.get((account_type, scheme_type), to_basis_points(own_rate))
+            for account_type, scheme_type, own_rate in zip(account_types, scheme_types, own_rates)
+        ]
+        # Deposits stop accruing at maturity; the maturity scheduler credits the rest
+        end_dates = [min(as_of, maturity) if maturity else as_of for maturity in matures]
+        day_column = [(end - (last or start)).days for end, last, start in zip(end_dates, last_dates, opened)]
+        balance_column = [int(Decimal(balance).quantize(ledger.CENT).scaleb(2)) for balance in balances]
+        carried_column = [int(Decimal(units).scaleb(4)) for units in carried]
+
+        new_units = accrue(balance_column, rate_column, day_column)
+        total_units = [old + new for old, new in zip(carried_column, new_units)]
+        if capitalize:
+            credits = split_credit(total_units)
+        else:
+            credits = [(0, units) for units in total_units]
+
+        updates = []
+        postings = []
+        for i, pk in enumerate(pks):
+            credit, remainder = credits[i]
+            if day_column[i] <= 0 and not credit:
+                continue
+            updates.append(AccountDetails(
+                pk=pk,
+                accrued_interest=Decimal(remainder).scaleb(-4),
+                last_accrual_date=max(end_dates[i], last_dates[i] or end_dates[i]),
+                interest_rate=Decimal(rate_column[i]).scaleb(-2),
+            ))
+            if credit:
+                postings.append({
+                    'account_id': pk,
+                    'entry_type': 'INTEREST',
+                    'amount': Decimal(credit).scaleb(-2),
+                    'description': f'Interest to {as_of.isoformat()}',
+                })
+            stats['accrued'] += Decimal(new_units[i]).scaleb(-4)
+            stats['credited'] += Decimal(credit).scaleb(-2)
+
+        stats['updated'] += len(updates)
+        if dry_run or not updates:
+            continue
+        with transaction.atomic():
+            AccountDetails.objects.bulk_update(
+                updates, ['accrued_interest', 'last_accrual_date', 'interest_rate'], batch_size=chunk_size
+            )
+            customers.invalidate_accounts([account.pk for account in updates])
+            if postings:
+                ledger.post_entries(postings)
+
+    stats['elapsed'] = time.perf_counter() - started
+    stats['accounts_per_sec'] = stats['accounts'] / stats['elapsed'] if stats['elapsed'] else 0.0
+    return stats
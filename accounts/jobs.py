@@ -0,0 +1,204 @@
+"""
+Database-backed background job queue.
+
+``enqueue()`` inserts Job rows inside the caller's transaction, so follow-up
+work is queued if and only if the change that needs it commits, and the
+request returns without doing it. ``manage.py run_workers`` runs the jobs:
+each worker thread claims a batch of due jobs with SELECT ... FOR UPDATE
+SKIP LOCKED (workers on any number of hosts never wait on or double-run
+each other's rows), then runs every job in its own transaction together
+with marking it done. A job that raises is retried with exponential
+backoff until it has had ``max_attempts`` tries; a worker that dies
+mid-job leaves it RUNNING until JOB_LOCK_TIMEOUT passes and another worker
+takes it over.
+
+Handlers are plain functions registered with ``@task('name')`` that take
+the payload as keyword arguments (see accounts.tasks).
+"""
+
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, models, transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+MAX_BACKOFF_SECONDS = 3600
+
+
+class LockLost(Exception):
+    """The job's lock expired while it ran and another worker took it over"""
+
+
+def task(name):
+    """Register a job handler under ``name``"""
+    def register(func):
+        TASKS[name] = func
+        return func
+    return register
+
+
+def is_eager():
+    """Run jobs in the enqueuing process right after commit (development without workers)"""
+    return getattr(settings, 'JOB_QUEUE_EAGER', False)
+
+
+def enqueue(name, delay=0, max_attempts=None, **payload):
+    """Queue one job; it becomes visible to workers when the current transaction commits"""
+    return enqueue_many([(name, payload)], delay=delay, max_attempts=max_attempts)[0]
+
+
+def enqueue_many(jobs, delay=0, max_attempts=None):
+    """Queue several (name, payload) jobs with one INSERT"""
+    for name, _ in jobs:
+        if name not in TASKS:
+            raise ValueError(f'Unknown job {name!r}')
+    run_at = timezone.now() + timedelta(seconds=delay)
+    attempts = max_attempts or getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+    created = Job.objects.bulk_create([
+        Job(name=name, payload=payload, run_at=run_at, max_attempts=attempts) for name, payload in jobs
+    ])
+    if is_eager() and not delay:
+        pks = [job.pk for job in created]
+        transaction.on_commit(lambda: run_claimed(claim(worker_name(), batch_size=len(pks), pks=pks)))
+    return created
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"[:90]
+
+
+def lock_timeout():
+    return timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 300))
+
+
+def claim(worker, batch_size=10, pks=None):
+    """
+    Mark up to ``batch_size`` due jobs RUNNING for ``worker`` and return them.
+    Jobs another worker has locked are skipped; RUNNING jobs whose lock is
+    older than JOB_LOCK_TIMEOUT are taken over.
+    """
+    now = timezone.now()
+    due = models.Q(status='QUEUED', run_at__lte=now) | models.Q(status='RUNNING', locked_at__lt=now - lock_timeout())
+    token = f"{worker}:{uuid.uuid4().hex[:8]}"
+    with transaction.atomic():
+        queryset = Job.objects.filter(due)
+        if pks is not None:
+            queryset = queryset.filter(pk__in=pks)
+        candidates = list(
+            queryset.select_for_update(skip_locked=True).order_by('run_at', 'pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not candidates:
+            return []
+        # Re-checking the status makes the claim safe on backends without row locks (SQLite)
+        Job.objects.filter(due, pk__in=candidates).update(
+            status='RUNNING', locked_by=token, locked_at=now, attempts=models.F('attempts') + 1,
+        )
+    return list(Job.objects.filter(locked_by=token, status='RUNNING').order_by('run_at', 'pk'))
+
+
+def backoff(attempts):
+    """Seconds before retry number ``attempts``: JOB_RETRY_BACKOFF doubling per try, with 10% jitter"""
+    base = getattr(settings, 'JOB_RETRY_BACKOFF', 30)
+    delay = min(base * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(1.0, 1.1)
+
+
+def run_job(job):
+    """Run one claimed job; returns True when it succeeded"""
+    handler = TASKS.get(job.name)
+    try:
+        if handler is None:
+            raise LookupError(f'No handler registered for job {job.name!r}')
+        with transaction.atomic():
+            handler(**job.payload)
+            # Same transaction as the handler's writes: a crash before this commits redoes the job, not half of it
+            updated = Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(
+                status='DONE', finished_at=timezone.now(), last_error='',
+            )
+            if not updated:
+                # Raising rolls the handler's writes back: the worker now holding the job redoes them
+                raise LockLost(f'Job {job.name!r} #{job.pk} was taken over by another worker')
+        return True
+    except LockLost:
+        logger.warning('Job %s #%s ran past JOB_LOCK_TIMEOUT and was taken over; its work was rolled back',
+                       job.name, job.pk)
+        return False
+    except Exception:
+        error = traceback.format_exc()
+        logger.warning('Job %s #%s failed (attempt %s of %s)', job.name, job.pk, job.attempts, job.max_attempts,
+                       exc_info=True)
+        if handler is not None and job.attempts < job.max_attempts:
+            changes = {'status': 'QUEUED', 'run_at': timezone.now() + timedelta(seconds=backoff(job.attempts))}
+        else:
+            changes = {'status': 'FAILED', 'finished_at': timezone.now()}
+        Job.objects.filter(pk=job.pk, locked_by=job.locked_by).update(last_error=error[-5000:], **changes)
+        return False
+
+
+def run_claimed(jobs):
+    """(succeeded, failed) counts after running ``jobs`` in order"""
+    succeeded = failed = 0
+    for job in jobs:
+        if run_job(job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+def run_pending(batch_size=100):
+    """Run due jobs in this thread until none are left; returns (succeeded, failed)"""
+    worker = worker_name()
+    totals = [0, 0]
+    while True:
+        jobs = claim(worker, batch_size)
+        if not jobs:
+            return tuple(totals)
+        succeeded, failed = run_claimed(jobs)
+        totals[0] += succeeded
+        totals[1] += failed
+
+
+def work(stop, batch_size=10, poll_interval=1.0, drain=False):
+    """
+    Worker loop for one thread: claim and run batches until ``stop`` (a
+    threading.Event) is set, sleeping ``poll_interval`` seconds when the
+    queue is empty, or until it is empty when ``drain`` is set. Returns
+    (succeeded, failed).
+    """
+    worker = worker_name()
+    totals = [0, 0]
+    try:
+        while not stop.is_set():
+            close_old_connections()
+            jobs = claim(worker, batch_size)
+            if not jobs:
+                if drain:
+                    break
+                stop.wait(poll_interval)
+                continue
+            succeeded, failed = run_claimed(jobs)
+            totals[0] += succeeded
+            totals[1] += failed
+    finally:
+        connection.close()
+    return tuple(totals)
+
+
+def purge(days):
+    """Delete finished jobs older than ``days``; failed jobs are kept for inspection"""
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = Job.objects.filter(status='DONE', finished_at__lt=cutoff).delete()
+    return deleted
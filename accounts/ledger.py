@@ -0,0 +1,250 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.db.models.functions import Coalesce
+
+from .jobs import enqueue
+from .models import AccountDetails, LedgerEntry, BalanceSnapshot
+from . import customers, stats
+
+CENT = Decimal('0.01')
+ZERO = Decimal('0.00')
+
+# Entry types whose amount is always taken out of the account
+DEBIT_TYPES = {'WITHDRAWAL'}
+ENTRY_TYPES = dict(LedgerEntry.ENTRY_TYPES)
+
+
+def _parse_amount(value):
+    try:
+        amount = Decimal(str(value)).quantize(CENT)
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+    return amount if amount.is_finite() else None
+
+
+def build_entry(posting):
+    """Turn a posting dict into an unsaved LedgerEntry; returns (entry, errors)"""
+    errors = []
+    entry_type = posting.get('entry_type')
+    if entry_type not in ENTRY_TYPES:
+        errors.append(f"Unknown entry type {entry_type!r}.")
+    amount = _parse_amount(posting.get('amount'))
+    if amount is None:
+        errors.append('Enter a valid amount.')
+    elif entry_type == 'ADJUSTMENT':
+        if amount == 0:
+            errors.append('Adjustments must be non-zero.')
+    elif amount <= 0:
+        errors.append('Amount must be greater than zero.')
+    if errors:
+        return None, errors
+
+    if entry_type in DEBIT_TYPES:
+        amount = -amount
+    entry = LedgerEntry(
+        account_id=posting.get('account_id'),
+        entry_type=entry_type,
+        amount=amount,
+        description=(posting.get('description') or '')[:200],
+    )
+    return entry, []
+
+
+def post_entries(postings, batch_size=1000):
+    """
+    Append a batch of postings in one transaction and return the entries.
+
+    Each posting is a dict with ``account_id``, ``entry_type``, ``amount``
+    (positive; withdrawals are stored negated) and optional ``description``.
+    The batch is all-or-nothing: any invalid posting, or any debit that
+    would take its account below zero, raises ValidationError keyed by its
+    index and nothing is written. Batches that only credit never lock
+    anything; for debits the accounts' rows are locked while their balances
+    are checked, so two concurrent withdrawals cannot both spend the same
+    money. Balances are derived by ``get_balances``, and a background job
+    copies them to ``current_balance`` once the batch commits.
+    """
+    postings = list(postings)
+    entries = []
+    errors = {}
+    for index, posting in enumerate(postings):
+        entry, entry_errors = build_entry(posting)
+        if entry_errors:
+            errors[index] = entry_errors
+        else:
+            entries.append((index, entry))
+
+    account_ids = {entry.account_id for _, entry in entries}
+    active = set(
+        AccountDetails.objects.filter(pk__in=account_ids, is_active=True).values_list('pk', flat=True)
+    )
+    for index, entry in entries:
+        if entry.account_id not in active:
+            errors[index] = ['Account does not exist or is inactive.']
+    if errors:
+        raise ValidationError({str(index): messages for index, messages in sorted(errors.items())})
+
+    with transaction.atomic():
+        _check_overdrafts(entries)
+        created = LedgerEntry.objects.bulk_create([entry for _, entry in entries], batch_size=batch_size)
+        enqueue('ledger.refresh_balances', account_ids=sorted(account_ids))
+    return created
+
+
+def _check_overdrafts(entries):
+    """Raise ValidationError for the debits of any account the batch would overdraw"""
+    debited = sorted({entry.account_id for _, entry in entries if entry.amount < 0})
+    if not debited:
+        return
+    # Lock in pk order so concurrent batches queue up instead of deadlocking
+    list(AccountDetails.objects.select_for_update().filter(pk__in=debited).order_by('pk').values_list('pk'))
+    balances = get_balances(debited)
+    net = {}
+    for _, entry in entries:
+        if entry.account_id in balances:
+            net[entry.account_id] = net.get(entry.account_id, ZERO) + entry.amount
+    overdrawn = {pk for pk, amount in net.items() if balances[pk] + amount < 0}
+    errors = {
+        index: [f'Insufficient funds: the balance is {balances[entry.account_id]}.']
+        for index, entry in entries if entry.account_id in overdrawn and entry.amount < 0
+    }
+    if errors:
+        raise ValidationError({str(index): messages for index, messages in sorted(errors.items())})
+
+
+def post_opening_entries(accounts):
+    """Record each new account's opening deposit as its first ledger entry"""
+    entries = [
+        LedgerEntry(account_id=account.pk, entry_type='OPENING', amount=account.deposit_amount,
+                    description='Opening deposit')
+        for account in accounts if account.deposit_amount
+    ]
+    return LedgerEntry.objects.bulk_create(entries)
+
+
+def with_balances(queryset, upto_entry_id=None):
+    """
+    Annotate an AccountDetails queryset with its derived ledger balance.
+
+    Adds ``snapshot_entry_id`` and ``snapshot_balance`` from the newest
+    snapshot, and ``pending_total``/``pending_count`` for the entries after
+    it (up to ``upto_entry_id`` if given). ``ledger_balance`` is their sum.
+    """
+    latest = BalanceSnapshot.objects.filter(account=models.OuterRef('pk')).order_by('-last_entry_id')
+    pending = LedgerEntry.objects.filter(account=models.OuterRef('pk'), id__gt=models.OuterRef('snapshot_entry_id'))
+    if upto_entry_id is not None:
+        pending = pending.filter(id__lte=upto_entry_id)
+    pending = pending.order_by().values('account')
+
+    money = models.DecimalField(max_digits=15, decimal_places=2)
+    return queryset.annotate(
+        snapshot_entry_id=Coalesce(models.Subquery(latest.values('last_entry_id')[:1]), models.Value(0)),
+        snapshot_balance=Coalesce(models.Subquery(latest.values('balance')[:1]), models.Value(ZERO), output_field=money),
+    ).annotate(
+        pending_total=Coalesce(
+            models.Subquery(pending.annotate(total=models.Sum('amount')).values('total')),
+            models.Value(ZERO), output_field=money,
+        ),
+        pending_count=Coalesce(
+            models.Subquery(pending.annotate(count=models.Count('id')).values('count')),
+            models.Value(0),
+        ),
+    ).annotate(
+        ledger_balance=models.ExpressionWrapper(
+            models.F('snapshot_balance') + models.F('pending_total'), output_field=money,
+        ),
+    )
+
+
+def get_balances(account_ids):
+    """Map account id -> balance (latest snapshot plus the entries after it), in one query"""
+    queryset = with_balances(AccountDetails.objects.filter(pk__in=account_ids))
+    return {pk: balance.quantize(CENT) for pk, balance in queryset.values_list('pk', 'ledger_balance')}
+
+
+def get_balance(account_id):
+    return get_balances([account_id]).get(account_id, ZERO)
+
+
+def refresh_balances(account_ids):
+    """
+    Set ``current_balance`` of the accounts to their ledger balance, with the
+    dashboard rollup and customer cache to match. The rows are locked first,
+    so two refreshes of an account apply in order and the later one, which
+    reads the later ledger, wins. Returns the number of balances changed.
+    """
+    with transaction.atomic():
+        rows = list(
+            AccountDetails.objects.select_for_update().filter(pk__in=account_ids).order_by('pk')
+            .values_list('pk', *stats.ACCOUNT_FIELDS)
+        )
+        balances = get_balances([row[0] for row in rows])
+        changed = [row for row in rows if balances[row[0]] != row[-1]]
+        if not changed:
+            return 0
+        AccountDetails.objects.bulk_update(
+            [AccountDetails(pk=row[0], current_balance=balances[row[0]]) for row in changed], ['current_balance']
+        )
+        # bulk_update skips the signals that maintain the dashboard rollup
+        stats.record_account_changes(
+            [row[1:] for row in changed],
+            [row[1:-1] + (balances[row[0]],) for row in changed],
+        )
+        customers.invalidate_accounts([row[0] for row in changed])
+    return len(changed)
+
+
+def committed_horizon():
+    """
+    The highest entry id that no uncommitted entry lies below. Ids are handed
+    out at INSERT, so a transaction still open can commit an entry with a
+    lower id than ones already visible, and a snapshot folded past it would
+    leave that entry out of every balance. On PostgreSQL a SHARE lock waits
+    for the transactions inserting entries (holding back new ones only for
+    the instant this takes); SQLite has a single writer, so the visible
+    maximum is already safe.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {connection.ops.quote_name(LedgerEntry._meta.db_table)} IN SHARE MODE')
+        return LedgerEntry.objects.aggregate(upto=models.Max('id'))['upto']
+
+
+def compact(min_entries=1, chunk_size=1000):
+    """
+    Fold entries into a fresh snapshot for every account with at least
+    ``min_entries`` entries since its last one and drop the superseded
+    snapshots. Entries are folded up to ``committed_horizon()``, so one
+    committed late is never skipped over. Returns the number of accounts
+    compacted.
+    """
+    upto = committed_horizon()
+    if upto is None:
+        return 0
+
+    compacted = 0
+    last_pk = 0
+    while True:
+        # Walk accounts by primary key so the writes below never disturb an open cursor
+        chunk = list(
+            with_balances(AccountDetails.objects.filter(pk__gt=last_pk).order_by('pk'), upto_entry_id=upto)
+            .filter(pending_count__gte=min_entries)
+            .values_list('pk', 'ledger_balance')[:chunk_size]
+        )
+        if not chunk:
+            return compacted
+        compacted += _write_snapshots(chunk, upto)
+        last_pk = chunk[-1][0]
+
+
+def _write_snapshots(balances, upto):
+    """Snapshot each (pk, balance) as of entry ``upto``"""
+    with transaction.atomic():
+        BalanceSnapshot.objects.bulk_create([
+            BalanceSnapshot(account_id=pk, balance=balance, last_entry_id=upto) for pk, balance in balances
+        ])
+        BalanceSnapshot.objects.filter(account_id__in=[pk for pk, _ in balances], last_entry_id__lt=upto).delete()
+    return len(balances)
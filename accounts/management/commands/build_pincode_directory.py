@@ -0,0 +1,54 @@
+import csv
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts import pincodes
+
+# Column names used by the India Post pincode directory CSV across its releases
+COLUMNS = {
+    'pincode': ('pincode',),
+    'district': ('district', 'districtname'),
+    'state': ('statename', 'state'),
+}
+
+
+class Command(BaseCommand):
+    help = 'Compile the India Post pincode directory CSV into the compact file loaded for autofill and validation'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv', help='All India Pincode Directory CSV (one row per post office)')
+        parser.add_argument('-o', '--output', default=None,
+                            help='Directory file to write (default: PINCODE_DIRECTORY_PATH)')
+        parser.add_argument('--complete', action='store_true',
+                            help='Mark the directory as covering every pincode, so PINCODE_VALIDATION=strict may '
+                                 'reject pincodes missing from it')
+
+    def handle(self, *args, **options):
+        output = options['output'] or pincodes.directory_path()
+        with open(options['csv'], newline='', encoding='utf-8-sig') as handle:
+            reader = csv.DictReader(handle)
+            columns = self.columns(reader.fieldnames or [])
+            rows = (
+                (row[columns['pincode']], row[columns['district']], row[columns['state']])
+                for row in reader if (row[columns['pincode']] or '').strip().isdigit()
+            )
+            directory = pincodes.PincodeDirectory.build(rows, complete=options['complete'])
+
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        directory.save(output)
+        pincodes.get_directory.cache_clear()
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote {len(directory)} pincodes in {len(directory.districts)} districts and '
+            f'{len(directory.states)} states to {output} ({os.path.getsize(output)} bytes)'
+        ))
+
+    def columns(self, fieldnames):
+        by_name = {name.strip().lower(): name for name in fieldnames}
+        found = {}
+        for column, names in COLUMNS.items():
+            match = next((by_name[name] for name in names if name in by_name), None)
+            if match is None:
+                raise CommandError(f'The CSV has no {column} column (expected one of: {", ".join(names)})')
+            found[column] = match
+        return found
@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.ledger import compact
+
+
+class Command(BaseCommand):
+    help = 'Fold recent ledger entries into balance snapshots'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-entries', type=int, default=1, help='Skip accounts with fewer new entries')
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        compacted = compact(
+            min_entries=options['min_entries'],
+            chunk_size=options['chunk_size'],
+        )
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Compacted {compacted} accounts in {elapsed:.2f}s'))
@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import IntegrityError, models, transaction
+
+from accounts import encryption
+from accounts.models import PersonalDetails, NomineeDetails
+
+MODELS = [PersonalDetails, NomineeDetails]
+
+
+class Command(BaseCommand):
+    help = 'Encrypt Aadhaar/PAN columns and fill their blind indexes, in resumable chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows per transaction (default 1000)')
+        parser.add_argument('--rotate', action='store_true',
+                            help='Re-encrypt every row with the newest FIELD_ENCRYPTION_KEYS key and rehash the indexes')
+        parser.add_argument('--after', type=int, default=0, metavar='PK',
+                            help='Skip rows up to this primary key (to resume an interrupted --rotate)')
+        parser.add_argument('--check', action='store_true', help='Only count the rows still to migrate')
+
+    def handle(self, *args, **options):
+        for model in MODELS:
+            queryset = self.pending(model, options['rotate'])
+            if options['check']:
+                self.stdout.write(f'{model.__name__}: {queryset.count()} rows to migrate')
+                continue
+            self.migrate(model, queryset, options['chunk_size'], options['after'])
+
+    def pending(self, model, rotate):
+        """Rows written before encryption have no blind index yet; --rotate takes them all"""
+        queryset = model.objects.order_by('pk')
+        if rotate:
+            return queryset
+        missing = models.Q()
+        for index in encryption.blind_index_fields(model):
+            missing |= models.Q(**{f'{index.name}__isnull': True})
+        return queryset.filter(missing)
+
+    def migrate(self, model, queryset, chunk_size, after):
+        encrypted = [f.name for f in model._meta.concrete_fields if isinstance(f, encryption.EncryptedCharField)]
+        indexes = [index.name for index in encryption.blind_index_fields(model)]
+        started = time.perf_counter()
+        done = 0
+        last_pk = after
+        while True:
+            # Walk by primary key so rows that cannot be indexed are not retried within a run
+            chunk = list(queryset.filter(pk__gt=last_pk).only('pk', *encrypted)[:chunk_size])
+            if not chunk:
+                break
+            for instance in chunk:
+                encryption.refresh_blind_indexes(instance, encrypted)
+            done += self.write(model, chunk, encrypted + indexes)
+            last_pk = chunk[-1].pk
+            rate = done / (time.perf_counter() - started)
+            self.stdout.write(f'{model.__name__}: {done} rows up to pk {last_pk} ({rate:.0f} rows/s)')
+        self.stdout.write(self.style.SUCCESS(f'{model.__name__}: migrated {done} rows'))
+
+    def write(self, model, chunk, fields):
+        # Loading decrypted the values (plaintext passes through); saving encrypts them with the newest key
+        try:
+            with transaction.atomic():
+                model.objects.bulk_update(chunk, fields)
+            return len(chunk)
+        except IntegrityError:
+            pass
+        # Two rows normalize to the same number: write the rest, report the clashes and leave them unindexed
+        written = 0
+        for instance in chunk:
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_update([instance], fields)
+                written += 1
+            except IntegrityError:
+                self.stdout.write(self.style.WARNING(
+                    f'{model.__name__} {instance.pk}: duplicate Aadhaar/PAN of another row; fix it and rerun'
+                ))
+        return written
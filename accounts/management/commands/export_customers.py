@@ -0,0 +1,34 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.export import FORMATS, parse_filters, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream the customer book (with family, nominee and account details) as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--output', '-o', help='File to write; defaults to stdout')
+        parser.add_argument('--branch-code')
+        parser.add_argument('--account-type')
+        parser.add_argument('--created-from', help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--created-to', help='YYYY-MM-DD, inclusive')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--unmasked', action='store_true', help='Write whole Aadhaar and PAN numbers')
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_filters(options)
+        except ValueError:
+            raise CommandError('Dates must be YYYY-MM-DD')
+
+        lines = stream_export(
+            options['format'], chunk_size=options['chunk_size'], unmasked=options['unmasked'], **filters
+        )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as output:
+                output.writelines(lines)
+        else:
+            sys.stdout.writelines(lines)
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.maturity import run_maturities
+
+
+class Command(BaseCommand):
+    help = 'Mature FD/RD accounts due on or before a date; safe to run from several workers at once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Process deposits due up to this date (YYYY-MM-DD); defaults to today')
+        parser.add_argument('--batch-size', type=int, default=500, help='Accounts locked and processed per transaction')
+        parser.add_argument('--max-batches', type=int, help='Stop after this many batches (default: until caught up)')
+
+    def handle(self, *args, **options):
+        try:
+            as_of = date.fromisoformat(options['date']) if options['date'] else None
+        except ValueError:
+            raise CommandError('--date must be YYYY-MM-DD')
+
+        run = run_maturities(as_of, batch_size=options['batch_size'], max_batches=options['max_batches'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Matured {run.processed} accounts in {run.batches} batches, credited ₹{run.credited:.2f} '
+            f'in {run.elapsed_seconds:.2f}s ({run.accounts_per_sec:.0f} accounts/sec)'
+        ))
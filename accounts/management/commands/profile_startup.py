@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from bank_system import warmup
+
+
+class Command(BaseCommand):
+    help = 'Profile a cold start: import time per package and module, then each warm-up step'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Packages and modules to list (default 15)')
+
+    def handle(self, *args, **options):
+        report = warmup.profile_startup()
+        rows = report['imports']
+        top = options['top']
+
+        # Self time summed per top-level package, so many small modules of one dependency add up
+        packages = {}
+        for name, own, _, _ in rows:
+            package = name.split('.')[0]
+            packages[package] = packages.get(package, 0) + own
+        total = sum(packages.values())
+
+        self.stdout.write(f'Imported {len(rows)} modules in {total / 1000:.1f} ms '
+                          f"(application loaded in {report['application_ms']:.1f} ms wall time)\n")
+        self.stdout.write('Slowest packages (self time of all their modules):')
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f'  {own / 1000:9.1f} ms  {own / total:6.1%}  {package}')
+        self.stdout.write('\nSlowest modules (self time):')
+        for name, own, cumulative, _ in sorted(rows, key=lambda row: -row[1])[:top]:
+            self.stdout.write(f'  {own / 1000:9.1f} ms  (with imports {cumulative / 1000:9.1f} ms)  {name}')
+
+        self.stdout.write('\nWarm-up steps (imports above included):')
+        for step, elapsed in report['warm_up'].items():
+            self.stdout.write(f'  {elapsed:9.1f} ms  {step}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Cold start: {report['application_ms'] + sum(report['warm_up'].values()):.1f} ms until ready for requests"
+        ))
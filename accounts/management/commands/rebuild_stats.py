@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import stats
+
+
+class Command(BaseCommand):
+    help = 'Recompute the dashboard statistics rollup from the customer and account tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report rows where the rollup has drifted from a full recount')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['check']:
+            self.check_drift()
+            return
+        rows = stats.rebuild()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rows} statistics rows in {elapsed:.2f}s'))
+
+    def check_drift(self):
+        expected = stats.compute_rows()
+        stored = {
+            (dimension, key): (row['count'], row['deposit_total'], row['balance_total'])
+            for dimension, rows in stats.read().items()
+            for key, row in rows.items()
+        }
+        drifted = 0
+        for key in sorted(set(expected) | set(stored)):
+            want = expected.get(key, (0, stats.ZERO, stats.ZERO))
+            have = stored.get(key, (0, stats.ZERO, stats.ZERO))
+            if tuple(have) != tuple(want):
+                drifted += 1
+                self.stdout.write(f'{key[0]}={key[1]}: rollup {have}, actual {want}')
+        if drifted:
+            self.stdout.write(self.style.WARNING(f'{drifted} rows drifted; run rebuild_stats to fix them'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Rollup matches the tables'))
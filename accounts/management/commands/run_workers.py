@@ -0,0 +1,51 @@
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from accounts import jobs
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (duplicate checks, welcome emails, balance refreshes) on worker threads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=getattr(settings, 'JOB_WORKER_CONCURRENCY', 4),
+                            help='Worker threads, each with its own database connection (default JOB_WORKER_CONCURRENCY)')
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'JOB_BATCH_SIZE', 10),
+                            help='Jobs claimed per round trip')
+        parser.add_argument('--poll-interval', type=float, default=getattr(settings, 'JOB_POLL_INTERVAL', 1.0),
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty instead of polling')
+        parser.add_argument('--purge-days', type=int, default=getattr(settings, 'JOB_RETENTION_DAYS', 7),
+                            help='Delete jobs finished more than this many days ago on start (0 keeps them)')
+
+    def handle(self, *args, **options):
+        if options['purge_days']:
+            purged = jobs.purge(options['purge_days'])
+            if purged:
+                self.stdout.write(f'Purged {purged} finished jobs')
+
+        stop = threading.Event()
+        # Finish the jobs in hand on SIGTERM/Ctrl-C; anything unclaimed stays queued for the next start
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(signum, lambda *_: stop.set())
+
+        results = []
+
+        def run():
+            results.append(jobs.work(stop, options['batch_size'], options['poll_interval'], drain=options['once']))
+
+        threads = [threading.Thread(target=run, name=f'job-worker-{n}') for n in range(options['concurrency'])]
+        self.stdout.write(f"Running {len(threads)} job workers{' until the queue is empty' if options['once'] else ''}")
+        for thread in threads:
+            thread.start()
+        # join() with a timeout keeps the main thread responsive to signals
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(0.5)
+
+        succeeded = sum(done for done, _ in results)
+        failed = sum(failures for _, failures in results)
+        self.stdout.write(self.style.SUCCESS(f'Ran {succeeded} jobs, {failed} failed (failed jobs are retried)'))
@@ -0,0 +1,40 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import dedup
+
+
+class Command(BaseCommand):
+    help = 'Scan the whole customer book for near-duplicates, block by block, across worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Worker processes (default: one per CPU)')
+        parser.add_argument('--blocks-per-task', type=int, default=200, help='Blocks handed to a worker at a time')
+        parser.add_argument('--rebuild-keys', action='store_true',
+                            help='Recompute every blocking key first (after changing the key rules)')
+
+    def handle(self, *args, **options):
+        if options['rebuild_keys']:
+            started = time.perf_counter()
+            total = dedup.rebuild_keys()
+            self.stdout.write(f'Rebuilt blocking keys for {total} customers in {time.perf_counter() - started:.2f}s')
+
+        def report(done, total):
+            self.stdout.write(f'\r{done}/{total} tasks', ending='')
+            self.stdout.flush()
+
+        result = dedup.scan(workers=options['workers'], blocks_per_task=options['blocks_per_task'], progress=report)
+        self.stdout.write('')
+        if result['skipped_blocks']:
+            self.stdout.write(self.style.WARNING(
+                f"Skipped {result['skipped_blocks']} blocks larger than DEDUP_MAX_BLOCK_SIZE "
+                f"(largest {result['largest_skipped']} customers)"
+            ))
+        self.stdout.write(self.style.SUCCESS(
+            f"Compared {result['pairs_compared']} pairs in {result['blocks']} blocks and found "
+            f"{result['matches']} likely duplicates in {result['elapsed_seconds']:.2f}s "
+            f"({result['pairs_per_sec']:.0f} pairs/sec)"
+        ))
@@ -0,0 +1,125 @@
+import os
+import socket
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AccountDetails, MaturityRun
+from . import customers, interest, ledger, stats
+
+DEPOSIT_TYPES = ['FIXED_DEPOSIT', 'RECURRING_DEPOSIT']
+
+MATURITY_COLUMNS = [
+    'pk', 'account_type', 'scheme_type', 'interest_rate', 'accrued_interest',
+    'last_accrual_date', 'date_of_opening', 'maturity_date', 'ledger_balance',
+]
+
+
+def due_accounts(as_of):
+    """Active deposits maturing on or before ``as_of``, oldest first (served by account_maturity_idx)"""
+    return AccountDetails.objects.filter(
+        maturity_date__lte=as_of, is_active=True, account_type__in=DEPOSIT_TYPES,
+    ).order_by('maturity_date', 'pk')
+
+
+def process_batch(as_of, batch_size, rates):
+    """
+    Lock up to ``batch_size`` due accounts, skipping rows other workers hold,
+    and mature them: accrue interest up to the maturity date, credit it to the
+    ledger and close the deposit. Returns (accounts processed, amount credited).
+    """
+    with transaction.atomic():
+        rows = list(
+            ledger.with_balances(due_accounts(as_of).select_for_update(skip_locked=True))
+            .values_list(*MATURITY_COLUMNS, *stats.ACCOUNT_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0, Decimal('0')
+
+        split = len(MATURITY_COLUMNS)
+        stats_before = [row[split:] for row in rows]
+        pks, account_types, scheme_types, own_rates, carried, last_dates, opened, matures, balances = zip(
+            *[row[:split] for row in rows]
+        )
+        rate_column = [
+            rates.get((account_type, scheme_type), interest.to_basis_points(own_rate))
+            for account_type, scheme_type, own_rate in zip(account_types, scheme_types, own_rates)
+        ]
+        day_column = [(maturity - (last or start)).days for maturity, last, start in zip(matures, last_dates, opened)]
+        balance_column = [int(Decimal(balance).quantize(ledger.CENT).scaleb(2)) for balance in balances]
+        carried_column = [int(Decimal(units).scaleb(4)) for units in carried]
+        new_units = interest.accrue(balance_column, rate_column, day_column)
+        credits = interest.split_credit([old + new for old, new in zip(carried_column, new_units)])
+
+        updates = []
+        postings = []
+        credited = Decimal('0')
+        for i, pk in enumerate(pks):
+            credit, remainder = credits[i]
+            updates.append(AccountDetails(
+                pk=pk,
+                is_active=False,
+                accrued_interest=Decimal(remainder).scaleb(-4),
+                last_accrual_date=max(matures[i], last_dates[i] or matures[i]),
+            ))
+            if credit:
+                postings.append({
+                    'account_id': pk,
+                    'entry_type': 'INTEREST',
+                    'amount': Decimal(credit).scaleb(-2),
+                    'description': f'Maturity interest to {matures[i].isoformat()}',
+                })
+                credited += Decimal(credit).scaleb(-2)
+
+        # Credit before closing: post_entries only accepts active accounts
+        if postings:
+            ledger.post_entries(postings)
+        AccountDetails.objects.bulk_update(updates, ['is_active', 'accrued_interest', 'last_accrual_date'])
+        active_index = stats.ACCOUNT_FIELDS.index('is_active')
+        stats.record_account_changes(
+            stats_before,
+            [values[:active_index] + (False,) + values[active_index + 1:] for values in stats_before],
+        )
+        customers.invalidate_accounts(pks)
+    return len(rows), credited
+
+
+def run_maturities(as_of=None, batch_size=500, max_batches=None):
+    """
+    Process every deposit due by ``as_of`` (default today) in bounded batches.
+
+    Each batch is its own short transaction locked with SKIP LOCKED, so
+    several workers can run side by side without double-processing, and a
+    run after downtime simply catches up on everything overdue. The run and
+    its throughput are recorded as a MaturityRun.
+    """
+    as_of = as_of or date.today()
+    rates = interest.load_rates()
+    started_at = timezone.now()
+    started = time.perf_counter()
+    processed = batches = 0
+    credited = Decimal('0')
+
+    while max_batches is None or batches < max_batches:
+        count, amount = process_batch(as_of, batch_size, rates)
+        if not count:
+            break
+        processed += count
+        credited += amount
+        batches += 1
+
+    elapsed = time.perf_counter() - started
+    return MaturityRun.objects.create(
+        worker=f"{socket.gethostname()}:{os.getpid()}"[:100],
+        as_of=as_of,
+        started_at=started_at,
+        finished_at=timezone.now(),
+        processed=processed,
+        batches=batches,
+        credited=credited,
+        elapsed_seconds=elapsed,
+        accounts_per_sec=processed / elapsed if elapsed else 0.0,
+    )
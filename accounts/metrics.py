@@ -0,0 +1,267 @@
+import contextvars
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import DjangoTemplates, Template, reraise
+from django.utils.crypto import constant_time_compare
+
+# Upper bounds of the histogram buckets; everything larger lands in +Inf
+SECONDS_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Stats of the request being handled by the current thread/task, if any
+current_request = contextvars.ContextVar('current_request', default=None)
+
+
+class RequestStats:
+    """What one request spent, filled in by the query wrapper and template backend"""
+    __slots__ = ('queries', 'db_seconds', 'template_seconds', 'template_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.template_seconds = 0.0
+        self.template_depth = 0
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram per label value. Observing is a bisect and two
+    additions under a lock, cheap enough to leave on for every request;
+    quantiles are estimated from the buckets the way Prometheus'
+    histogram_quantile() does.
+    """
+
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, label, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(label)
+            if series is None:
+                # One slot per bucket plus +Inf, then sum and count
+                series = self.series[label] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {label: list(series) for label, series in self.series.items()}
+
+    def quantile(self, q, series):
+        count = series[-1]
+        if not count:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(series[:len(self.buckets) + 1]):
+            if cumulative + bucket_count >= rank and bucket_count:
+                if index == len(self.buckets):
+                    return float(self.buckets[-1])
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index]
+                return lower + (upper - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return float(self.buckets[-1])
+
+    def reset(self):
+        with self.lock:
+            self.series.clear()
+
+
+REQUEST_SECONDS = Histogram('bank_request_duration_seconds', 'Wall time per request by URL name.', SECONDS_BUCKETS)
+DB_QUERIES = Histogram('bank_request_db_queries', 'Database queries per request by URL name.', QUERY_BUCKETS)
+DB_SECONDS = Histogram('bank_request_db_seconds', 'Time spent in database queries per request by URL name.', SECONDS_BUCKETS)
+TEMPLATE_SECONDS = Histogram('bank_request_template_seconds', 'Template render time per request by URL name.', SECONDS_BUCKETS)
+HISTOGRAMS = [REQUEST_SECONDS, DB_QUERIES, DB_SECONDS, TEMPLATE_SECONDS]
+
+_responses = {}
+_responses_lock = threading.Lock()
+
+
+def record(view, status, elapsed, stats):
+    REQUEST_SECONDS.observe(view, elapsed)
+    DB_QUERIES.observe(view, stats.queries)
+    DB_SECONDS.observe(view, stats.db_seconds)
+    TEMPLATE_SECONDS.observe(view, stats.template_seconds)
+    key = (view, status)
+    with _responses_lock:
+        _responses[key] = _responses.get(key, 0) + 1
+
+
+def reset():
+    for histogram in HISTOGRAMS:
+        histogram.reset()
+    with _responses_lock:
+        _responses.clear()
+
+
+def time_query(execute, sql, params, many, context):
+    """Execute wrapper on every connection: count and time the queries of the current request"""
+    stats = current_request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+@receiver(connection_created)
+def install_query_timer(sender, connection, **kwargs):
+    # Installed per connection rather than per request so that async views, whose
+    # queries run on a worker thread's connection, are measured too
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched'
+    return match.view_name or match._func_path
+
+
+class MetricsMiddleware:
+    """
+    Record wall time, query count and time, and template time for every
+    request under its URL name. Put it first in MIDDLEWARE so the time
+    spent in the other middleware is included. Works for both sync and
+    async requests; METRICS_ENABLED=False switches it off.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            current_request.reset(token)
+            record(view_name(request), status, time.perf_counter() - started, stats)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await self.get_response(request)
+            status = response.status_code
+            return response
+        finally:
+            current_request.reset(token)
+            record(view_name(request), status, time.perf_counter() - started, stats)
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        stats = current_request.get()
+        if stats is None:
+            return super().render(context, request)
+        # Templates rendered from inside another render are already being timed
+        stats.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_depth -= 1
+            if not stats.template_depth:
+                stats.template_seconds += time.perf_counter() - started
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates backend whose templates report their render time to MetricsMiddleware"""
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return InstrumentedTemplate(self.engine.get_template(template_name), self)
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_prometheus():
+    """All metrics of this worker process in the Prometheus text exposition format"""
+    worker = _escape(os.getpid())
+    lines = []
+    for histogram in HISTOGRAMS:
+        series = sorted(histogram.snapshot().items())
+        lines.append(f'# HELP {histogram.name} {histogram.documentation}')
+        lines.append(f'# TYPE {histogram.name} histogram')
+        for view, values in series:
+            labels = f'view="{_escape(view)}",worker="{worker}"'
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{histogram.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{histogram.name}_sum{{{labels}}} {_number(values[-2])}')
+            lines.append(f'{histogram.name}_count{{{labels}}} {values[-1]}')
+
+        name = f'{histogram.name}_quantile'
+        lines.append(f'# HELP {name} Estimated quantiles of {histogram.name}.')
+        lines.append(f'# TYPE {name} gauge')
+        for view, values in series:
+            for q in QUANTILES:
+                value = histogram.quantile(q, values)
+                lines.append(f'{name}{{view="{_escape(view)}",worker="{worker}",quantile="{q}"}} {_number(value)}')
+
+    with _responses_lock:
+        responses = sorted(_responses.items())
+    lines.append('# HELP bank_responses_total Responses by URL name and status code.')
+    lines.append('# TYPE bank_responses_total counter')
+    for (view, status), count in responses:
+        lines.append(f'bank_responses_total{{view="{_escape(view)}",status="{status}",worker="{worker}"}} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+def is_authorized(request):
+    """
+    Scrapes must send ``Authorization: Bearer <METRICS_TOKEN>``. Without a
+    token only DEBUG serves the metrics; production fails closed.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token:
+        return settings.DEBUG
+    return constant_time_compare(request.headers.get('Authorization', ''), f'Bearer {token}')
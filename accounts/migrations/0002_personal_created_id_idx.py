@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='personaldetails',
+            index=models.Index(fields=['-created_at', '-id'], name='personal_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def index_existing_customers(apps, schema_editor):
+    from accounts.search import tokens_for
+
+    PersonalDetails = apps.get_model('accounts', 'PersonalDetails')
+    SearchToken = apps.get_model('accounts', 'SearchToken')
+    rows = []
+    for personal in PersonalDetails.objects.order_by('id').iterator(chunk_size=2000):
+        for field, token, weight in set(tokens_for(personal)):
+            rows.append(SearchToken(personal_details_id=personal.pk, field=field, token=token, weight=weight))
+        if len(rows) >= 10000:
+            SearchToken.objects.bulk_create(rows)
+            rows = []
+    SearchToken.objects.bulk_create(rows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_personal_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=20)),
+                ('token', models.CharField(max_length=40)),
+                ('weight', models.PositiveSmallIntegerField(default=1)),
+                ('personal_details', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_tokens', to='accounts.personaldetails')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['token', 'personal_details'], name='search_token_idx')],
+            },
+        ),
+        migrations.RunPython(index_existing_customers, migrations.RunPython.noop),
+    ]
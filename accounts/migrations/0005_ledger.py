@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_existing_balances(apps, schema_editor):
+    AccountDetails = apps.get_model('accounts', 'AccountDetails')
+    LedgerEntry = apps.get_model('accounts', 'LedgerEntry')
+    entries = (
+        LedgerEntry(account_id=pk, entry_type='OPENING', amount=balance, description='Opening balance')
+        for pk, balance in AccountDetails.objects.exclude(current_balance=0).values_list('pk', 'current_balance').iterator()
+    )
+    LedgerEntry.objects.bulk_create(entries, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_idsequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('last_entry_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_snapshots', to='accounts.accountdetails')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', '-last_entry_id'], name='snapshot_account_entry_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('OPENING', 'Opening Balance'), ('DEPOSIT', 'Deposit'), ('WITHDRAWAL', 'Withdrawal'), ('INTEREST', 'Interest'), ('ADJUSTMENT', 'Adjustment')], max_length=20)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('description', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='accounts.accountdetails')),
+            ],
+            options={
+                'verbose_name_plural': 'Ledger Entries',
+                'indexes': [models.Index(fields=['account', 'id'], name='ledger_account_id_idx')],
+            },
+        ),
+        migrations.RunPython(open_existing_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:01
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+# Starting rates per (account type, scheme); edit them in the admin afterwards
+DEFAULT_RATES = {
+    'SAVINGS': {'REGULAR': '3.50', 'SENIOR_CITIZEN': '4.00', 'STUDENT': '3.50', 'WOMEN': '3.75', 'RURAL': '3.75'},
+    'CURRENT': {'REGULAR': '0.00', 'SENIOR_CITIZEN': '0.00', 'STUDENT': '0.00', 'WOMEN': '0.00', 'RURAL': '0.00'},
+    'FIXED_DEPOSIT': {'REGULAR': '6.50', 'SENIOR_CITIZEN': '7.00', 'STUDENT': '6.50', 'WOMEN': '6.75', 'RURAL': '6.75'},
+    'RECURRING_DEPOSIT': {'REGULAR': '6.00', 'SENIOR_CITIZEN': '6.50', 'STUDENT': '6.00', 'WOMEN': '6.25', 'RURAL': '6.25'},
+}
+
+
+def seed_interest_rates(apps, schema_editor):
+    InterestRate = apps.get_model('accounts', 'InterestRate')
+    InterestRate.objects.bulk_create([
+        InterestRate(account_type=account_type, scheme_type=scheme_type, rate=Decimal(rate))
+        for account_type, schemes in DEFAULT_RATES.items()
+        for scheme_type, rate in schemes.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='accountdetails',
+            name='accrued_interest',
+            field=models.DecimalField(decimal_places=4, default=0, max_digits=19),
+        ),
+        migrations.AddField(
+            model_name='accountdetails',
+            name='last_accrual_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='InterestRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('account_type', models.CharField(choices=[('SAVINGS', 'Savings Account'), ('CURRENT', 'Current Account'), ('FIXED_DEPOSIT', 'Fixed Deposit'), ('RECURRING_DEPOSIT', 'Recurring Deposit')], max_length=20)),
+                ('scheme_type', models.CharField(choices=[('REGULAR', 'Regular'), ('SENIOR_CITIZEN', 'Senior Citizen'), ('STUDENT', 'Student'), ('WOMEN', 'Women'), ('RURAL', 'Rural')], max_length=20)),
+                ('rate', models.DecimalField(decimal_places=2, max_digits=5)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account_type', 'scheme_type'), name='unique_interest_rate')],
+            },
+        ),
+        migrations.RunPython(seed_interest_rates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_interest_accrual'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaturityRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('worker', models.CharField(max_length=100)),
+                ('as_of', models.DateField()),
+                ('started_at', models.DateTimeField()),
+                ('finished_at', models.DateTimeField()),
+                ('processed', models.PositiveIntegerField(default=0)),
+                ('batches', models.PositiveIntegerField(default=0)),
+                ('credited', models.DecimalField(decimal_places=2, default=0, max_digits=17)),
+                ('elapsed_seconds', models.FloatField(default=0)),
+                ('accounts_per_sec', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='accountdetails',
+            index=models.Index(fields=['maturity_date', 'is_active'], name='account_maturity_idx'),
+        ),
+    ]
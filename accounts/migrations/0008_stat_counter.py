@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:12
+
+from django.db import migrations, models
+
+
+def build_rollup(apps, schema_editor):
+    from accounts.stats import rebuild
+
+    rebuild(
+        counter_model=apps.get_model('accounts', 'StatCounter'),
+        personal_model=apps.get_model('accounts', 'PersonalDetails'),
+        account_model=apps.get_model('accounts', 'AccountDetails'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_maturity_scheduler'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dimension', models.CharField(max_length=30)),
+                ('key', models.CharField(max_length=50)),
+                ('count', models.BigIntegerField(default=0)),
+                ('deposit_total', models.DecimalField(decimal_places=2, default=0, max_digits=19)),
+                ('balance_total', models.DecimalField(decimal_places=2, default=0, max_digits=19)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('dimension', 'key'), name='unique_stat_counter')],
+            },
+        ),
+        migrations.RunPython(build_rollup, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:21
+
+import accounts.encryption
+from django.db import IntegrityError, migrations, transaction
+
+CHUNK_SIZE = 1000
+
+
+def encrypt_existing_rows(apps, schema_editor):
+    """
+    Encrypt the plaintext Aadhaar/PAN of existing rows and fill their blind
+    indexes, so the unique constraints on the indexes cover them from the
+    start. Rows whose numbers clash once normalized keep a NULL index and are
+    reported by ``manage.py encrypt_identity_numbers``.
+
+    Rows are encrypted with the keys active when this runs, so set
+    FIELD_ENCRYPTION_KEYS and BLIND_INDEX_KEY first: outside development
+    accounts.encryption refuses to fall back to keys derived from SECRET_KEY.
+    There is no reverse; unapplying would leave ciphertext in the plain
+    columns, so the migration is irreversible.
+    """
+    for model_name in ('PersonalDetails', 'NomineeDetails'):
+        model = apps.get_model('accounts', model_name)
+        encrypted = [f.name for f in model._meta.concrete_fields if isinstance(f, accounts.encryption.EncryptedCharField)]
+        indexes = [f for f in model._meta.concrete_fields if isinstance(f, accounts.encryption.BlindIndexField)]
+        fields = encrypted + [index.name for index in indexes]
+        last_pk = 0
+        while True:
+            chunk = list(model.objects.filter(pk__gt=last_pk).order_by('pk').only('pk', *encrypted)[:CHUNK_SIZE])
+            if not chunk:
+                break
+            for instance in chunk:
+                for index in indexes:
+                    setattr(instance, index.attname, accounts.encryption.blind_index(index.kind, getattr(instance, index.source)))
+            try:
+                with transaction.atomic():
+                    model.objects.bulk_update(chunk, fields)
+            except IntegrityError:
+                for instance in chunk:
+                    try:
+                        with transaction.atomic():
+                            model.objects.bulk_update([instance], fields)
+                    except IntegrityError:
+                        # Still encrypted, left unindexed for the command to report
+                        with transaction.atomic():
+                            model.objects.bulk_update([instance], encrypted)
+            last_pk = chunk[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_stat_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nomineedetails',
+            name='nominee_aadhar_number_index',
+            field=accounts.encryption.BlindIndexField(db_index=True, kind='aadhaar', source='nominee_aadhar_number'),
+        ),
+        migrations.AddField(
+            model_name='nomineedetails',
+            name='nominee_pan_card_number_index',
+            field=accounts.encryption.BlindIndexField(db_index=True, kind='pan', source='nominee_pan_card_number'),
+        ),
+        migrations.AddField(
+            model_name='personaldetails',
+            name='aadhar_number_index',
+            field=accounts.encryption.BlindIndexField(kind='aadhaar', source='aadhar_number', unique=True),
+        ),
+        migrations.AddField(
+            model_name='personaldetails',
+            name='pan_card_number_index',
+            field=accounts.encryption.BlindIndexField(kind='pan', source='pan_card_number', unique=True),
+        ),
+        migrations.AlterField(
+            model_name='nomineedetails',
+            name='nominee_aadhar_number',
+            field=accounts.encryption.EncryptedCharField(max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='nomineedetails',
+            name='nominee_pan_card_number',
+            field=accounts.encryption.EncryptedCharField(max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='personaldetails',
+            name='aadhar_number',
+            field=accounts.encryption.EncryptedCharField(max_length=12),
+        ),
+        migrations.AlterField(
+            model_name='personaldetails',
+            name='pan_card_number',
+            field=accounts.encryption.EncryptedCharField(max_length=10),
+        ),
+        migrations.RunPython(encrypt_existing_rows),
+    ]
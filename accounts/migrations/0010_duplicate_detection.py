@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_keys(apps, schema_editor):
+    from accounts.dedup import rebuild_keys
+
+    rebuild_keys(
+        personal_model=apps.get_model('accounts', 'PersonalDetails'),
+        key_model=apps.get_model('accounts', 'DedupKey'),
+    )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0009_encrypt_identity_numbers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DedupKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('name_dob', 'Phonetic name + date of birth'), ('address', 'Normalized address + pincode')], max_length=10)),
+                ('key', models.CharField(max_length=64)),
+                ('personal_details', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='dedup_keys', to='accounts.personaldetails')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'key', 'personal_details'], name='dedup_key_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DuplicateMatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('reasons', models.CharField(max_length=100)),
+                ('source', models.CharField(choices=[('ONBOARDING', 'Onboarding'), ('SCAN', 'Batch scan')], max_length=10)),
+                ('status', models.CharField(choices=[('PENDING', 'Pending review'), ('DUPLICATE', 'Duplicate'), ('DISTINCT', 'Not a duplicate')], default='PENDING', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='duplicate_matches', to='accounts.personaldetails')),
+                ('duplicate_of', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='accounts.personaldetails')),
+            ],
+            options={
+                'verbose_name_plural': 'Duplicate matches',
+                'indexes': [models.Index(fields=['status', '-score'], name='duplicate_status_idx')],
+                'constraints': [models.UniqueConstraint(fields=('customer', 'duplicate_of'), name='unique_duplicate_match')],
+            },
+        ),
+        migrations.RunPython(build_keys, migrations.RunPython.noop),
+    ]
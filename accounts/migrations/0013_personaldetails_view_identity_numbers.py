@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 19:13
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0012_audit_entry'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='personaldetails',
+            options={'permissions': [('view_identity_numbers', 'Can see whole Aadhaar and PAN numbers')], 'verbose_name_plural': 'Personal Details'},
+        ),
+    ]
@@ -1,6 +1,10 @@
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-import uuid
-from datetime import datetime, timedelta
+from django.utils import timezone
+from datetime import date, datetime, timedelta
+from . import ids, pincodes
+from .encryption import BlindIndexField, EncryptedCharField
 
 class PersonalDetails(models.Model):
     # Personal Information
@@ -25,8 +29,11 @@ class PersonalDetails(models.Model):
     state = models.CharField(max_length=100)
     
     # Identity Documents
-    aadhar_number = models.CharField(max_length=12, unique=True)
-    pan_card_number = models.CharField(max_length=10, unique=True)
+    # Stored encrypted; uniqueness and lookups go through the blind indexes
+    aadhar_number = EncryptedCharField(max_length=12)
+    pan_card_number = EncryptedCharField(max_length=10)
+    aadhar_number_index = BlindIndexField(source='aadhar_number', kind='aadhaar', unique=True)
+    pan_card_number_index = BlindIndexField(source='pan_card_number', kind='pan', unique=True)
     
     # Bank Generated IDs
     leg_number = models.CharField(max_length=20, unique=True, blank=True)
@@ -38,15 +45,18 @@ class PersonalDetails(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    def assign_generated_ids(self):
+        """Fill in any missing bank-generated IDs (bulk inserts use ids.assign_ids)"""
+        ids.assign_ids([self])
+    
+    def clean(self):
+        # The state must agree with the pincode directory (no query: it is held in memory)
+        errors = pincodes.validate(self.pincode, self.state)
+        if errors:
+            raise ValidationError(errors)
+    
     def save(self, *args, **kwargs):
-        if not self.leg_number:
-            self.leg_number = f"LEG{str(uuid.uuid4())[:8].upper()}"
-        if not self.account_number:
-            self.account_number = f"ACC{str(uuid.uuid4())[:12].upper()}"
-        if not self.cif_id:
-            self.cif_id = f"CIF{str(uuid.uuid4())[:10].upper()}"
-        if not self.asacass_number:
-            self.asacass_number = f"ASA{str(uuid.uuid4())[:15].upper()}"
+        self.assign_generated_ids()
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -54,6 +64,11 @@ class PersonalDetails(models.Model):
     
     class Meta:
         verbose_name_plural = "Personal Details"
+        permissions = [('view_identity_numbers', 'Can see whole Aadhaar and PAN numbers')]
+        indexes = [
+            # Keyset pagination on the dashboard walks (created_at, id) newest-first
+            models.Index(fields=['-created_at', '-id'], name='personal_created_id_idx'),
+        ]
 
 class FamilyDetails(models.Model):
     personal_details = models.OneToOneField(PersonalDetails, on_delete=models.CASCADE, related_name='family_details')
@@ -93,8 +108,10 @@ class NomineeDetails(models.Model):
     nominee_mobile_number = models.CharField(max_length=15)
     nominee_email = models.EmailField(blank=True, null=True)
     nominee_address = models.TextField()
-    nominee_aadhar_number = models.CharField(max_length=12)
-    nominee_pan_card_number = models.CharField(max_length=10)
+    nominee_aadhar_number = EncryptedCharField(max_length=12)
+    nominee_pan_card_number = EncryptedCharField(max_length=10)
+    nominee_aadhar_number_index = BlindIndexField(source='nominee_aadhar_number', kind='aadhaar', db_index=True)
+    nominee_pan_card_number_index = BlindIndexField(source='nominee_pan_card_number', kind='pan', db_index=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -140,13 +157,22 @@ class AccountDetails(models.Model):
     branch_code = models.CharField(max_length=10, default='MAIN001')
     interest_rate = models.DecimalField(max_digits=5, decimal_places=2, default=3.50)
     
+    # Interest Accrual (accrued is carried to 4 places until it is credited)
+    accrued_interest = models.DecimalField(max_digits=19, decimal_places=4, default=0)
+    last_accrual_date = models.DateField(blank=True, null=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
-    def save(self, *args, **kwargs):
+    def set_maturity_date(self):
+        """Set maturity date to 1 year from opening for fixed/recurring deposits"""
         if self.account_type in ['FIXED_DEPOSIT', 'RECURRING_DEPOSIT'] and not self.maturity_date:
-            # Set maturity date to 1 year from opening for fixed deposits
-            self.maturity_date = self.date_of_opening + timedelta(days=365)
+            # date_of_opening is only filled in by auto_now_add during the insert itself
+            opened = self.date_of_opening or date.today()
+            self.maturity_date = opened + timedelta(days=365)
+    
+    def save(self, *args, **kwargs):
+        self.set_maturity_date()
         super().save(*args, **kwargs)
     
     def __str__(self):
@@ -154,3 +180,238 @@ class AccountDetails(models.Model):
     
     class Meta:
         verbose_name_plural = "Account Details"
+        indexes = [
+            # The maturity scheduler scans for active deposits due on or before a date
+            models.Index(fields=['maturity_date', 'is_active'], name='account_maturity_idx'),
+        ]
+
+class SearchToken(models.Model):
+    """Normalized token of a searchable customer field, scanned by prefix range"""
+    personal_details = models.ForeignKey(PersonalDetails, on_delete=models.CASCADE, related_name='search_tokens')
+    field = models.CharField(max_length=20)
+    token = models.CharField(max_length=40)
+    weight = models.PositiveSmallIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.field}: {self.token}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['token', 'personal_details'], name='search_token_idx'),
+        ]
+
+class IdSequence(models.Model):
+    """Counter behind one kind of bank-generated ID, reserved in blocks by ids.BlockIdAllocator"""
+    name = models.CharField(max_length=50, unique=True)
+    next_value = models.BigIntegerField(default=1)
+    
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+class LedgerEntry(models.Model):
+    """Append-only posting against an account; amount is signed (credits positive)"""
+    ENTRY_TYPES = [
+        ('OPENING', 'Opening Balance'),
+        ('DEPOSIT', 'Deposit'),
+        ('WITHDRAWAL', 'Withdrawal'),
+        ('INTEREST', 'Interest'),
+        ('ADJUSTMENT', 'Adjustment'),
+    ]
+    
+    account = models.ForeignKey(AccountDetails, on_delete=models.CASCADE, related_name='ledger_entries')
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    amount = models.DecimalField(max_digits=15, decimal_places=2)
+    description = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.entry_type} {self.amount} on account {self.account_id}"
+    
+    class Meta:
+        verbose_name_plural = "Ledger Entries"
+        indexes = [
+            # Balance reads sum an account's entries after its latest snapshot
+            models.Index(fields=['account', 'id'], name='ledger_account_id_idx'),
+        ]
+
+class BalanceSnapshot(models.Model):
+    """Balance of an account as of ledger entry ``last_entry_id`` (inclusive)"""
+    account = models.ForeignKey(AccountDetails, on_delete=models.CASCADE, related_name='balance_snapshots')
+    balance = models.DecimalField(max_digits=15, decimal_places=2)
+    last_entry_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.balance} on account {self.account_id} at entry {self.last_entry_id}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', '-last_entry_id'], name='snapshot_account_entry_idx'),
+        ]
+
+class InterestRate(models.Model):
+    """Annual interest rate for an account type and scheme, used by accrue_interest"""
+    account_type = models.CharField(max_length=20, choices=AccountDetails.ACCOUNT_TYPES)
+    scheme_type = models.CharField(max_length=20, choices=AccountDetails.SCHEME_TYPES)
+    rate = models.DecimalField(max_digits=5, decimal_places=2)
+    
+    def __str__(self):
+        return f"{self.account_type}/{self.scheme_type}: {self.rate}%"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account_type', 'scheme_type'], name='unique_interest_rate'),
+        ]
+
+class MaturityRun(models.Model):
+    """One pass of the maturity scheduler and the throughput it achieved"""
+    worker = models.CharField(max_length=100)
+    as_of = models.DateField()
+    started_at = models.DateTimeField()
+    finished_at = models.DateTimeField()
+    processed = models.PositiveIntegerField(default=0)
+    batches = models.PositiveIntegerField(default=0)
+    credited = models.DecimalField(max_digits=17, decimal_places=2, default=0)
+    elapsed_seconds = models.FloatField(default=0)
+    accounts_per_sec = models.FloatField(default=0)
+    
+    def __str__(self):
+        return f"Maturity run {self.as_of} by {self.worker}: {self.processed} accounts"
+
+class StatCounter(models.Model):
+    """
+    Dashboard rollup row: account count and deposit/balance totals for one
+    (dimension, key), e.g. ('account_type', 'SAVINGS') or ('branch_code',
+    'MAIN001'). Kept current incrementally by accounts.stats.
+    """
+    dimension = models.CharField(max_length=30)
+    key = models.CharField(max_length=50)
+    count = models.BigIntegerField(default=0)
+    deposit_total = models.DecimalField(max_digits=19, decimal_places=2, default=0)
+    balance_total = models.DecimalField(max_digits=19, decimal_places=2, default=0)
+    
+    def __str__(self):
+        return f"{self.dimension}={self.key}: {self.count}"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['dimension', 'key'], name='unique_stat_counter'),
+        ]
+
+class DedupKey(models.Model):
+    """
+    Blocking key of a customer for duplicate detection (see accounts.dedup):
+    customers sharing a key form a block and are only compared within it
+    """
+    KINDS = [
+        ('name_dob', 'Phonetic name + date of birth'),
+        ('address', 'Normalized address + pincode'),
+    ]
+    
+    personal_details = models.ForeignKey(PersonalDetails, on_delete=models.CASCADE, related_name='dedup_keys')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    key = models.CharField(max_length=64)
+    
+    def __str__(self):
+        return f"{self.kind}: {self.key}"
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'key', 'personal_details'], name='dedup_key_idx'),
+        ]
+
+class DuplicateMatch(models.Model):
+    """A pair of customers that look like the same person, queued for staff review"""
+    STATUSES = [
+        ('PENDING', 'Pending review'),
+        ('DUPLICATE', 'Duplicate'),
+        ('DISTINCT', 'Not a duplicate'),
+    ]
+    SOURCES = [
+        ('ONBOARDING', 'Onboarding'),
+        ('SCAN', 'Batch scan'),
+    ]
+    
+    # customer is always the newer of the two (higher id)
+    customer = models.ForeignKey(PersonalDetails, on_delete=models.CASCADE, related_name='duplicate_matches')
+    duplicate_of = models.ForeignKey(PersonalDetails, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    reasons = models.CharField(max_length=100)
+    source = models.CharField(max_length=10, choices=SOURCES)
+    status = models.CharField(max_length=10, choices=STATUSES, default='PENDING')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.customer_id} ~ {self.duplicate_of_id} ({self.score:.2f})"
+    
+    class Meta:
+        verbose_name_plural = "Duplicate matches"
+        constraints = [
+            models.UniqueConstraint(fields=['customer', 'duplicate_of'], name='unique_duplicate_match'),
+        ]
+        indexes = [
+            models.Index(fields=['status', '-score'], name='duplicate_status_idx'),
+        ]
+
+class Job(models.Model):
+    """Background task queued by accounts.jobs.enqueue and run by ``manage.py run_workers``"""
+    STATUSES = [
+        ('QUEUED', 'Queued'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    status = models.CharField(max_length=10, choices=STATUSES, default='QUEUED')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    # Not claimed before this time; retries are pushed back here
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(blank=True, null=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+    
+    class Meta:
+        indexes = [
+            # Workers claim the oldest due jobs of a status
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+class AuditEntry(models.Model):
+    """
+    One field change on a customer's records, written in batches by
+    accounts.audit. Rows are identified by plain ids rather than foreign
+    keys so the trail outlives a deleted customer.
+    """
+    ACTIONS = [
+        ('CREATE', 'Created'),
+        ('UPDATE', 'Updated'),
+    ]
+    
+    personal_id = models.BigIntegerField()
+    model = models.CharField(max_length=30)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    field = models.CharField(max_length=50)
+    old_value = models.TextField(blank=True, null=True)
+    new_value = models.TextField(blank=True, null=True)
+    changed_by = models.CharField(max_length=150, blank=True)
+    # When the change was saved, not when its batch was written
+    changed_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.model} #{self.object_id} {self.field}"
+    
+    class Meta:
+        verbose_name_plural = "Audit entries"
+        indexes = [
+            # A customer's history newest-first
+            models.Index(fields=['personal_id', '-changed_at', '-id'], name='audit_customer_time_idx'),
+        ]
@@ -0,0 +1,151 @@
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models
+
+from .forms import PersonalDetailsForm, FamilyDetailsForm, NomineeDetailsForm, AccountDetailsForm
+from .importer import UNIQUE_FIELDS, StepValidator, write_chunk
+from . import encryption
+from .models import PersonalDetails
+
+DRAFT_SESSION_KEY = 'onboarding_draft'
+
+
+class DraftStepForm:
+    """
+    Mixin for the wizard's step forms: skip ModelForm's per-field unique
+    queries, since nothing is written until the last step and commit()
+    checks every unique column at once.
+    """
+
+    def validate_unique(self):
+        pass
+
+
+def _draft_form(form_class):
+    return type(f'Draft{form_class.__name__}', (DraftStepForm, form_class), {})
+
+
+# Wizard steps in order as (key, step form, validator for the final commit)
+STEPS = [
+    ('personal', _draft_form(PersonalDetailsForm), StepValidator(PersonalDetailsForm)),
+    ('family', _draft_form(FamilyDetailsForm), StepValidator(FamilyDetailsForm)),
+    ('nominee', _draft_form(NomineeDetailsForm), StepValidator(NomineeDetailsForm)),
+    ('account', _draft_form(AccountDetailsForm), StepValidator(AccountDetailsForm)),
+]
+STEP_FORMS = {key: form_class for key, form_class, _ in STEPS}
+STEP_ORDER = [key for key, _, _ in STEPS]
+
+
+class Draft:
+    """
+    One in-progress onboarding held in the session: the raw field values of
+    each step (blanks dropped) plus the steps that passed validation. The
+    customer tables are not touched until ``commit()``.
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.data = session.get(DRAFT_SESSION_KEY) or {'steps': {}, 'completed': []}
+
+    def get(self, step):
+        return self.data['steps'].get(step, {})
+
+    def store(self, step, data, completed=False):
+        """
+        Keep ``step``'s own fields from ``data`` and with ``completed`` mark
+        the step done. Partial autosaves leave the mark as it was: editing a
+        submitted step must not send the user back through it, and commit()
+        validates every step again anyway.
+        """
+        fields = STEP_FORMS[step].base_fields
+        self.data['steps'][step] = {
+            name: data.get(name).strip() for name in fields if (data.get(name) or '').strip()
+        }
+        if completed and step not in self.data['completed']:
+            done = set(self.data['completed']) | {step}
+            self.data['completed'] = [key for key in STEP_ORDER if key in done]
+        self.session[DRAFT_SESSION_KEY] = self.data
+
+    def is_complete(self, step):
+        return step in self.data['completed']
+
+    def first_incomplete(self, before=None):
+        """First step not yet completed (only looking at steps ahead of ``before``)"""
+        for key in STEP_ORDER:
+            if key == before:
+                return None
+            if not self.is_complete(key):
+                return key
+        return None
+
+    def form(self, step, data=None):
+        """The step's form, bound to ``data`` or pre-filled from the draft"""
+        if data is not None:
+            return STEP_FORMS[step](data)
+        return STEP_FORMS[step](initial=self.get(step))
+
+    def preview(self):
+        """Unsaved PersonalDetails built from the draft, for the later steps' header card"""
+        instance, _ = STEPS[0][2].clean(self.get('personal'))
+        return instance
+
+    def clear(self):
+        self.session.pop(DRAFT_SESSION_KEY, None)
+
+
+def find_conflicts(personal):
+    """Unique columns of ``personal`` already taken by a customer, from one query"""
+    # (column, stored value) per field; encrypted fields are compared through their blind index
+    lookups = {field: encryption.lookup(PersonalDetails, field, getattr(personal, field)) for field in UNIQUE_FIELDS}
+    condition = models.Q()
+    for column, value in lookups.values():
+        condition |= models.Q(**{column: value})
+
+    errors = {}
+    for row in PersonalDetails.objects.filter(condition).values_list(*[column for column, _ in lookups.values()]):
+        for (field, (_, value)), stored in zip(lookups.items(), row):
+            if stored == value:
+                verbose_name = PersonalDetails._meta.get_field(field).verbose_name
+                errors[field] = [f'A customer with this {verbose_name} already exists.']
+    return errors
+
+
+def step_for(field):
+    """The wizard step that owns a form field (non-field errors belong to the first step)"""
+    return next((key for key, form_class, _ in STEPS if field in form_class.base_fields), STEP_ORDER[0])
+
+
+def commit(draft):
+    """
+    Create the customer and all its details from a finished draft and
+    return the saved PersonalDetails.
+
+    Every step is re-validated from the draft, the unique columns are
+    checked with a single query, and the four models, the opening ledger
+    entry, the search tokens and the rollup counts are written in one
+    transaction, which also queues the duplicate check and welcome email. Raises
+    ValidationError keyed by field name (see ``step_for``).
+    """
+    missing = draft.first_incomplete()
+    if missing:
+        raise ValidationError({'__all__': [f'The {missing} details step has not been completed.']})
+
+    instances = {}
+    errors = {}
+    for key, _, validator in STEPS:
+        instances[key], step_errors = validator.clean(draft.get(key))
+        errors.update(step_errors)
+    if errors:
+        raise ValidationError(errors)
+
+    conflicts = find_conflicts(instances['personal'])
+    if conflicts:
+        raise ValidationError(conflicts)
+    try:
+        write_chunk([(None, instances)], welcome=True)
+    except IntegrityError:
+        # Another onboarding took one of the values between the check and the insert
+        raise ValidationError(find_conflicts(instances['personal']) or {
+            '__all__': ['This customer could not be saved; please try again.'],
+        })
+    draft.clear()
+    return instances['personal']
@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.utils.functional import cached_property
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+def encode_cursor(created_at, pk):
+    """Encode a (created_at, id) position as an opaque URL-safe cursor"""
+    return f"{(created_at - EPOCH) // MICROSECOND}_{pk}"
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into (created_at, id), or None if it is invalid"""
+    if not cursor:
+        return None
+    micros, _, pk = cursor.partition('_')
+    try:
+        return EPOCH + int(micros) * MICROSECOND, int(pk)
+    except (ValueError, OverflowError):
+        return None
+
+
+def keyset_page(queryset, cursor=None, page_size=50):
+    """
+    Return one page of ``queryset`` newest-first, seeking past ``cursor``
+    on (created_at, id) instead of using OFFSET, so every page costs the
+    same regardless of how deep into the book it is.
+
+    Returns ``(rows, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    position = decode_cursor(cursor)
+    queryset = queryset.order_by('-created_at', '-id')
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(
+            models.Q(created_at__lt=created_at) |
+            models.Q(created_at=created_at, id__lt=pk)
+        )
+
+    # Fetch one extra row to know whether another page follows
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last.created_at, last.id)
+    return rows, next_cursor
+
+
+def estimated_row_count(model, using='default'):
+    """
+    Planner estimate of a table's rows, without scanning it: PostgreSQL's
+    pg_class.reltuples, MySQL's information_schema, else the highest
+    primary key (an index lookup; over-counts deleted rows). None if unknown.
+    """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [table],
+            )
+        else:
+            return model._base_manager.using(using).aggregate(top=models.Max('pk'))['top']
+        row = cursor.fetchone()
+    # reltuples is -1 for a table that was never analyzed
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator for very large changelists. Counts stop at ADMIN_EXACT_COUNT_LIMIT
+    rows: an unfiltered list bigger than that shows the table's estimated
+    size, and a filtered one counts at most that many rows, so neither
+    scans the whole table just to number the pages.
+    """
+
+    @cached_property
+    def count(self):
+        limit = getattr(settings, 'ADMIN_EXACT_COUNT_LIMIT', 10000)
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return estimate
+        return queryset.order_by()[:limit].count()
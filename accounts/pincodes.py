@@ -0,0 +1,162 @@
+"""
+In-memory pincode directory for city/state autofill and state validation.
+
+The directory ships as a compact file (accounts/data/pincodes.bin, built
+by ``manage.py build_pincode_directory`` from the India Post pincode CSV):
+sorted pincodes and their district ids as packed arrays plus the district
+and state names. Loading it expands the pincodes into one direct-addressed
+``array('H')`` of district ids covering 100000-999999 (1.8 MB), so a lookup
+is a single array index with no database query.
+"""
+
+import json
+import os
+import re
+import sys
+from array import array
+from functools import lru_cache
+
+from django.conf import settings
+
+MAGIC = b'PINDIR1\n'
+FIRST_PINCODE = 100000
+LAST_PINCODE = 999999
+PINCODE_RE = re.compile(r'^[1-9][0-9]{5}$')
+NON_ALPHA = re.compile(r'[^a-z]+')
+
+# Renamed states, which older directory files and addresses still use
+PLACE_ALIASES = [
+    {'odisha', 'orissa'},
+    {'uttarakhand', 'uttaranchal'},
+    {'puducherry', 'pondicherry'},
+]
+
+
+def place_tokens(value):
+    tokens = set(NON_ALPHA.split((value or '').lower())) - {''}
+    for aliases in PLACE_ALIASES:
+        if tokens & aliases:
+            tokens |= aliases
+    return tokens
+
+
+class PincodeDirectory:
+    def __init__(self, districts, states, district_states, pincodes, pincode_districts, complete=False):
+        self.districts = districts
+        self.states = states
+        self.district_states = district_states
+        self.pincodes = pincodes
+        self.pincode_districts = pincode_districts
+        self.complete = complete
+        # District id + 1 per pincode (0 = unknown), indexed by pincode - FIRST_PINCODE
+        self.table = array('H', bytes(2 * (LAST_PINCODE - FIRST_PINCODE + 1)))
+        for pincode, district in zip(pincodes, pincode_districts):
+            self.table[pincode - FIRST_PINCODE] = district + 1
+
+    def __len__(self):
+        return len(self.pincodes)
+
+    @classmethod
+    def build(cls, records, complete=False):
+        """Directory from (pincode, district, state) rows; the first district seen for a pincode wins"""
+        districts, states = {}, {}
+        district_states = []
+        by_pincode = {}
+        for pincode, district, state in records:
+            pincode = int(pincode)
+            if pincode in by_pincode or not FIRST_PINCODE <= pincode <= LAST_PINCODE:
+                continue
+            key = (district.strip().title(), state.strip().title())
+            if key not in districts:
+                states.setdefault(key[1], len(states))
+                districts[key] = len(districts)
+                district_states.append(states[key[1]])
+            by_pincode[pincode] = districts[key]
+        ordered = sorted(by_pincode)
+        return cls(
+            [name for name, _ in districts], list(states), array('B', district_states),
+            array('I', ordered), array('H', [by_pincode[pincode] for pincode in ordered]), complete,
+        )
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as handle:
+            if handle.readline() != MAGIC:
+                raise ValueError(f'{path} is not a pincode directory file')
+            header = json.loads(handle.readline())
+            count = header['count']
+            pincodes, pincode_districts, district_states = array('I'), array('H'), array('B')
+            pincodes.fromfile(handle, count)
+            pincode_districts.fromfile(handle, count)
+            district_states.fromfile(handle, len(header['districts']))
+        if sys.byteorder != 'little':
+            pincodes.byteswap()
+            pincode_districts.byteswap()
+        return cls(header['districts'], header['states'], district_states, pincodes, pincode_districts,
+                   header.get('complete', False))
+
+    def save(self, path):
+        header = {'count': len(self.pincodes), 'complete': self.complete,
+                  'districts': self.districts, 'states': self.states}
+        with open(path, 'wb') as handle:
+            handle.write(MAGIC)
+            handle.write(json.dumps(header, separators=(',', ':')).encode() + b'\n')
+            # Arrays are written little-endian whatever the build machine
+            for values in (self.pincodes, self.pincode_districts):
+                if sys.byteorder != 'little':
+                    values = array(values.typecode, values)
+                    values.byteswap()
+                values.tofile(handle)
+            self.district_states.tofile(handle)
+
+    def lookup(self, pincode):
+        """(district, state) for a pincode, or None when it is not in the directory"""
+        pincode = str(pincode or '').strip()
+        if not PINCODE_RE.match(pincode):
+            return None
+        district = self.table[int(pincode) - FIRST_PINCODE]
+        if not district:
+            return None
+        return self.districts[district - 1], self.states[self.district_states[district - 1]]
+
+
+def directory_path():
+    return getattr(settings, 'PINCODE_DIRECTORY_PATH', os.path.join(os.path.dirname(__file__), 'data', 'pincodes.bin'))
+
+
+@lru_cache(maxsize=None)
+def get_directory():
+    """The process-wide directory, loaded once (AccountsConfig.ready() loads it at startup)"""
+    path = directory_path()
+    if not os.path.exists(path):
+        return PincodeDirectory([], [], array('B'), array('I'), array('H'))
+    return PincodeDirectory.load(path)
+
+
+def validation_mode():
+    """'off', 'known' (cross-check pincodes found in the directory) or 'strict' (also reject unknown ones)"""
+    return getattr(settings, 'PINCODE_VALIDATION', 'known')
+
+
+def validate(pincode, state):
+    """
+    Errors by field when the state contradicts the pincode's directory entry.
+    The city is not checked: the directory only knows the district, and a
+    post office's town often differs from it (Noida is in Gautam Buddha Nagar,
+    Secunderabad in Hyderabad), so the district only serves to autofill it.
+    """
+    mode = validation_mode()
+    if mode == 'off' or not pincode:
+        return {}
+    directory = get_directory()
+    entry = directory.lookup(pincode)
+    if entry is None:
+        # A partial directory (like the bundled sample) cannot tell a bad pincode from a missing one
+        if mode == 'strict' and directory.complete:
+            return {'pincode': ['This pincode is not in the pincode directory.']}
+        return {}
+
+    _, expected_state = entry
+    if state and place_tokens(state) != place_tokens(expected_state):
+        return {'state': [f'Pincode {pincode} is in {expected_state}.']}
+    return {}
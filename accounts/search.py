@@ -0,0 +1,157 @@
+import re
+
+from django.db import models, transaction
+
+from .models import PersonalDetails, SearchToken
+
+# Field weights; identifiers outrank names so a typed number lands on its owner first
+SEARCH_FIELDS = {
+    'account_number': 10,
+    'cif_id': 10,
+    'mobile_number': 8,
+    'first_name': 5,
+    'last_name': 5,
+}
+IDENTIFIER_FIELDS = {'account_number', 'cif_id', 'mobile_number'}
+
+MIN_TERM_LENGTH = 2
+MAX_TERMS = 4
+TOKEN_LENGTH = SearchToken._meta.get_field('token').max_length
+NON_ALNUM = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(value):
+    """Split a value into lowercase alphanumeric tokens"""
+    if not value:
+        return []
+    return [token[:TOKEN_LENGTH] for token in NON_ALNUM.split(str(value).lower()) if token]
+
+
+def tokens_for(personal):
+    """Yield (field, token, weight) for every searchable value of a customer"""
+    for field, weight in SEARCH_FIELDS.items():
+        value = getattr(personal, field)
+        for token in normalize(value):
+            yield field, token, weight
+        if field in IDENTIFIER_FIELDS and value:
+            # Identifiers are also indexed whole so "ACC12-34" and "acc1234" both hit
+            compact = NON_ALNUM.sub('', str(value).lower())
+            yield field, compact[:TOKEN_LENGTH], weight
+            if field == 'mobile_number' and compact.isdigit() and len(compact) > 10:
+                # Let "+91 98xxxxxxxx" and "98xxxxxxxx" find each other
+                yield field, compact[-10:], weight
+
+
+def build_tokens(personals):
+    """Unsaved SearchToken rows for an iterable of customers"""
+    rows = []
+    for personal in personals:
+        seen = set()
+        for field, token, weight in tokens_for(personal):
+            if (field, token) not in seen:
+                seen.add((field, token))
+                rows.append(SearchToken(personal_details_id=personal.pk, field=field, token=token, weight=weight))
+    return rows
+
+
+def index_customers(personals, batch_size=1000):
+    """(Re)build the search tokens for the given saved customers in one batch"""
+    personals = list(personals)
+    if not personals:
+        return 0
+    rows = build_tokens(personals)
+    with transaction.atomic():
+        SearchToken.objects.filter(personal_details_id__in=[p.pk for p in personals]).delete()
+        SearchToken.objects.bulk_create(rows, batch_size=batch_size)
+    return len(rows)
+
+
+def rebuild_index(chunk_size=2000):
+    """
+    Rebuild the whole search index, one chunk of customers at a time. Each
+    chunk's tokens are replaced in its own transaction, so searches keep
+    finding every customer while the rebuild runs.
+    """
+    total = 0
+    last_pk = 0
+    queryset = PersonalDetails.objects.only('id', *SEARCH_FIELDS).order_by('id')
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not batch:
+            return total
+        with transaction.atomic():
+            # The whole id range, so tokens left behind by anything in between go too
+            SearchToken.objects.filter(
+                personal_details_id__gt=last_pk, personal_details_id__lte=batch[-1].pk,
+            ).delete()
+            SearchToken.objects.bulk_create(build_tokens(batch), batch_size=chunk_size)
+        total += len(batch)
+        last_pk = batch[-1].pk
+
+
+# Columns loaded for each search hit
+RESULT_COLUMNS = ['id', 'first_name', 'last_name', 'account_number', 'mobile_number', 'cif_id']
+
+
+def prefix_range(term):
+    """Index-friendly prefix match: token >= term AND token < term + max char"""
+    return models.Q(token__gte=term, token__lt=term + '\uffff')
+
+
+def ranked_query(search_term, limit=10):
+    """
+    Ranked prefix search over names, account number, CIF ID and mobile,
+    as a (personal_details_id, score) queryset, or None for no usable terms.
+
+    Every term must prefix-match some token of the customer. Each term
+    scores its best-matching field weight, doubled for a whole-token match,
+    and customers are ranked by the total. Only the token index is scanned.
+    """
+    terms = [t for t in normalize(search_term) if len(t) >= MIN_TERM_LENGTH][:MAX_TERMS]
+    if not terms:
+        return None
+
+    matches = models.Q()
+    annotations = {}
+    for i, term in enumerate(terms):
+        matches |= prefix_range(term)
+        annotations[f'term_{i}'] = models.Max(models.Case(
+            models.When(token=term, then=models.F('weight') * 2),
+            models.When(prefix_range(term), then=models.F('weight')),
+            default=models.Value(0),
+            output_field=models.IntegerField(),
+        ))
+
+    return (
+        SearchToken.objects.filter(matches)
+        .values('personal_details_id')
+        .annotate(**annotations)
+        .filter(**{f'term_{i}__gt': 0 for i in range(len(terms))})
+        .annotate(score=sum((models.F(name) for name in annotations), models.Value(0)))
+        .order_by('-score', 'personal_details_id')
+        .values_list('personal_details_id', 'score')[:limit]
+    )
+
+
+def result_customers():
+    return PersonalDetails.objects.only(*RESULT_COLUMNS)
+
+
+def search(search_term, limit=10):
+    """Best matches for ``search_term`` as [(PersonalDetails, score)]; see ranked_query"""
+    ranked = ranked_query(search_term, limit)
+    ranked = list(ranked) if ranked is not None else []
+    if not ranked:
+        return []
+    customers = result_customers().in_bulk([pk for pk, _ in ranked])
+    return [(customers[pk], score) for pk, score in ranked if pk in customers]
+
+
+async def asearch(search_term, limit=10):
+    """search() for async views, using the async ORM"""
+    ranked = ranked_query(search_term, limit)
+    ranked = [row async for row in ranked] if ranked is not None else []
+    if not ranked:
+        return []
+    customers = await result_customers().ain_bulk([pk for pk, _ in ranked])
+    return [(customers[pk], score) for pk, score in ranked if pk in customers]
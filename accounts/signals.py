@@ -0,0 +1,98 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import PersonalDetails, FamilyDetails, NomineeDetails, AccountDetails
+from . import audit, customers, dedup, jobs, search, stats
+
+
+@receiver(post_save, sender=PersonalDetails)
+def update_search_index(sender, instance, update_fields=None, **kwargs):
+    """Keep the customer's search tokens in step with the row (deletes cascade)"""
+    if update_fields is not None and not set(update_fields) & set(search.SEARCH_FIELDS):
+        return
+    search.index_customers([instance])
+
+
+@receiver(post_save, sender=PersonalDetails)
+def update_dedup_keys(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    """Re-block the customer when its name, birth date or address changes; new ones are queued for a duplicate check"""
+    if raw:
+        return
+    if created:
+        jobs.enqueue('dedup.flag_new_customers', personal_ids=[instance.pk])
+    elif update_fields is None or set(update_fields) & dedup.KEY_FIELDS:
+        dedup.index_customers([instance])
+
+
+@receiver(post_save, sender=PersonalDetails)
+@receiver(post_delete, sender=PersonalDetails)
+def invalidate_customer(sender, instance, **kwargs):
+    customers.invalidate_customers([instance.pk])
+
+
+@receiver(post_save, sender=FamilyDetails)
+@receiver(post_save, sender=NomineeDetails)
+@receiver(post_save, sender=AccountDetails)
+@receiver(post_delete, sender=FamilyDetails)
+@receiver(post_delete, sender=NomineeDetails)
+@receiver(post_delete, sender=AccountDetails)
+def invalidate_customer_details(sender, instance, **kwargs):
+    customers.invalidate_customers([instance.personal_details_id])
+
+
+def _count_customers(delta):
+    deltas = stats.Deltas()
+    deltas.add_customers(delta)
+    deltas.apply()
+
+
+@receiver(post_save, sender=PersonalDetails)
+def count_customer(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        _count_customers(1)
+
+
+@receiver(post_delete, sender=PersonalDetails)
+def uncount_customer(sender, instance, **kwargs):
+    _count_customers(-1)
+
+
+@receiver(pre_save, sender=PersonalDetails)
+@receiver(pre_save, sender=FamilyDetails)
+@receiver(pre_save, sender=NomineeDetails)
+@receiver(pre_save, sender=AccountDetails)
+def remember_saved_row(sender, instance, raw=False, **kwargs):
+    """
+    Keep the stored row's columns for the audit trail's diff; for accounts
+    its rollup columns also let post_save move the account between rows
+    """
+    before = None if raw else audit.stored_snapshot(instance)
+    instance._audit_before = before
+    if sender is AccountDetails:
+        instance._stats_before = None if before is None else [before[name] for name in stats.ACCOUNT_FIELDS]
+
+
+@receiver(post_save, sender=PersonalDetails)
+@receiver(post_save, sender=FamilyDetails)
+@receiver(post_save, sender=NomineeDetails)
+@receiver(post_save, sender=AccountDetails)
+def audit_changes(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    audit.record(audit.diff(instance, instance._audit_before, update_fields))
+
+
+@receiver(post_save, sender=AccountDetails)
+def count_account(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    before = getattr(instance, '_stats_before', None)
+    after = stats.account_values(instance)
+    if before is not None and list(before) == after:
+        return
+    stats.record_account_changes([before] if before is not None else [], [after])
+
+
+@receiver(post_delete, sender=AccountDetails)
+def uncount_account(sender, instance, **kwargs):
+    stats.record_account_changes([stats.account_values(instance)], [])
@@ -0,0 +1,219 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, models, transaction
+from django.utils import timezone
+
+from .models import PersonalDetails, AccountDetails, StatCounter
+from . import audit
+
+ZERO = Decimal('0.00')
+CENT = Decimal('0.01')
+
+# AccountDetails columns that decide which rollup rows an account counts towards
+ACCOUNT_FIELDS = ['account_type', 'scheme_type', 'branch_code', 'is_active', 'is_approved', 'deposit_amount', 'current_balance']
+CUSTOMERS = ('customers', 'all')
+ACCOUNTS = ('accounts', 'all')
+
+
+def account_keys(account_type, scheme_type, branch_code, is_active, is_approved):
+    """The (dimension, key) rows one account is counted in"""
+    return [
+        ACCOUNTS,
+        ('account_type', account_type),
+        ('scheme_type', scheme_type),
+        ('branch_code', branch_code),
+        ('status', 'active' if is_active else 'inactive'),
+        ('approval', 'approved' if is_approved else 'pending'),
+    ]
+
+
+class Deltas:
+    """Changes to apply to the rollup, summed per row so a whole batch costs one UPDATE per touched row"""
+
+    def __init__(self):
+        self.rows = defaultdict(lambda: [0, ZERO, ZERO])
+
+    def add(self, key, count=0, deposit=ZERO, balance=ZERO):
+        row = self.rows[key]
+        row[0] += count
+        row[1] += deposit or ZERO
+        row[2] += balance or ZERO
+
+    def add_account(self, values, sign=1):
+        """Count (sign=1) or uncount (sign=-1) an account given its ACCOUNT_FIELDS values"""
+        *dimensions, deposit, balance = values
+        for key in account_keys(*dimensions):
+            self.add(key, sign, sign * Decimal(str(deposit or 0)), sign * Decimal(str(balance or 0)))
+
+    def add_customers(self, count):
+        self.add(CUSTOMERS, count)
+
+    def apply(self):
+        """Add the deltas to StatCounter inside the caller's transaction"""
+        # Always touch rows in the same order so concurrent batches cannot deadlock
+        for (dimension, key), (count, deposit, balance) in sorted(self.rows.items()):
+            if not count and not deposit and not balance:
+                continue
+            changes = {
+                'count': models.F('count') + count,
+                'deposit_total': models.F('deposit_total') + deposit,
+                'balance_total': models.F('balance_total') + balance,
+            }
+            counters = StatCounter.objects.filter(dimension=dimension, key=key)
+            if counters.update(**changes):
+                continue
+            try:
+                with transaction.atomic():
+                    StatCounter.objects.create(
+                        dimension=dimension, key=key, count=count, deposit_total=deposit, balance_total=balance,
+                    )
+            except IntegrityError:
+                # Another transaction created the row first
+                counters.update(**changes)
+        self.rows.clear()
+
+
+def account_values(account):
+    return [getattr(account, field) for field in ACCOUNT_FIELDS]
+
+
+def record_new(personals=(), accounts=()):
+    """Count customers and accounts inserted with bulk_create, in the transaction that inserted them"""
+    deltas = Deltas()
+    deltas.add_customers(len(personals))
+    for account in accounts:
+        deltas.add_account(account_values(account))
+    deltas.apply()
+
+
+def record_account_changes(old_rows, new_rows):
+    """Move accounts from their old ACCOUNT_FIELDS values to new ones (bulk_update paths)"""
+    deltas = Deltas()
+    for values in old_rows:
+        deltas.add_account(values, -1)
+    for values in new_rows:
+        deltas.add_account(values)
+    deltas.apply()
+
+
+def update_accounts(queryset, **changes):
+    """
+    Set rollup columns (e.g. is_approved=True) on every account in
+    ``queryset`` with one UPDATE, moving the changed accounts between
+    rollup rows from a GROUP BY of their old values and auditing the change;
+    returns the number of accounts changed. Runs in the caller's transaction.
+    """
+    differs = models.Q()
+    for field, value in changes.items():
+        differs |= ~models.Q(**{field: value})
+    queryset = queryset.filter(differs).order_by()
+
+    dimensions = ACCOUNT_FIELDS[:-2]
+    deltas = Deltas()
+    groups = queryset.values(*dimensions).annotate(
+        accounts=models.Count('pk'), deposits=models.Sum('deposit_amount'), balances=models.Sum('current_balance'),
+    )
+    for group in groups:
+        before = [group[field] for field in dimensions]
+        after = [changes.get(field, group[field]) for field in dimensions]
+        deposit, balance = _money(group['deposits']), _money(group['balances'])
+        for key in account_keys(*before):
+            deltas.add(key, -group['accounts'], -deposit, -balance)
+        for key in account_keys(*after):
+            deltas.add(key, group['accounts'], deposit, balance)
+    # update() skips save(), so snapshot the old values for the audit trail first
+    audit.record_update(queryset, **changes)
+    updated = queryset.update(**changes, updated_at=timezone.now())
+    deltas.apply()
+    return updated
+
+
+def _money(total):
+    # SQLite sums decimals as floats; round back to paise
+    return Decimal(str(total)).quantize(CENT) if total else ZERO
+
+
+def compute_rows(personal_model=PersonalDetails, account_model=AccountDetails):
+    """Every rollup row computed from scratch with GROUP BY, as {(dimension, key): (count, deposits, balances)}"""
+    rows = {CUSTOMERS: (personal_model.objects.count(), ZERO, ZERO)}
+    accounts = account_model.objects.order_by()
+    totals = models.Count('id'), models.Sum('deposit_amount'), models.Sum('current_balance')
+
+    overall = accounts.aggregate(count=totals[0], deposits=totals[1], balances=totals[2])
+    rows[ACCOUNTS] = (overall['count'], _money(overall['deposits']), _money(overall['balances']))
+    for field, dimension, label in [
+        ('account_type', 'account_type', None),
+        ('scheme_type', 'scheme_type', None),
+        ('branch_code', 'branch_code', None),
+        ('is_active', 'status', ('inactive', 'active')),
+        ('is_approved', 'approval', ('pending', 'approved')),
+    ]:
+        grouped = accounts.values(field).annotate(count=totals[0], deposits=totals[1], balances=totals[2])
+        for group in grouped:
+            key = label[bool(group[field])] if label else group[field]
+            rows[(dimension, key)] = (group['count'], _money(group['deposits']), _money(group['balances']))
+    return rows
+
+
+def rebuild(counter_model=StatCounter, **models_kwargs):
+    """
+    Replace the whole rollup with a fresh GROUP BY recomputation; returns
+    the number of rows. The counters are recounted and replaced while the
+    counter table is locked: on PostgreSQL an EXCLUSIVE lock first waits
+    for the transactions already incrementing it, whose rows the recount
+    then sees, and holds back new increments until the fresh rows are in,
+    so none is lost to the replacement. SQLite has a single writer.
+    """
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {connection.ops.quote_name(counter_model._meta.db_table)} IN EXCLUSIVE MODE')
+        rows = compute_rows(**models_kwargs)
+        counter_model.objects.all().delete()
+        counter_model.objects.bulk_create([
+            counter_model(dimension=dimension, key=key, count=count, deposit_total=deposits, balance_total=balances)
+            for (dimension, key), (count, deposits, balances) in rows.items()
+        ])
+    return len(rows)
+
+
+def _rollup_rows():
+    return StatCounter.objects.exclude(count=0).values_list(
+        'dimension', 'key', 'count', 'deposit_total', 'balance_total'
+    )
+
+
+def _nest(rows):
+    rollup = defaultdict(dict)
+    for dimension, key, count, deposits, balances in rows:
+        rollup[dimension][key] = {'count': count, 'deposit_total': deposits, 'balance_total': balances}
+    return rollup
+
+
+def read():
+    """The rollup as nested dicts: totals plus a breakdown per dimension"""
+    return _nest(_rollup_rows())
+
+
+async def aread():
+    """read() for async views"""
+    return _nest([row async for row in _rollup_rows()])
+
+
+def dashboard_stats():
+    """The dashboard's stat cards, read from the rollup instead of aggregating every account"""
+    rollup = read()
+    empty = {'count': 0, 'deposit_total': ZERO, 'balance_total': ZERO}
+    accounts = rollup['accounts'].get('all', empty)
+    return {
+        'total': rollup['customers'].get('all', empty)['count'],
+        'accounts': accounts['count'],
+        'active': rollup['status'].get('active', empty)['count'],
+        'pending': rollup['approval'].get('pending', empty)['count'],
+        'savings': rollup['account_type'].get('SAVINGS', empty)['count'],
+        'current': rollup['account_type'].get('CURRENT', empty)['count'],
+        'total_deposits': accounts['deposit_total'],
+        'total_balance': accounts['balance_total'],
+        'rollup': rollup,
+    }
@@ -0,0 +1,71 @@
+"""
+Background jobs queued after onboarding (see accounts.jobs).
+
+Onboarding only inserts and counts the customer and queues these; the
+duplicate check and the welcome email run on the workers, as does
+copying ledger balances to the accounts after a posting.
+"""
+
+from decimal import Decimal
+
+from django.core.mail import send_mail
+
+from .jobs import enqueue_many, task
+from .models import PersonalDetails
+from . import dedup, ledger, stats
+
+
+@task('dedup.flag_new_customers')
+def flag_new_customers(personal_ids):
+    """Block the new customers and queue any near-duplicates for review"""
+    customers = list(PersonalDetails.objects.filter(pk__in=personal_ids).only(*dedup.COLUMNS))
+    dedup.flag_new_customers(customers)
+
+
+@task('stats.record_new')
+def record_new(customers, accounts):
+    """
+    Count new customers and their accounts in the dashboard rollup. New
+    customers are now counted in the transaction that inserts them
+    (importer.write_chunk); this only drains jobs queued before that.
+    """
+    deltas = stats.Deltas()
+    deltas.add_customers(customers)
+    for values in accounts:
+        *dimensions, deposit, balance = values
+        deltas.add_account([*dimensions, Decimal(deposit or 0), Decimal(balance or 0)])
+    deltas.apply()
+
+
+@task('onboarding.welcome')
+def send_welcome(personal_id):
+    """Email a new customer their account number and CIF ID"""
+    customer = PersonalDetails.objects.filter(pk=personal_id).only(
+        'first_name', 'email_id', 'account_number', 'cif_id',
+    ).first()
+    if customer is None or not customer.email_id:
+        return
+    send_mail(
+        'Welcome to the bank',
+        f"Dear {customer.first_name},\n\n"
+        f"Your account has been opened.\n\n"
+        f"Account number: {customer.account_number}\n"
+        f"CIF ID: {customer.cif_id}\n",
+        None,
+        [customer.email_id],
+    )
+
+
+@task('ledger.refresh_balances')
+def refresh_balances(account_ids):
+    """Copy the ledger balance of accounts just posted to into their current_balance"""
+    ledger.refresh_balances(account_ids)
+
+
+def queue_new_customers(personals, welcome=False):
+    """Queue the follow-up work for customers just inserted by importer.write_chunk"""
+    personal_ids = [personal.pk for personal in personals]
+    jobs = [('dedup.flag_new_customers', {'personal_ids': personal_ids})]
+    if welcome:
+        jobs += [('onboarding.welcome', {'personal_id': pk}) for pk in personal_ids]
+    enqueue_many(jobs)
@@ -0,0 +1,56 @@
+"""
+``{% prerender %}``: render a template fragment once per process.
+
+For markup that is the same on every request but still costs template
+work, such as the navbar's URL reversals or the widgets of a blank
+onboarding form. The first render is kept in memory and returned as is
+afterwards; with ``when <expr>`` the fragment is only reused while the
+expression is true (a form without data or errors) and rendered normally
+otherwise::
+
+    {% load render_cache %}
+    {% prerender 'personal_form' when blank_form %}...{% endprerender %}
+
+Nothing inside may depend on the request (no ``{% csrf_token %}``, user or
+messages). Disabled by TEMPLATE_PRERENDER (off when DEBUG, so template
+edits show up without a restart).
+"""
+
+from django import template
+from django.conf import settings
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+_rendered = {}
+
+
+def enabled():
+    return getattr(settings, 'TEMPLATE_PRERENDER', not settings.DEBUG)
+
+
+class PrerenderNode(template.Node):
+    def __init__(self, nodelist, name, condition):
+        self.nodelist = nodelist
+        self.name = name
+        self.condition = condition
+
+    def render(self, context):
+        if not enabled() or (self.condition is not None and not self.condition.resolve(context)):
+            return self.nodelist.render(context)
+        key = (self.origin.name, self.name.resolve(context))
+        html = _rendered.get(key)
+        if html is None:
+            html = _rendered[key] = mark_safe(self.nodelist.render(context))
+        return html
+
+
+@register.tag
+def prerender(parser, token):
+    bits = token.split_contents()
+    if len(bits) not in (2, 4) or (len(bits) == 4 and bits[2] != 'when'):
+        raise template.TemplateSyntaxError(f"Usage: {{% {bits[0]} 'name' [when condition] %}}")
+    nodelist = parser.parse(('endprerender',))
+    parser.delete_first_token()
+    condition = parser.compile_filter(bits[3]) if len(bits) == 4 else None
+    return PrerenderNode(nodelist, parser.compile_filter(bits[1]), condition)
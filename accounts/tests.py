@@ -1,3 +1,1375 @@
-from django.test import TestCase
+import csv
+import glob
+import io
+import json
+import os
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from cryptography.fernet import Fernet
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed, ValidationError
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from bank_system import middleware, routers, warmup
+from benchmarks import generator, runner
+
+from .admin import set_account_flags
+from .models import (
+    AccountDetails, AuditEntry, BalanceSnapshot, DuplicateMatch, FamilyDetails, IdSequence, InterestRate, Job, LedgerEntry,
+    PersonalDetails, SearchToken,
+)
+from .pagination import decode_cursor, encode_cursor, keyset_page
+from .templatetags import render_cache
+from . import (
+    audit, batch, customers, dedup, encryption, export, ids, importer, interest, jobs, ledger, maturity, onboarding,
+    pincodes, search, stats,
+)
+
+
+def make_personal(n, **fields):
+    values = {
+        'first_name': f'Test{n}', 'last_name': 'Customer', 'date_of_birth': date(1990, 1, 1), 'gender': 'M',
+        'mobile_number': f'98000{n:05d}', 'email_id': f'customer{n}@example.com', 'address1': '1 Main Road',
+        'pincode': '110001', 'city': 'New Delhi', 'state': 'Delhi',
+        'aadhar_number': f'5000{n:08d}', 'pan_card_number': f'ABCDE{n:04d}F',
+    }
+    values.update(fields)
+    return PersonalDetails.objects.create(**values)
+
+
+def make_account(n, deposit='1000.00', **fields):
+    """A customer with an active savings account and its opening ledger entry"""
+    account = AccountDetails.objects.create(
+        personal_details=make_personal(n), account_type='SAVINGS', scheme_type='REGULAR',
+        deposit_amount=Decimal(deposit), current_balance=Decimal(deposit), **fields,
+    )
+    ledger.post_opening_entries([account])
+    return account
+
+
+IMPORT_FIELDS = [
+    'first_name', 'last_name', 'date_of_birth', 'gender', 'mobile_number', 'email_id', 'address1',
+    'pincode', 'city', 'state', 'aadhar_number', 'pan_card_number', 'account_type', 'scheme_type',
+    'deposit_amount',
+]
+
+
+def import_row(n, **fields):
+    values = {
+        'first_name': f'Import{n}', 'last_name': 'Customer', 'date_of_birth': '1985-06-15', 'gender': 'F',
+        'mobile_number': f'97000{n:05d}', 'email_id': f'import{n}@example.com', 'address1': '2 Park Street',
+        'pincode': '110001', 'city': 'New Delhi', 'state': 'Delhi',
+        'aadhar_number': f'6000{n:08d}', 'pan_card_number': f'PQRST{n:04d}K',
+        'account_type': 'SAVINGS', 'scheme_type': 'REGULAR', 'deposit_amount': '500.00',
+    }
+    values.update(fields)
+    return values
+
+
+def run_import(rows, **kwargs):
+    stream = io.StringIO()
+    writer = csv.DictWriter(stream, fieldnames=IMPORT_FIELDS)
+    writer.writeheader()
+    writer.writerows(rows)
+    stream.seek(0)
+    return importer.import_customers(stream, **kwargs)
+
+
+LOCMEM = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+# Per-test caches instead of the file-based customer cache, which would outlive the test database
+LOCMEM_CACHES = {
+    'default': LOCMEM,
+    'customers': {**LOCMEM, 'LOCATION': 'customers'},
+    'template_fragments': {**LOCMEM, 'LOCATION': 'fragments'},
+}
+
+
+def make_staff(username='staff', *permissions):
+    user = get_user_model().objects.create_user(username, password='pw', is_staff=True)
+    for codename in permissions:
+        user.user_permissions.add(Permission.objects.get(codename=codename))
+    return user
+
+
+class KeysetPaginationTests(TestCase):
+    def test_cursor_round_trip(self):
+        created_at = datetime(2024, 3, 1, 12, 30, 45, 123456, tzinfo=dt_timezone.utc)
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+
+    def test_invalid_cursors_decode_to_none(self):
+        for cursor in ('', None, 'garbage', '12_x', '_5', '9' * 400 + '_1'):
+            self.assertIsNone(decode_cursor(cursor))
+
+    def test_pages_walk_newest_first_without_gaps(self):
+        personals = [make_personal(n) for n in range(7)]
+        # Shared timestamps are ordered by id
+        PersonalDetails.objects.filter(pk__in=[p.pk for p in personals[2:5]]).update(
+            created_at=datetime(2024, 1, 1, tzinfo=dt_timezone.utc),
+        )
+        expected = list(PersonalDetails.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+        seen, cursor, pages = [], None, 0
+        while True:
+            rows, cursor = keyset_page(PersonalDetails.objects.all(), cursor, page_size=3)
+            seen.extend(row.pk for row in rows)
+            pages += 1
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+        self.assertEqual(pages, 3)
+
+    def test_last_full_page_has_no_next_cursor(self):
+        for n in range(3):
+            make_personal(n)
+        rows, cursor = keyset_page(PersonalDetails.objects.all(), page_size=3)
+        self.assertEqual((len(rows), cursor), (3, None))
+
+    def test_dashboard_follows_the_cursor(self):
+        for n in range(4):
+            make_personal(n)
+        with self.settings(DASHBOARD_PAGE_SIZE=3, STATICFILES_MANIFEST_FALLBACK=True):
+            first = self.client.get('/dashboard/')
+            second = self.client.get('/dashboard/', {'after': first.context['next_cursor']})
+        self.assertEqual(len(first.context['accounts']), 3)
+        self.assertEqual(len(second.context['accounts']), 1)
+        self.assertIsNone(second.context['next_cursor'])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.asha = make_personal(1, first_name='Asha', last_name='Verma', mobile_number='+91 9812345678')
+        self.ashok = make_personal(2, first_name='Ashok', last_name='Kumar')
+        self.kumar = make_personal(3, first_name='Ravi', last_name='Ashwin')
+
+    def pks(self, term):
+        return [personal.pk for personal, _ in search.search(term)]
+
+    def test_prefix_matches_rank_whole_tokens_first(self):
+        self.assertEqual(self.pks('asha')[0], self.asha.pk)
+        self.assertEqual(set(self.pks('ash')), {self.asha.pk, self.ashok.pk, self.kumar.pk})
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.pks('ash kum'), [self.ashok.pk])
+        self.assertEqual(self.pks('asha kumar'), [])
+
+    def test_identifiers_match_however_they_are_typed(self):
+        self.assertEqual(self.pks(self.asha.account_number.lower())[0], self.asha.pk)
+        self.assertEqual(self.pks(self.asha.cif_id[:8])[0], self.asha.pk)
+        # "+91 98..." is also indexed by its last ten digits
+        self.assertEqual(self.pks('9812345678'), [self.asha.pk])
+
+    def test_short_terms_are_ignored(self):
+        self.assertEqual(search.search('a'), [])
+
+    def test_saving_reindexes_the_customer(self):
+        self.asha.first_name = 'Meera'
+        self.asha.save()
+        self.assertEqual(self.pks('meera'), [self.asha.pk])
+        self.assertNotIn(self.asha.pk, self.pks('asha'))
+
+    def test_rebuild_keeps_the_index_searchable_while_it_runs(self):
+        SearchToken.objects.filter(personal_details=self.kumar).delete()
+        found_during = []
+        build_tokens = search.build_tokens
+
+        def build_and_search(batch):
+            # Customers outside the chunk being rebuilt are still found
+            if self.ashok not in batch:
+                found_during.append(self.pks('ashok'))
+            return build_tokens(batch)
+
+        with mock.patch.object(search, 'build_tokens', side_effect=build_and_search):
+            self.assertEqual(search.rebuild_index(chunk_size=1), 3)
+        self.assertEqual(found_during, [[self.ashok.pk]] * 2)
+        self.assertEqual(self.pks('ravi'), [self.kumar.pk])
+
+
+class ImporterTests(TestCase):
+    def errors_by_row(self, result):
+        return {error['row']: sorted(error['errors']) for error in result.errors}
+
+    def test_imports_valid_rows(self):
+        result = run_import([import_row(1), import_row(2)])
+        self.assertEqual((result.rows, result.created, result.errors), (2, 2, []))
+        personal = PersonalDetails.objects.get(email_id='import1@example.com')
+        self.assertEqual(personal.account_details.current_balance, Decimal('500.00'))
+        self.assertEqual(ledger.get_balance(personal.account_details.pk), Decimal('500.00'))
+        self.assertTrue(ids.is_valid_id('account_number', personal.account_number))
+        self.assertEqual([p.pk for p, _ in search.search('import1')], [personal.pk])
+
+    def test_reads_ndjson(self):
+        stream = io.StringIO(json.dumps(import_row(1)) + '\n\nnot json\n')
+        result = importer.import_customers(stream, fmt='ndjson')
+        self.assertEqual((result.rows, result.created), (2, 1))
+        self.assertEqual(result.errors[0]['row'], 3)
+
+    def test_dry_run_writes_nothing(self):
+        result = run_import([import_row(1)], dry_run=True)
+        self.assertEqual(result.created, 1)
+        self.assertFalse(PersonalDetails.objects.exists())
+
+    def test_duplicates_within_the_file_are_rejected(self):
+        result = run_import([import_row(1), import_row(2, mobile_number='9700000001')])
+        self.assertEqual(result.created, 1)
+        # Row 1 is the CSV header
+        self.assertEqual(self.errors_by_row(result), {3: ['mobile_number']})
+
+    def test_duplicates_of_existing_customers_are_rejected(self):
+        make_personal(1, aadhar_number='600000000009')
+        result = run_import([import_row(9), import_row(3, email_id='customer1@example.com')])
+        self.assertEqual(result.created, 0)
+        self.assertEqual(self.errors_by_row(result), {2: ['aadhar_number'], 3: ['email_id']})
+
+    def test_duplicates_are_found_across_chunks(self):
+        result = run_import([import_row(1), import_row(2), import_row(3, aadhar_number='600000000001')], chunk_size=2)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(self.errors_by_row(result), {4: ['aadhar_number']})
+
+    def test_invalid_rows_are_reported(self):
+        result = run_import([import_row(1, email_id='not-an-email', state='Kerala')])
+        self.assertEqual(result.created, 0)
+        self.assertEqual(self.errors_by_row(result), {2: ['email_id', 'state']})
+
+
+class IdAllocatorTests(TestCase):
+    def test_luhn_check_digit(self):
+        self.assertEqual(ids.luhn_check_digit('7992739871'), '3')
+        self.assertEqual(ids.luhn_check_digit('0000000000'), '0')
+
+    def test_format_and_validate(self):
+        generated = ids.format_id('account_number', 42)
+        self.assertEqual(generated[:15], 'ACC000000000042')
+        self.assertTrue(ids.is_valid_id('account_number', generated))
+        self.assertFalse(ids.is_valid_id('account_number', generated[:-1] + str((int(generated[-1]) + 1) % 10)))
+        self.assertFalse(ids.is_valid_id('cif_id', generated))
+
+    def test_allocates_sequential_ids_from_reserved_blocks(self):
+        allocator = ids.BlockIdAllocator(block_size=5)
+        self.assertEqual(allocator.allocate_numbers('cif_id', 3), [1, 2, 3])
+        self.assertEqual(IdSequence.objects.get(name='cif_id').next_value, 9)
+        # The rest of the block is served from memory
+        with self.assertNumQueries(0):
+            self.assertEqual(allocator.allocate_numbers('cif_id', 5), [4, 5, 6, 7, 8])
+        self.assertEqual(allocator.allocate_numbers('cif_id', 1), [9])
+
+    def test_reservations_never_nest_in_a_transaction(self):
+        allocator = ids.BlockIdAllocator(block_size=5)
+        with transaction.atomic():
+            with self.assertRaises(RuntimeError):
+                allocator.allocate_numbers('leg_number', 1)
+        allocator.reserve('leg_number', 8)
+        with transaction.atomic(), self.assertNumQueries(0):
+            self.assertEqual(allocator.allocate_numbers('leg_number', 8), list(range(1, 9)))
+
+    def test_rolled_back_numbers_are_skipped(self):
+        allocator = ids.BlockIdAllocator(block_size=5)
+        allocator.reserve('leg_number', 2)
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                allocator.allocate_numbers('leg_number', 2)
+                raise RuntimeError
+        self.assertEqual(allocator.allocate_numbers('leg_number', 2), [3, 4])
+
+    def test_assign_ids_fills_only_missing_ids(self):
+        personals = [PersonalDetails(cif_id='CIF-KEPT'), PersonalDetails()]
+        ids.assign_ids(personals)
+        self.assertEqual(personals[0].cif_id, 'CIF-KEPT')
+        for kind in ids.ID_FORMATS:
+            self.assertTrue(ids.is_valid_id(kind, getattr(personals[1], kind)))
+        self.assertNotEqual(personals[0].account_number, personals[1].account_number)
+
+    def test_admin_reserves_ids_before_its_transaction(self):
+        ids.get_allocator.cache_clear()
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+        data = {
+            'first_name': 'Admin', 'last_name': 'Added', 'date_of_birth': '1990-01-01', 'gender': 'M',
+            'mobile_number': '9811111111', 'email_id': 'added@example.com', 'address1': '1 Main Road',
+            'pincode': '110001', 'city': 'New Delhi', 'state': 'Delhi',
+            'aadhar_number': '511111111111', 'pan_card_number': 'ABCDE1111F',
+        }
+        with self.settings(STATICFILES_MANIFEST_FALLBACK=True):
+            response = self.client.post('/admin/accounts/personaldetails/add/', data)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(ids.is_valid_id('cif_id', PersonalDetails.objects.get(email_id='added@example.com').cif_id))
+
+
+class LedgerTests(TestCase):
+    def setUp(self):
+        self.account = make_account(1, deposit='1000.00')
+
+    def post(self, entry_type, amount):
+        return ledger.post_entries([{'account_id': self.account.pk, 'entry_type': entry_type, 'amount': amount}])
+
+    def test_balance_sums_signed_entries(self):
+        self.post('DEPOSIT', '250.50')
+        self.post('WITHDRAWAL', '100')
+        self.assertEqual(LedgerEntry.objects.filter(entry_type='WITHDRAWAL').get().amount, Decimal('-100.00'))
+        self.assertEqual(ledger.get_balance(self.account.pk), Decimal('1150.50'))
+
+    def test_invalid_batch_writes_nothing(self):
+        other = make_account(2)
+        other.is_active = False
+        other.save()
+        with self.assertRaises(ValidationError) as raised:
+            ledger.post_entries([
+                {'account_id': self.account.pk, 'entry_type': 'DEPOSIT', 'amount': '10'},
+                {'account_id': self.account.pk, 'entry_type': 'DEPOSIT', 'amount': '-5'},
+                {'account_id': other.pk, 'entry_type': 'DEPOSIT', 'amount': '5'},
+            ])
+        self.assertEqual(sorted(raised.exception.message_dict), ['1', '2'])
+        self.assertEqual(self.account.ledger_entries.count(), 1)
+
+    def test_overdrafts_are_rejected(self):
+        other = make_account(2, deposit='50.00')
+        with self.assertRaises(ValidationError) as raised:
+            ledger.post_entries([
+                {'account_id': self.account.pk, 'entry_type': 'WITHDRAWAL', 'amount': '600'},
+                {'account_id': other.pk, 'entry_type': 'WITHDRAWAL', 'amount': '10'},
+                {'account_id': self.account.pk, 'entry_type': 'WITHDRAWAL', 'amount': '500'},
+            ])
+        # Both withdrawals from the first account together overdraw it
+        self.assertEqual(sorted(raised.exception.message_dict), ['0', '2'])
+        self.assertFalse(LedgerEntry.objects.filter(entry_type='WITHDRAWAL').exists())
+
+        with self.assertRaises(ValidationError):
+            self.post('ADJUSTMENT', '-1000.01')
+        # Credits earlier in the batch count towards the balance
+        ledger.post_entries([
+            {'account_id': self.account.pk, 'entry_type': 'DEPOSIT', 'amount': '100'},
+            {'account_id': self.account.pk, 'entry_type': 'WITHDRAWAL', 'amount': '1100'},
+        ])
+        self.assertEqual(ledger.get_balance(self.account.pk), Decimal('0.00'))
+
+    def test_posting_queues_a_balance_refresh(self):
+        self.post('WITHDRAWAL', '1000')
+        job = Job.objects.get(name='ledger.refresh_balances')
+        self.assertEqual(job.payload, {'account_ids': [self.account.pk]})
+
+        self.assertEqual(ledger.refresh_balances([self.account.pk]), 1)
+        self.account.refresh_from_db()
+        # A zero balance stays zero: it is not mistaken for a missing one
+        self.assertEqual(self.account.current_balance, Decimal('0.00'))
+        self.assertEqual(ledger.refresh_balances([self.account.pk]), 0)
+
+    def test_compaction_keeps_balances(self):
+        self.post('DEPOSIT', '500')
+        self.assertEqual(ledger.compact(), 1)
+        snapshot = BalanceSnapshot.objects.get(account=self.account)
+        self.assertEqual(snapshot.balance, Decimal('1500.00'))
+        self.assertEqual(snapshot.last_entry_id, LedgerEntry.objects.latest('id').pk)
+        # Nothing new to fold
+        self.assertEqual(ledger.compact(), 0)
+
+        self.post('WITHDRAWAL', '200')
+        self.assertEqual(ledger.get_balance(self.account.pk), Decimal('1300.00'))
+        self.assertEqual(ledger.compact(), 1)
+        self.assertEqual(BalanceSnapshot.objects.filter(account=self.account).count(), 1)
+        self.assertEqual(ledger.get_balance(self.account.pk), Decimal('1300.00'))
+
+    def test_compaction_stops_at_the_committed_horizon(self):
+        horizon = LedgerEntry.objects.latest('id').pk
+        self.post('DEPOSIT', '75')
+        # Entries above the horizon (still being committed elsewhere) stay pending for the next run
+        with mock.patch.object(ledger, 'committed_horizon', return_value=horizon):
+            ledger.compact()
+        self.assertEqual(BalanceSnapshot.objects.get(account=self.account).balance, Decimal('1000.00'))
+        self.assertEqual(ledger.get_balance(self.account.pk), Decimal('1075.00'))
+
+    def test_compaction_respects_min_entries(self):
+        self.assertEqual(ledger.compact(min_entries=2), 0)
+        self.post('DEPOSIT', '1')
+        self.assertEqual(ledger.compact(min_entries=2), 1)
+
+
+class InterestTests(TestCase):
+    def test_accrual_rounds_half_up_to_units(self):
+        # paise * basis points * days / 36500, rounded half-up
+        self.assertEqual(interest.accrue([100000], [350], [1]), [959])
+        self.assertEqual(interest.accrue([1], [18250], [1]), [1])
+        self.assertEqual(interest.accrue([1], [18249], [1]), [0])
+
+    def test_nothing_accrues_without_balance_rate_or_days(self):
+        self.assertEqual(interest.accrue([0, -500, 100000, 100000], [350, 350, 0, 350], [30, 30, 30, 0]), [0, 0, 0, 0])
+
+    def test_credit_splits_whole_paise_from_remainder(self):
+        self.assertEqual(interest.split_credit([12345, 99, 0, -5]), [(123, 45), (0, 99), (0, 0), (0, -5)])
+
+    def test_to_basis_points(self):
+        self.assertEqual(interest.to_basis_points(Decimal('3.50')), 350)
+        self.assertEqual(interest.to_basis_points('7.25'), 725)
+
+    def test_month_end_credits_ledger_and_carries_remainder(self):
+        account = make_account(1, deposit='100000.00')
+        InterestRate.objects.update_or_create(account_type='SAVINGS', scheme_type='REGULAR', defaults={'rate': Decimal('3.50')})
+        as_of = account.date_of_opening + timedelta(days=30)
+
+        stats = interest.run_accrual(as_of, capitalize=True)
+
+        self.assertEqual(stats['updated'], 1)
+        # 10,000,000 paise * 350 bp * 30 days / 36500 = 2,876,712.33 units -> Rs 287.67 plus 0.0012 carried
+        entry = LedgerEntry.objects.get(account=account, entry_type='INTEREST')
+        self.assertEqual(entry.amount, Decimal('287.67'))
+        account.refresh_from_db()
+        self.assertEqual(account.accrued_interest, Decimal('0.0012'))
+        self.assertEqual(account.last_accrual_date, as_of)
+        # Re-running for the same day accrues nothing more
+        interest.run_accrual(as_of, capitalize=True)
+        self.assertEqual(LedgerEntry.objects.filter(account=account, entry_type='INTEREST').count(), 1)
+
+    def test_accrual_without_capitalizing_only_carries(self):
+        account = make_account(1, deposit='100000.00')
+        interest.run_accrual(account.date_of_opening + timedelta(days=30), capitalize=False)
+        account.refresh_from_db()
+        self.assertEqual(account.accrued_interest, Decimal('287.6712'))
+        self.assertFalse(LedgerEntry.objects.filter(account=account, entry_type='INTEREST').exists())
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class MaturityTests(TestCase):
+    def setUp(self):
+        customers.get_cache().clear()
+        InterestRate.objects.update_or_create(account_type='FIXED_DEPOSIT', scheme_type='REGULAR', defaults={'rate': Decimal('7.00')})
+
+    def deposit(self, n, **fields):
+        account = AccountDetails.objects.create(
+            personal_details=make_personal(n), account_type='FIXED_DEPOSIT', scheme_type='REGULAR',
+            deposit_amount=Decimal('100000.00'), current_balance=Decimal('100000.00'), **fields,
+        )
+        ledger.post_opening_entries([account])
+        return account
+
+    def test_due_deposits_are_credited_and_closed(self):
+        due = self.deposit(1)
+        later = self.deposit(2, maturity_date=due.maturity_date + timedelta(days=1))
+        stats.rebuild()
+
+        run = maturity.run_maturities(due.maturity_date)
+
+        self.assertEqual((run.processed, run.batches, run.credited), (1, 1, Decimal('7000.00')))
+        # Rs 1,00,000 at 7% for the 365 days to maturity
+        entry = LedgerEntry.objects.get(account=due, entry_type='INTEREST')
+        self.assertEqual(entry.amount, Decimal('7000.00'))
+        due.refresh_from_db()
+        self.assertEqual((due.is_active, due.last_accrual_date), (False, due.maturity_date))
+        self.assertTrue(AccountDetails.objects.get(pk=later.pk).is_active)
+        self.assertEqual(stats.dashboard_stats()['active'], 1)
+
+    def test_overdue_deposits_are_caught_up_in_batches_once(self):
+        for n in range(1, 4):
+            self.deposit(n, maturity_date=date.today() - timedelta(days=n))
+        run = maturity.run_maturities(batch_size=2)
+        self.assertEqual((run.processed, run.batches), (3, 2))
+        self.assertEqual(maturity.run_maturities().processed, 0)
+        self.assertFalse(AccountDetails.objects.filter(is_active=True).exists())
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.account = make_account(1, branch_code='BR001')
+        make_account(2, branch_code='BR002')
+
+    def export_rows(self, user, **params):
+        self.client.force_login(user)
+        response = self.client.get('/export-accounts/', params)
+        self.assertEqual(response.status_code, 200)
+        return list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+
+    def test_identity_numbers_are_masked_without_the_permission(self):
+        rows = self.export_rows(make_staff(), branch_code='BR001')
+        self.assertEqual(len(rows), 1)
+        self.assertEqual((rows[0]['aadhar_number'], rows[0]['pan_card_number']), ('****0001', '****001F'))
+        rows = self.export_rows(make_staff('auditor', 'view_identity_numbers'), branch_code='BR001')
+        self.assertEqual((rows[0]['aadhar_number'], rows[0]['pan_card_number']), ('500000000001', 'ABCDE0001F'))
+
+    def test_formula_cells_are_quoted(self):
+        PersonalDetails.objects.filter(pk=self.account.personal_details_id).update(
+            first_name='=HYPERLINK("http://example.com")', last_name='@SUM(A1)',
+        )
+        rows = self.export_rows(make_staff(), branch_code='BR001')
+        self.assertEqual(rows[0]['first_name'], '\'=HYPERLINK("http://example.com")')
+        self.assertEqual(rows[0]['last_name'], "'@SUM(A1)")
+        # NDJSON is data, not a spreadsheet: values are left alone
+        line = next(export.stream_export('ndjson', branch_code='BR001'))
+        self.assertEqual(json.loads(line)['last_name'], '@SUM(A1)')
+
+    def test_ndjson_filters_by_account_type(self):
+        lines = list(export.stream_export('ndjson', account_type='CURRENT'))
+        self.assertEqual(lines, [])
+        self.assertEqual(len(list(export.stream_export('ndjson', account_type='SAVINGS'))), 2)
+
+    def test_unknown_format_is_rejected(self):
+        self.client.force_login(make_staff())
+        self.assertEqual(self.client.get('/export-accounts/', {'format': 'xlsx'}).status_code, 400)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, STATICFILES_MANIFEST_FALLBACK=True)
+class CustomerCacheTests(TestCase):
+    def setUp(self):
+        customers.get_cache().clear()
+        self.account = make_account(1)
+        self.personal_id = self.account.personal_details_id
+
+    def test_repeat_loads_are_served_from_cache(self):
+        with self.assertNumQueries(1):
+            aggregate = customers.get_customer(self.personal_id)
+        self.assertEqual(aggregate['account_detail'], self.account)
+        self.assertIsNone(aggregate['family_detail'])
+        with self.assertNumQueries(0):
+            customers.get_customer(self.personal_id)
+
+    def test_repeat_page_views_cost_no_queries(self):
+        url = f'/account-summary/{self.personal_id}/'
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_saving_any_part_invalidates_after_commit(self):
+        customers.get_customer(self.personal_id)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.account.branch_code = 'BR999'
+            self.account.save()
+        self.assertEqual(customers.get_customer(self.personal_id)['account_detail'].branch_code, 'BR999')
+
+    def test_bulk_updates_invalidate_through_their_accounts(self):
+        customers.get_customer(self.personal_id)
+        AccountDetails.objects.filter(pk=self.account.pk).update(branch_code='BR777')
+        with self.captureOnCommitCallbacks(execute=True):
+            customers.invalidate_accounts([self.account.pk])
+        self.assertEqual(customers.get_customer(self.personal_id)['account_detail'].branch_code, 'BR777')
+
+    def test_missing_customer_raises(self):
+        with self.assertRaises(PersonalDetails.DoesNotExist):
+            customers.get_customer(self.personal_id + 1000)
+
+
+@override_settings(STATICFILES_MANIFEST_FALLBACK=True)
+class OnboardingTests(TestCase):
+    STEPS = {
+        'personal': {
+            'first_name': 'Nisha', 'last_name': 'Rao', 'date_of_birth': '1992-04-01', 'gender': 'F',
+            'mobile_number': '9822222222', 'email_id': 'nisha@example.com', 'address1': '3 Lake Road',
+            'pincode': '110001', 'city': 'New Delhi', 'state': 'Delhi',
+            'aadhar_number': '522222222222', 'pan_card_number': 'ABCDE2222F',
+        },
+        'family': {
+            'children_count': '0', 'father_name': 'Mohan Rao', 'mother_name': 'Lata Rao',
+            'emergency_contact_name': 'Mohan Rao', 'emergency_contact_relation': 'Father',
+            'emergency_contact_mobile': '9833333333',
+        },
+        'nominee': {
+            'nominee_name': 'Mohan Rao', 'nominee_relation': 'Father', 'nominee_date_of_birth': '1960-02-02',
+            'nominee_mobile_number': '9833333333', 'nominee_address': '3 Lake Road',
+            'nominee_aadhar_number': '533333333333', 'nominee_pan_card_number': 'ABCDE3333F',
+        },
+        'account': {'account_type': 'SAVINGS', 'scheme_type': 'REGULAR', 'deposit_amount': '2500.00'},
+    }
+
+    def post_step(self, step, **changes):
+        return self.client.post(f'/{step}-details/', {**self.STEPS[step], **changes})
+
+    def test_nothing_is_written_until_the_last_step(self):
+        for step in ('personal', 'family', 'nominee'):
+            self.assertEqual(self.post_step(step).status_code, 302)
+        self.assertFalse(PersonalDetails.objects.exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.post_step('account')
+        personal = PersonalDetails.objects.get(email_id='nisha@example.com')
+        self.assertRedirects(response, f'/account-summary/{personal.pk}/', fetch_redirect_response=False)
+        self.assertEqual(FamilyDetails.objects.get(personal_details=personal).father_name, 'Mohan Rao')
+        self.assertEqual(ledger.get_balance(personal.account_details.pk), Decimal('2500.00'))
+        self.assertNotIn(onboarding.DRAFT_SESSION_KEY, self.client.session)
+
+    def test_steps_cannot_be_skipped(self):
+        self.assertRedirects(self.post_step('nominee'), '/personal-details/', fetch_redirect_response=False)
+
+    def test_autosave_keeps_completed_steps(self):
+        self.post_step('personal')
+        response = self.client.post('/onboarding/draft/personal/', {'first_name': 'Nish'})
+        self.assertEqual(response.json(), {'saved': 'personal'})
+        draft = self.client.session[onboarding.DRAFT_SESSION_KEY]
+        self.assertEqual(draft['completed'], ['personal'])
+        self.assertEqual(draft['steps']['personal'], {'first_name': 'Nish'})
+
+    def test_clash_found_at_commit_sends_back_to_its_step(self):
+        for step in ('personal', 'family', 'nominee'):
+            self.post_step(step)
+        make_personal(1, email_id='nisha@example.com')
+        response = self.post_step('account')
+        self.assertRedirects(response, '/personal-details/', fetch_redirect_response=False)
+        self.assertEqual(PersonalDetails.objects.count(), 1)
+
+
+class MetricsTests(TestCase):
+    def test_without_a_token_only_debug_serves_metrics(self):
+        with self.settings(METRICS_TOKEN=''):
+            self.assertEqual(self.client.get('/metrics/').status_code, 401)
+            with self.settings(DEBUG=True):
+                self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    def test_token_is_required_when_set(self):
+        with self.settings(METRICS_TOKEN='s3cret'):
+            self.assertEqual(self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+            self.client.get('/api/stats/')
+            response = self.client.get('/metrics/', HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE bank_request_duration_seconds histogram', response.content.decode())
+
+
+@override_settings(CACHES=LOCMEM_CACHES, STATICFILES_MANIFEST_FALLBACK=True)
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        customers.get_cache().clear()
+
+    def test_generated_customers_are_reproducible_and_unique(self):
+        first, again = generator.make_customer(7, seed=1), generator.make_customer(7, seed=1)
+        self.assertEqual(audit.snapshot(first['personal']), audit.snapshot(again['personal']))
+        unique = {'mobile_number', 'email_id', 'aadhar_number', 'pan_card_number'}
+        people = [generator.make_customer(index)['personal'] for index in range(0, 100_000, 997)]
+        for field in unique:
+            self.assertEqual(len({getattr(person, field) for person in people}), len(people), field)
+
+    def test_ensure_customers_tops_the_book_up(self):
+        self.assertEqual(generator.ensure_customers(5, chunk_size=2), 5)
+        self.assertEqual(generator.ensure_customers(3), 0)
+        self.assertEqual(PersonalDetails.objects.count(), 5)
+        self.assertEqual(AccountDetails.objects.count(), 5)
+        self.assertEqual(generator.parse_scale('100k'), 100_000)
+
+    def test_every_scenario_runs(self):
+        generator.ensure_customers(10)
+        results = runner.run(iterations=2, warmup=1)
+        for name, summary in results['scenarios'].items():
+            self.assertEqual(summary['iterations'], 2, name)
+            self.assertTrue(set(summary['statuses']) <= {'200', '302'}, (name, summary['statuses']))
+        self.assertEqual(results['meta']['customers'], 10)
+
+    def test_compare_flags_slower_or_chattier_scenarios(self):
+        baseline = {'scenarios': {'a': {'p50_ms': 10.0, 'queries_mean': 3}, 'b': {'p50_ms': 10.0, 'queries_mean': 3}}}
+        current = {'scenarios': {'a': {'p50_ms': 11.0, 'queries_mean': 3}, 'b': {'p50_ms': 10.0, 'queries_mean': 4}}}
+        self.assertEqual([row[-1] for row in runner.compare(baseline, current)], [False, True])
+        self.assertEqual(runner.percentile([1.0, 2.0, 3.0, 4.0], 0.5), 2.5)
+
+
+class StatsTests(TestCase):
+    def setUp(self):
+        # The migration seeds the rollup; start these tests from an empty one
+        stats.rebuild()
+
+    def counts(self):
+        return {key: value for key, value in stats.dashboard_stats().items() if key != 'rollup'}
+
+    def test_imports_are_counted_without_a_worker(self):
+        run_import([import_row(1), import_row(2)])
+        self.assertFalse(Job.objects.filter(name='stats.record_new').exists())
+        counts = self.counts()
+        self.assertEqual((counts['total'], counts['accounts'], counts['savings']), (2, 2, 2))
+        self.assertEqual(counts['total_deposits'], Decimal('1000.00'))
+
+    def test_saves_and_bulk_updates_move_accounts_between_rows(self):
+        account = make_account(1)
+        make_account(2)
+        self.assertEqual(self.counts()['pending'], 2)
+        account.account_type = 'CURRENT'
+        account.save()
+        set_account_flags(AccountDetails.objects.filter(pk=account.pk), is_approved=True)
+        counts = self.counts()
+        self.assertEqual((counts['savings'], counts['current'], counts['pending']), (1, 1, 1))
+
+    def test_rebuild_matches_the_incremental_rollup(self):
+        make_account(1, deposit='250.00')
+        make_account(2).delete()
+        incremental = self.counts()
+        self.assertEqual(stats.rebuild(), len(stats.compute_rows()))
+        self.assertEqual(self.counts(), incremental)
+
+
+@override_settings(CACHES=LOCMEM_CACHES)
+class ApiTests(TestCase):
+    def setUp(self):
+        customers.get_cache().clear()
+        self.account = make_account(1)
+        self.personal_id = self.account.personal_details_id
+
+    def test_customer_requires_staff(self):
+        response = self.client.get(f'/api/customers/{self.personal_id}/')
+        self.assertEqual(response.status_code, 302)
+
+    def test_identity_numbers_are_masked_without_the_permission(self):
+        self.client.force_login(make_staff())
+        data = self.client.get(f'/api/customers/{self.personal_id}/').json()
+        personal = data['personal_detail']
+        self.assertEqual((personal['aadhar_number'], personal['pan_card_number']), ('****0001', '****001F'))
+        self.assertNotIn('aadhar_number_index', personal)
+        self.assertEqual(data['account_detail']['id'], self.account.pk)
+        self.assertIsNone(data['family_detail'])
+
+        self.client.force_login(make_staff('auditor', 'view_identity_numbers'))
+        personal = self.client.get(f'/api/customers/{self.personal_id}/').json()['personal_detail']
+        self.assertEqual((personal['aadhar_number'], personal['pan_card_number']), ('500000000001', 'ABCDE0001F'))
+
+    def test_batch_fetch_masks_identity_numbers(self):
+        self.client.force_login(make_staff())
+        response = self.client.post('/api/customers/batch/', {'ids': [self.personal_id]}, content_type='application/json')
+        personal = response.json()['results'][0]['customer']['personal_detail']
+        self.assertEqual(personal['aadhar_number'], '****0001')
+
+    def test_unknown_customer_is_404(self):
+        self.client.force_login(make_staff())
+        self.assertEqual(self.client.get(f'/api/customers/{self.personal_id + 1000}/').status_code, 404)
+
+    def test_search_and_stats(self):
+        results = self.client.get('/api/search/', {'q': 'test1'}).json()['results']
+        self.assertEqual([result['id'] for result in results], [self.personal_id])
+        self.assertEqual(self.client.get('/api/search/', {'limit': 'x'}).status_code, 400)
+        self.assertIn('accounts', self.client.get('/api/stats/').json())
+
+
+class BatchUpdateTests(TestCase):
+    def setUp(self):
+        self.first = make_account(1)
+        self.second = make_account(2)
+        self.first_id = self.first.personal_details_id
+        self.second_id = self.second.personal_details_id
+
+    def statuses(self, results):
+        return [result['status'] for result in results]
+
+    def test_partial_updates_touch_only_the_given_fields(self):
+        results = batch.update([
+            {'id': self.first_id, 'personal': {'first_name': 'Kavya'}},
+            {'account_number': self.second.personal_details.account_number, 'account': {'account_type': 'CURRENT'}},
+            {'id': self.first_id + 1000, 'personal': {'first_name': 'Nobody'}},
+            {'id': self.second_id, 'personal': {'cif_id': 'CIF1'}},
+        ])
+        self.assertEqual(self.statuses(results), ['updated', 'updated', 'not_found', 'invalid'])
+        personal = PersonalDetails.objects.get(pk=self.first_id)
+        self.assertEqual((personal.first_name, personal.last_name), ('Kavya', 'Customer'))
+        self.assertEqual(AccountDetails.objects.get(pk=self.second.pk).account_type, 'CURRENT')
+        self.assertEqual([p.pk for p, _ in search.search('kavya')], [self.first_id])
+        self.assertEqual(stats.dashboard_stats()['current'], 1)
+
+    def test_unchanged_and_repeated_customers(self):
+        results = batch.update([
+            {'id': self.first_id, 'personal': {'first_name': 'Test1'}},
+            {'id': self.second_id, 'personal': {'first_name': 'A'}},
+            {'id': self.second_id, 'personal': {'first_name': 'B'}},
+        ])
+        self.assertEqual(self.statuses(results), ['unchanged', 'updated', 'invalid'])
+
+    def test_unique_values_are_checked_across_the_batch(self):
+        results = batch.update([
+            {'id': self.first_id, 'personal': {'email_id': 'same@example.com'}},
+            {'id': self.second_id, 'personal': {'email_id': 'same@example.com'}},
+        ])
+        self.assertEqual(self.statuses(results), ['invalid', 'invalid'])
+        results = batch.update([{'id': self.first_id, 'personal': {'pan_card_number': 'ABCDE0002F'}}])
+        self.assertEqual(results[0]['errors']['personal'], {'pan_card_number': [
+            'Another customer already has this pan card number.',
+        ]})
+
+    def test_concurrent_edits_to_untouched_columns_survive(self):
+        check_unique = batch._check_unique
+
+        def edit_meanwhile(pending):
+            # Another request changes columns after the batch read the rows
+            PersonalDetails.objects.filter(pk=self.second_id).update(mobile_number='9899999999')
+            PersonalDetails.objects.filter(pk=self.first_id).update(last_name='Edited')
+            return check_unique(pending)
+
+        with mock.patch.object(batch, '_check_unique', side_effect=edit_meanwhile):
+            results = batch.update([
+                {'id': self.first_id, 'personal': {'mobile_number': '9811110000'}},
+                {'id': self.second_id, 'personal': {'email_id': 'second@example.com'}},
+            ])
+        self.assertEqual(self.statuses(results), ['updated', 'updated'])
+        first, second = PersonalDetails.objects.get(pk=self.first_id), PersonalDetails.objects.get(pk=self.second_id)
+        self.assertEqual((first.mobile_number, first.last_name), ('9811110000', 'Edited'))
+        self.assertEqual((second.email_id, second.mobile_number), ('second@example.com', '9899999999'))
+
+    def test_deleted_meanwhile_is_not_found(self):
+        check_unique = batch._check_unique
+
+        def delete_meanwhile(pending):
+            PersonalDetails.objects.filter(pk=self.second_id).delete()
+            return check_unique(pending)
+
+        with mock.patch.object(batch, '_check_unique', side_effect=delete_meanwhile):
+            results = batch.update([
+                {'id': self.first_id, 'personal': {'first_name': 'Kept'}},
+                {'id': self.second_id, 'personal': {'first_name': 'Gone'}},
+            ])
+        self.assertEqual(self.statuses(results), ['updated', 'not_found'])
+
+    def test_fetch_reports_every_key(self):
+        results = batch.fetch([self.first_id, 0], [self.second.personal_details.account_number])
+        self.assertEqual(results[0]['customer']['account_detail'], self.first)
+        self.assertEqual(results[1], {'id': 0, 'error': 'Customer not found.'})
+        self.assertEqual(results[2]['customer']['personal_detail'].pk, self.second_id)
+
+
+@mock.patch.object(routers, 'replica_alias', return_value='replica')
+class ReplicaRoutingTests(SimpleTestCase):
+    # SimpleTestCase: TestCase's transaction would keep every read on the primary
+    router = routers.ReplicaRouter()
+
+    def route(self, state, model=PersonalDetails):
+        token = routers.current_routing.set(state)
+        try:
+            return self.router.db_for_read(model)
+        finally:
+            routers.current_routing.reset(token)
+
+    def replica_state(self, **fields):
+        state = routers.RoutingState(**fields)
+        state.use_replica = True
+        return state
+
+    def test_only_marked_requests_read_from_the_replica(self, _):
+        self.assertIsNone(self.route(None))
+        self.assertIsNone(self.route(routers.RoutingState()))
+        self.assertEqual(self.route(self.replica_state()), 'replica')
+        # Sessions and auth always read from the primary
+        self.assertIsNone(self.route(self.replica_state(), model=get_user_model()))
+
+    def test_writers_are_pinned_to_the_primary(self, _):
+        self.assertIsNone(self.route(self.replica_state(pinned=True)))
+        state = self.replica_state()
+        token = routers.current_routing.set(state)
+        try:
+            self.assertEqual(self.router.db_for_write(PersonalDetails), routers.PRIMARY)
+        finally:
+            routers.current_routing.reset(token)
+        self.assertIsNone(self.route(state))
+
+    def test_writing_request_sets_the_pin_cookie(self, _):
+        def view(request):
+            routers.current_routing.get().wrote = request.method == 'POST'
+            return HttpResponse()
+
+        with mock.patch.object(middleware, 'replica_alias', return_value='replica'):
+            routing = middleware.ReplicaRoutingMiddleware(view)
+        response = routing(RequestFactory().post('/edit-personal/1/'))
+        self.assertIn(middleware.PIN_COOKIE, response.cookies)
+        self.assertNotIn(middleware.PIN_COOKIE, routing(RequestFactory().get('/dashboard/')).cookies)
+
+    def test_without_a_replica_the_middleware_is_unused(self, _):
+        with mock.patch.object(middleware, 'replica_alias', return_value=None):
+            with self.assertRaises(MiddlewareNotUsed):
+                middleware.ReplicaRoutingMiddleware(HttpResponse)
+
+
+class IdentityEncryptionTests(TestCase):
+    def test_numbers_are_stored_encrypted(self):
+        personal = make_personal(1)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT aadhar_number, pan_card_number FROM accounts_personaldetails WHERE id = %s', [personal.pk])
+            stored = cursor.fetchone()
+        self.assertTrue(all(encryption.is_encrypted(value) for value in stored))
+        personal.refresh_from_db()
+        self.assertEqual((personal.aadhar_number, personal.pan_card_number), ('500000000001', 'ABCDE0001F'))
+
+    def test_blind_index_is_unique_ignoring_case_and_separators(self):
+        make_personal(1)
+        for fields in ({'pan_card_number': 'abcde-0001f'}, {'aadhar_number': '5000 0000 0001'}):
+            with self.subTest(**fields), self.assertRaises(IntegrityError), transaction.atomic():
+                make_personal(2, **fields)
+
+    def test_lookup_matches_through_the_index(self):
+        personal = make_personal(1)
+        column, value = encryption.lookup(PersonalDetails, 'pan_card_number', 'abcde 0001f')
+        self.assertEqual(column, 'pan_card_number_index')
+        self.assertEqual(list(PersonalDetails.objects.filter(**{column: value})), [personal])
+        self.assertEqual(encryption.lookup(PersonalDetails, 'email_id', 'x@example.com'), ('email_id', 'x@example.com'))
+
+    def test_import_duplicates_match_like_the_unique_indexes(self):
+        make_personal(1)
+        result = run_import([
+            import_row(1),
+            import_row(2, pan_card_number='pqrst0001k'),
+            import_row(3, pan_card_number='abcde0001f'),
+        ])
+        self.assertEqual(result.created, 1)
+        self.assertEqual({error['row']: sorted(error['errors']) for error in result.errors}, {
+            3: ['pan_card_number'], 4: ['pan_card_number'],
+        })
+
+    def test_keys_are_required_outside_development(self):
+        with self.settings(FIELD_ENCRYPTION_KEYS=[], BLIND_INDEX_KEY='', FIELD_ENCRYPTION_DERIVED_KEYS=False):
+            with self.assertRaises(ImproperlyConfigured):
+                encryption.encrypt('500000000001')
+            with self.assertRaises(ImproperlyConfigured):
+                encryption.blind_index('aadhaar', '500000000001')
+            with self.settings(FIELD_ENCRYPTION_KEYS=[Fernet.generate_key()], BLIND_INDEX_KEY='index-key'):
+                self.assertEqual(encryption.decrypt(encryption.encrypt('500000000001')), '500000000001')
+                self.assertEqual(len(encryption.blind_index('aadhaar', '500000000001')), 64)
+
+
+class DuplicateDetectionTests(TestCase):
+    def setUp(self):
+        self.original = make_personal(1, first_name='Priya', last_name='Sharma', date_of_birth=date(1990, 5, 17),
+                                      address1='14 MG Road', pincode='560001', city='Bengaluru', state='Karnataka')
+        # New customers are keyed by a background job; do it inline here
+        dedup.index_customers([self.original])
+
+    def lookalike(self, n, **fields):
+        values = {'first_name': 'Priyaa', 'last_name': 'Sharma', 'date_of_birth': date(1990, 5, 17),
+                  'address1': '14 M.G. Road', 'pincode': '560001', 'city': 'Bengaluru', 'state': 'Karnataka'}
+        return make_personal(n, **{**values, **fields})
+
+    def test_compare_scores_name_birth_date_and_address(self):
+        score, reasons = dedup.compare(self.original, self.lookalike(2))
+        self.assertGreaterEqual(score, dedup.threshold())
+        self.assertIn('date_of_birth', reasons)
+        self.assertLess(dedup.compare(self.original, make_personal(3))[0], dedup.threshold())
+
+    def test_new_customers_are_flagged_against_their_blocks(self):
+        other = self.lookalike(2)
+        self.assertEqual(dedup.flag_new_customers([other]), 1)
+        match = DuplicateMatch.objects.get()
+        self.assertEqual((match.customer_id, match.duplicate_of_id, match.source), (other.pk, self.original.pk, 'ONBOARDING'))
+
+    def test_scan_records_matches_and_skips_large_blocks(self):
+        dedup.index_customers([self.lookalike(2)])
+        summary = dedup.scan(workers=1)
+        self.assertEqual(summary['matches'], 1)
+        self.assertEqual(DuplicateMatch.objects.get().source, 'SCAN')
+        with self.settings(DEDUP_MAX_BLOCK_SIZE=1):
+            summary = dedup.scan(workers=1)
+        self.assertEqual((summary['blocks'], summary['pairs_compared']), (0, 0))
+        self.assertGreater(summary['skipped_blocks'], 0)
+
+    def test_applicants_can_be_checked_before_onboarding(self):
+        self.client.force_login(make_staff())
+        response = self.client.post('/api/customers/duplicates/', {
+            'first_name': 'Priya', 'last_name': 'Sharma', 'date_of_birth': '1990-05-17',
+            'address1': '14 MG Road', 'pincode': '560001',
+        }, content_type='application/json')
+        self.assertEqual([result['id'] for result in response.json()['results']], [self.original.pk])
+
+
+class PincodeTests(SimpleTestCase):
+    RECORDS = [('110001', 'Central Delhi', 'Delhi'), ('560001', 'Bangalore', 'Karnataka'),
+               ('751001', 'Khurda', 'Odisha'), ('110001', 'New Delhi', 'Delhi')]
+
+    def test_lookup_reads_the_bundled_directory(self):
+        directory = pincodes.get_directory()
+        self.assertEqual(directory.lookup('110001'), ('Central Delhi', 'Delhi'))
+        self.assertEqual(directory.lookup(' 560001 '), ('Bangalore', 'Karnataka'))
+        for pincode in ('', None, '012345', '11000', 'abcdef', '999999'):
+            self.assertIsNone(directory.lookup(pincode))
+
+    def test_build_keeps_the_first_district_and_round_trips_through_a_file(self):
+        directory = pincodes.PincodeDirectory.build(self.RECORDS, complete=True)
+        self.assertEqual(len(directory), 3)
+        self.assertEqual(directory.lookup('110001'), ('Central Delhi', 'Delhi'))
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'pincodes.bin')
+            directory.save(path)
+            loaded = pincodes.PincodeDirectory.load(path)
+        self.assertTrue(loaded.complete)
+        self.assertEqual([loaded.lookup(pincode) for pincode in ('110001', '560001', '751001')],
+                         [('Central Delhi', 'Delhi'), ('Bangalore', 'Karnataka'), ('Khurda', 'Odisha')])
+
+    def test_validate_checks_the_state_against_the_pincode(self):
+        directory = pincodes.PincodeDirectory.build(self.RECORDS, complete=True)
+        with mock.patch.object(pincodes, 'get_directory', return_value=directory):
+            self.assertEqual(pincodes.validate('110001', 'Delhi'), {})
+            self.assertEqual(pincodes.validate('751001', 'Orissa'), {})
+            self.assertEqual(pincodes.validate('110001', 'Karnataka'), {'state': ['Pincode 110001 is in Delhi.']})
+            self.assertEqual(pincodes.validate('400001', 'Maharashtra'), {})
+            with self.settings(PINCODE_VALIDATION='strict'):
+                self.assertIn('pincode', pincodes.validate('400001', 'Maharashtra'))
+            with self.settings(PINCODE_VALIDATION='off'):
+                self.assertEqual(pincodes.validate('110001', 'Karnataka'), {})
+            # Unknown pincodes pass even in strict mode when the directory is only a sample
+            directory.complete = False
+            with self.settings(PINCODE_VALIDATION='strict'):
+                self.assertEqual(pincodes.validate('400001', 'Maharashtra'), {})
+
+    def test_customers_are_rejected_when_the_state_contradicts_the_pincode(self):
+        customer = PersonalDetails(pincode='560001', state='Delhi')
+        with self.assertRaises(ValidationError) as raised:
+            customer.clean()
+        self.assertEqual(raised.exception.message_dict, {'state': ['Pincode 560001 is in Karnataka.']})
+
+    def test_api_returns_the_city_and_state(self):
+        response = self.client.get('/api/pincodes/560001/')
+        self.assertEqual(response.json(), {'pincode': '560001', 'city': 'Bangalore', 'state': 'Karnataka'})
+        self.assertEqual(self.client.get('/api/pincodes/999999/').status_code, 404)
+
+
+@jobs.task('tests.create_sequence')
+def create_sequence(sequence):
+    IdSequence.objects.create(name=sequence)
+
+
+@jobs.task('tests.fail')
+def fail():
+    raise RuntimeError('boom')
+
+
+class JobQueueTests(TestCase):
+    def test_claim_marks_due_jobs_running_once(self):
+        due = jobs.enqueue('tests.create_sequence', sequence='due')
+        jobs.enqueue('tests.create_sequence', delay=60, sequence='later')
+
+        claimed = jobs.claim('worker-a')
+        self.assertEqual([job.pk for job in claimed], [due.pk])
+        self.assertEqual((claimed[0].status, claimed[0].attempts), ('RUNNING', 1))
+        self.assertTrue(claimed[0].locked_by.startswith('worker-a:'))
+        self.assertEqual(jobs.claim('worker-b'), [])
+
+    def test_claim_respects_batch_size(self):
+        jobs.enqueue_many([('tests.create_sequence', {'sequence': f'job-{i}'}) for i in range(5)])
+        self.assertEqual(len(jobs.claim('worker-a', batch_size=3)), 3)
+        self.assertEqual(len(jobs.claim('worker-b', batch_size=3)), 2)
+
+    def test_unknown_job_is_refused(self):
+        with self.assertRaises(ValueError):
+            jobs.enqueue('tests.missing')
+
+    def test_successful_job_is_done_with_its_writes(self):
+        jobs.enqueue('tests.create_sequence', sequence='done')
+        self.assertEqual(jobs.run_pending(), (1, 0))
+        self.assertEqual(Job.objects.get().status, 'DONE')
+        self.assertTrue(IdSequence.objects.filter(name='done').exists())
+
+    def test_failed_job_is_retried_with_backoff_then_failed(self):
+        jobs.enqueue('tests.fail', max_attempts=2)
+        with self.assertLogs('accounts.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_pending(), (0, 1))
+        job = Job.objects.get()
+        self.assertEqual((job.status, job.attempts), ('QUEUED', 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('RuntimeError: boom', job.last_error)
+        # Not due again until the backoff has passed
+        self.assertEqual(jobs.claim('worker-a'), [])
+
+        Job.objects.update(run_at=timezone.now())
+        with self.assertLogs('accounts.jobs', 'WARNING'):
+            self.assertEqual(jobs.run_pending(), (0, 1))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('FAILED', 2))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_backoff_doubles_per_attempt(self):
+        with override_settings(JOB_RETRY_BACKOFF=10):
+            self.assertTrue(10 <= jobs.backoff(1) <= 11)
+            self.assertTrue(40 <= jobs.backoff(3) <= 44)
+            self.assertTrue(jobs.MAX_BACKOFF_SECONDS <= jobs.backoff(30) <= jobs.MAX_BACKOFF_SECONDS * 1.1)
+
+    def test_expired_lock_is_taken_over_and_the_stale_run_rolled_back(self):
+        jobs.enqueue('tests.create_sequence', sequence='taken-over')
+        [stale] = jobs.claim('worker-a')
+        self.assertEqual(jobs.claim('worker-b'), [])
+
+        Job.objects.update(locked_at=timezone.now() - jobs.lock_timeout() - timedelta(seconds=1))
+        [current] = jobs.claim('worker-b')
+        self.assertEqual((current.pk, current.attempts), (stale.pk, 2))
+
+        # worker-a finishing late must not commit alongside worker-b
+        with self.assertLogs('accounts.jobs', 'WARNING'):
+            self.assertFalse(jobs.run_job(stale))
+        self.assertFalse(IdSequence.objects.filter(name='taken-over').exists())
+        self.assertEqual(Job.objects.get().status, 'RUNNING')
+
+        self.assertTrue(jobs.run_job(current))
+        self.assertEqual(Job.objects.get().status, 'DONE')
+        self.assertTrue(IdSequence.objects.filter(name='taken-over').exists())
+
+    @override_settings(JOB_QUEUE_EAGER=True)
+    def test_eager_mode_runs_every_queued_job_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            jobs.enqueue_many([('tests.create_sequence', {'sequence': f'eager-{i}'}) for i in range(15)])
+        self.assertEqual(set(Job.objects.values_list('status', flat=True)), {'DONE'})
+        self.assertEqual(IdSequence.objects.filter(name__startswith='eager-').count(), 15)
+
+
+
+
+@override_settings(CACHES=LOCMEM_CACHES, STATICFILES_MANIFEST_FALLBACK=True)
+class AdminTests(TestCase):
+    def setUp(self):
+        customers.get_cache().clear()
+        self.accounts = [make_account(1), make_account(2)]
+        admin_user = get_user_model().objects.create_superuser('admin', password='pw')
+        self.client.force_login(admin_user)
+
+    def test_changelists_join_the_customer_instead_of_querying_per_row(self):
+        url = '/admin/accounts/accountdetails/'
+        with CaptureQueriesContext(connection) as two_rows:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        make_account(3)
+        with CaptureQueriesContext(connection) as three_rows:
+            self.client.get(url)
+        self.assertEqual(len(three_rows), len(two_rows))
+        for url in ('/admin/accounts/personaldetails/', '/admin/accounts/familydetails/', '/admin/accounts/nomineedetails/'):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_search_goes_through_the_token_index(self):
+        response = self.client.get('/admin/accounts/accountdetails/', {'q': 'test2'})
+        self.assertEqual([account.pk for account in response.context['cl'].result_list], [self.accounts[1].pk])
+        response = self.client.get('/admin/accounts/personaldetails/', {'q': 'customer1@example.com'})
+        self.assertEqual(list(response.context['cl'].result_list), [self.accounts[0].personal_details])
+
+    def test_counts_stop_at_the_exact_count_limit(self):
+        make_account(3)
+        with self.settings(ADMIN_EXACT_COUNT_LIMIT=2):
+            filtered = self.client.get('/admin/accounts/accountdetails/', {'is_active__exact': '1'})
+            self.assertEqual(filtered.context['cl'].result_count, 2)
+            with mock.patch('accounts.pagination.estimated_row_count', return_value=50000):
+                unfiltered = self.client.get('/admin/accounts/accountdetails/')
+            self.assertEqual(unfiltered.context['cl'].paginator.count, 50000)
+
+    def test_bulk_actions_update_accounts_and_the_rollup(self):
+        stats.rebuild()
+        response = self.client.post('/admin/accounts/personaldetails/', {
+            'action': 'approve_accounts', '_selected_action': [self.accounts[0].personal_details_id],
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(AccountDetails.objects.filter(is_approved=True)), [self.accounts[0]])
+        self.client.post('/admin/accounts/accountdetails/', {
+            'action': 'deactivate', '_selected_action': [account.pk for account in self.accounts],
+        })
+        self.assertFalse(AccountDetails.objects.filter(is_active=True).exists())
+        counts = stats.dashboard_stats()
+        self.assertEqual((counts['pending'], counts['active']), (1, 0))
+
+    def test_jobs_can_be_retried(self):
+        job = jobs.enqueue('tests.fail')
+        Job.objects.update(status='FAILED', attempts=5)
+        self.client.post('/admin/accounts/job/', {'action': 'retry_jobs', '_selected_action': [job.pk]})
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('QUEUED', 0))
+
+
+@override_settings(CACHES=LOCMEM_CACHES, STATICFILES_MANIFEST_FALLBACK=True, TEMPLATE_PRERENDER=True)
+class RenderCacheTests(TestCase):
+    def setUp(self):
+        customers.get_cache().clear()
+        caches[customers.FRAGMENT_CACHE_ALIAS].clear()
+        patcher = mock.patch.dict(render_cache._rendered, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prerender_reuses_the_first_render(self):
+        template = Template("{% load render_cache %}{% prerender 'greeting' %}Hi {{ name }}{% endprerender %}")
+        self.assertEqual(template.render(Context({'name': 'A'})), 'Hi A')
+        self.assertEqual(template.render(Context({'name': 'B'})), 'Hi A')
+        with self.settings(TEMPLATE_PRERENDER=False):
+            self.assertEqual(template.render(Context({'name': 'B'})), 'Hi B')
+
+    def test_prerender_when_renders_afresh_while_the_condition_is_false(self):
+        template = Template("{% load render_cache %}{% prerender 'form' when blank %}{{ name }}{% endprerender %}")
+        self.assertEqual(template.render(Context({'name': 'A', 'blank': True})), 'A')
+        self.assertEqual(template.render(Context({'name': 'B', 'blank': False})), 'B')
+        self.assertEqual(template.render(Context({'name': 'C', 'blank': True})), 'A')
+
+    def test_customer_pages_are_cached_until_the_customer_changes(self):
+        personal = make_account(1).personal_details
+        for url in (f'/account-summary/{personal.pk}/', f'/account-detail/{personal.pk}/'):
+            self.assertContains(self.client.get(url), 'Test1')
+        self.assertEqual(len(caches[customers.FRAGMENT_CACHE_ALIAS]._cache), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            personal.first_name = 'Renamed'
+            personal.save()
+        for url in (f'/account-summary/{personal.pk}/', f'/account-detail/{personal.pk}/'):
+            self.assertContains(self.client.get(url), 'Renamed')
+
+
+class StaticFilesTests(SimpleTestCase):
+    def setUp(self):
+        static_root = tempfile.TemporaryDirectory()
+        self.addCleanup(static_root.cleanup)
+        self.static_root = static_root.name
+        # Only the project's own files: the admin's would make collectstatic slow
+        settings_override = override_settings(
+            STATIC_ROOT=self.static_root, STATICFILES_FINDERS=['django.contrib.staticfiles.finders.FileSystemFinder'],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_collectstatic_writes_minified_hashed_and_compressed_copies(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        hashed = staticfiles_storage.stored_name('css/style.css')
+        self.assertRegex(hashed, r'^css/style\.[0-9a-f]{12}\.css$')
+        with open(os.path.join(self.static_root, hashed)) as handle:
+            minified = handle.read()
+        with open(os.path.join(settings.BASE_DIR, 'static', 'css', 'style.css')) as handle:
+            self.assertLess(len(minified), len(handle.read()))
+        self.assertTrue(os.path.exists(os.path.join(self.static_root, f'{hashed}.gz')))
+
+    def test_uncollected_files_only_fall_back_to_their_plain_name_when_allowed(self):
+        with self.settings(DEBUG=False, STATICFILES_MANIFEST_FALLBACK=True):
+            self.assertEqual(staticfiles_storage.stored_name('css/style.css'), 'css/style.css')
+        with self.settings(DEBUG=False, STATICFILES_MANIFEST_FALLBACK=False):
+            with self.assertRaises(ValueError):
+                staticfiles_storage.stored_name('css/style.css')
+
+
+@override_settings(CACHES=LOCMEM_CACHES, STATICFILES_MANIFEST_FALLBACK=True)
+class WarmUpTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch.dict(render_cache._rendered, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_every_step_runs_and_is_timed(self):
+        timings = warmup.warm_up(connect=False)
+        self.assertEqual(list(timings), [name for name, _ in warmup.STEPS])
+        self.assertIn('navbar', {name for _, name in render_cache._rendered})
+        self.assertIn('databases', warmup.warm_up())
+
+    def test_a_failing_step_is_skipped(self):
+        steps = [('broken', mock.Mock(side_effect=RuntimeError('boom'))), ('urls', warmup.load_urls)]
+        with mock.patch.object(warmup, 'STEPS', steps), self.assertLogs('bank_system.warmup', 'WARNING'):
+            self.assertEqual(list(warmup.warm_up(connect=False)), ['urls'])
+
+    def test_importtime_rows_are_parsed(self):
+        lines = [
+            'import time: self [us] | cumulative | imported package',
+            'import time:       120 |        120 |   encodings.aliases',
+            'import time:       310 |        430 | encodings',
+            'unrelated output',
+        ]
+        self.assertEqual(warmup.parse_importtime(lines), [('encodings.aliases', 120, 120, 1), ('encodings', 310, 430, 0)])
+
+
+# Write-behind is off for the rest of the test run (see settings.AUDIT_WRITE_BEHIND)
+@override_settings(AUDIT_WRITE_BEHIND=True)
+class AuditTrailTests(TestCase):
+    def setUp(self):
+        spool_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(spool_dir.cleanup)
+        self.spool_dir = spool_dir.name
+        settings_override = override_settings(AUDIT_SPOOL_DIR=self.spool_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.personal = make_personal(1)
+
+    def changes(self, entries):
+        return {entry.field: (entry.old_value, entry.new_value) for entry in entries}
+
+    def test_diff_lists_changed_fields_and_masks_identity_numbers(self):
+        before = audit.snapshot(self.personal)
+        self.personal.city = 'Delhi Cantonment'
+        self.personal.pan_card_number = 'ZYXWV9876Q'
+        entries = audit.diff(self.personal, before)
+
+        self.assertEqual(self.changes(entries), {
+            'city': ('New Delhi', 'Delhi Cantonment'),
+            'pan_card_number': ('****001F', '****876Q'),
+        })
+        self.assertEqual({entry.action for entry in entries}, {'UPDATE'})
+        self.assertEqual({entry.personal_id for entry in entries}, {self.personal.pk})
+
+    def test_diff_of_a_new_row_skips_blank_fields(self):
+        account = AccountDetails(personal_details=self.personal, account_type='SAVINGS', scheme_type='REGULAR')
+        account.save()
+        entries = audit.diff(account, None)
+        self.assertEqual({entry.action for entry in entries}, {'CREATE'})
+        self.assertIn('account_type', self.changes(entries))
+        self.assertNotIn('maturity_date', self.changes(entries))
+
+    def test_blind_indexes_are_not_audited(self):
+        names = {field.name for field in audit.audited_fields(PersonalDetails)}
+        self.assertIn('aadhar_number', names)
+        self.assertNotIn('aadhar_number_index', names)
+        self.assertNotIn('updated_at', names)
+
+    @override_settings(AUDIT_WRITE_BEHIND=False)
+    def test_saves_are_audited_in_their_transaction(self):
+        self.personal.last_name = 'Renamed'
+        self.personal.save()
+        entry = AuditEntry.objects.get(field='last_name')
+        self.assertEqual((entry.old_value, entry.new_value, entry.model), ('Customer', 'Renamed', 'PersonalDetails'))
+
+    def test_write_behind_buffers_entries_once_committed(self):
+        self.personal.last_name = 'Buffered'
+        with mock.patch.object(audit.buffer, 'add') as add:
+            with self.captureOnCommitCallbacks() as callbacks:
+                self.personal.save()
+            add.assert_not_called()
+            for callback in callbacks:
+                callback()
+        [entries] = add.call_args.args
+        self.assertEqual([entry.field for entry in entries], ['last_name'])
+        self.assertFalse(AuditEntry.objects.filter(field='last_name').exists())
+
+    def buffered(self, *values):
+        buffer = audit.AuditBuffer()
+        for value in values:
+            before = audit.snapshot(self.personal)
+            self.personal.city = value
+            buffer.entries.extend(audit.diff(self.personal, before))
+        return buffer
+
+    def test_flush_writes_buffered_entries(self):
+        buffer = self.buffered('Delhi Cantonment', 'Karol Bagh')
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(buffer.entries, [])
+        self.assertEqual(
+            list(AuditEntry.objects.order_by('id').values_list('old_value', 'new_value')),
+            [('New Delhi', 'Delhi Cantonment'), ('Delhi Cantonment', 'Karol Bagh')],
+        )
+
+    def test_entries_are_spooled_when_the_database_fails_and_replayed_later(self):
+        buffer = self.buffered('Delhi Cantonment', 'Karol Bagh')
+        with mock.patch.object(AuditEntry.objects, 'bulk_create', side_effect=DatabaseError('down')):
+            with self.assertLogs('accounts.audit', 'ERROR'):
+                self.assertEqual(buffer.flush(), 0)
+        [spooled] = glob.glob(os.path.join(self.spool_dir, 'audit-*.ndjson'))
+        with open(spooled) as handle:
+            self.assertEqual(len(handle.readlines()), 2)
+        self.assertFalse(AuditEntry.objects.exists())
+
+        # The next flush, with nothing buffered, loads the spool
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(os.listdir(self.spool_dir), [])
+        entry = AuditEntry.objects.get(new_value='Karol Bagh')
+        self.assertEqual((entry.personal_id, entry.field, entry.old_value), (self.personal.pk, 'city', 'Delhi Cantonment'))
+        self.assertIsNotNone(entry.changed_at.tzinfo)
+
+    def test_failed_replay_leaves_the_spool_for_the_next_flush(self):
+        audit.spool(self.buffered('Karol Bagh').entries)
+        with mock.patch.object(AuditEntry.objects, 'bulk_create', side_effect=DatabaseError('down')):
+            with self.assertRaises(DatabaseError):
+                audit.replay_spool()
+        self.assertEqual(len(glob.glob(os.path.join(self.spool_dir, 'audit-*.ndjson'))), 1)
+        self.assertEqual(audit.replay_spool(), 1)
+
+    @override_settings(AUDIT_WRITE_BEHIND=False)
+    def test_imports_are_audited_as_creates(self):
+        run_import([import_row(1)])
+        personal = PersonalDetails.objects.get(first_name='Import1')
+        entries = AuditEntry.objects.filter(personal_id=personal.pk)
+        self.assertEqual({entry.action for entry in entries}, {'CREATE'})
+        self.assertEqual({entry.model for entry in entries}, {'PersonalDetails', 'AccountDetails'})
+        self.assertEqual(entries.get(field='aadhar_number').new_value, '****0001')
+
+    @override_settings(AUDIT_WRITE_BEHIND=False, CACHES=LOCMEM_CACHES)
+    def test_bulk_flag_updates_are_audited(self):
+        customers.get_cache().clear()
+        approved, pending = make_account(2, is_approved=True), make_account(3)
+        set_account_flags(AccountDetails.objects.filter(pk__in=[approved.pk, pending.pk]), is_approved=True)
+        entry = AuditEntry.objects.get(action='UPDATE')
+        self.assertEqual(
+            (entry.personal_id, entry.model, entry.object_id, entry.field, entry.old_value, entry.new_value),
+            (pending.personal_details_id, 'AccountDetails', pending.pk, 'is_approved', 'False', 'True'),
+        )
@@ -1,13 +1,15 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/stats/', views.dashboard_stats, name='dashboard_stats'),
     path('personal-details/', views.personal_details, name='personal_details'),
-    path('family-details/<int:personal_id>/', views.family_details, name='family_details'),
-    path('nominee-details/<int:personal_id>/', views.nominee_details, name='nominee_details'),
-    path('account-details/<int:personal_id>/', views.account_details, name='account_details'),
+    path('family-details/', views.family_details, name='family_details'),
+    path('nominee-details/', views.nominee_details, name='nominee_details'),
+    path('account-details/', views.account_details, name='account_details'),
+    path('onboarding/draft/<str:step>/', views.save_onboarding_draft, name='save_onboarding_draft'),
     path('account-summary/<int:personal_id>/', views.account_summary, name='account_summary'),
     path('account-detail/<int:personal_id>/', views.account_detail_view, name='account_detail_view'),
     path('edit-personal/<int:personal_id>/', views.edit_personal_details, name='edit_personal_details'),
@@ -15,4 +17,16 @@ urlpatterns = [
     path('edit-nominee/<int:personal_id>/', views.edit_nominee_details, name='edit_nominee_details'),
     path('edit-account/<int:personal_id>/', views.edit_account_details, name='edit_account_details'),
     path('search-accounts/', views.search_accounts, name='search_accounts'),
+    path('import-customers/', views.import_customers, name='import_customers'),
+    path('ledger/post/', views.post_ledger_entries, name='post_ledger_entries'),
+    path('export-accounts/', views.export_accounts, name='export_accounts'),
+    path('metrics/', views.prometheus_metrics, name='prometheus_metrics'),
+    path('api/search/', api.api_search, name='api_search'),
+    path('api/customers/<int:personal_id>/', api.api_customer, name='api_customer'),
+    path('api/customers/batch/', views.batch_fetch_customers, name='batch_fetch_customers'),
+    path('api/customers/batch/update/', views.batch_update_customers, name='batch_update_customers'),
+    path('api/customers/<int:personal_id>/history/', views.customer_history, name='customer_history'),
+    path('api/customers/duplicates/', views.check_duplicates, name='check_duplicates'),
+    path('api/pincodes/<str:pincode>/', api.api_pincode, name='api_pincode'),
+    path('api/stats/', api.api_stats, name='api_stats'),
 ] 
\ No newline at end of file
@@ -1,154 +1,154 @@
+import json
+from datetime import date
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
+from django.views.decorators.http import require_GET, require_POST
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError
 from .models import PersonalDetails, FamilyDetails, NomineeDetails, AccountDetails
 from .forms import PersonalDetailsForm, FamilyDetailsForm, NomineeDetailsForm, AccountDetailsForm
-from django.db import models
+from .pagination import keyset_page
+from . import api, audit, batch, customers, dedup, encryption, ledger, metrics, onboarding, search, stats
+from .importer import import_uploaded_file
+from .export import FORMATS, parse_filters, stream_export
+from django.conf import settings
+
+# Columns rendered by the dashboard table; everything else stays in the database
+DASHBOARD_COLUMNS = [
+    'id', 'account_number', 'first_name', 'last_name', 'email_id',
+    'mobile_number', 'created_at',
+    'account_details__account_type', 'account_details__is_active',
+]
+
+def _customer_or_404(personal_id):
+    """Cached customer aggregate (personal, family, nominee, account) and its fragment cache keys, or 404"""
+    try:
+        return customers.page_context(personal_id)
+    except PersonalDetails.DoesNotExist:
+        raise Http404('No customer matches the given query.')
 
 def home(request):
     """Home page view"""
     return render(request, 'accounts/home.html')
 
-def personal_details(request):
-    """Personal details form view"""
+def _wizard_step(request, step, template, next_step=None):
+    """
+    Render or advance one onboarding step. Valid input is kept in the
+    session draft; nothing reaches the customer tables until the last step
+    (the one without a ``next_step``) commits the whole draft.
+    """
+    draft = onboarding.Draft(request.session)
+    missing = draft.first_incomplete(before=step)
+    if missing:
+        return redirect(f'{missing}_details')
+
     if request.method == 'POST':
-        form = PersonalDetailsForm(request.POST)
+        form = draft.form(step, request.POST)
+        if form.is_valid() and step == 'personal':
+            # One lookup now saves the customer from finding a clash only at the last step
+            for field, field_errors in onboarding.find_conflicts(form.instance).items():
+                form.add_error(field, field_errors)
         if form.is_valid():
-            personal_detail = form.save()
-            messages.success(request, 'Personal details saved successfully!')
-            return redirect('family_details', personal_id=personal_detail.id)
+            draft.store(step, request.POST, completed=True)
+            if next_step is None:
+                return _commit_draft(request, draft)
+            messages.success(request, f'{step.title()} details saved successfully!')
+            return redirect(next_step)
         else:
             messages.error(request, 'Please correct the errors below.')
     else:
-        form = PersonalDetailsForm()
+        form = draft.form(step)
     
-    return render(request, 'accounts/personal_details.html', {'form': form})
+    # A form with no draft values and no errors renders the same for everyone (see {% prerender %})
+    context = {'form': form, 'blank_form': not form.is_bound and not draft.get(step)}
+    if step != 'personal':
+        context['personal_detail'] = draft.preview()
+    return render(request, template, context)
 
-def family_details(request, personal_id):
-    """Family details form view"""
-    personal_detail = get_object_or_404(PersonalDetails, id=personal_id)
-    
-    if request.method == 'POST':
-        form = FamilyDetailsForm(request.POST)
-        if form.is_valid():
-            family_detail = form.save(commit=False)
-            family_detail.personal_details = personal_detail
-            family_detail.save()
-            messages.success(request, 'Family details saved successfully!')
-            return redirect('nominee_details', personal_id=personal_id)
-        else:
-            messages.error(request, 'Please correct the errors below.')
-    else:
-        form = FamilyDetailsForm()
+def _commit_draft(request, draft):
+    """Create the customer from a finished draft, or send the user back to the step at fault"""
+    try:
+        personal_detail = onboarding.commit(draft)
+    except ValidationError as exc:
+        errors = exc.message_dict
+        for field_errors in errors.values():
+            for error in field_errors:
+                messages.error(request, error)
+        step = min((onboarding.step_for(field) for field in errors), key=onboarding.STEP_ORDER.index)
+        return redirect(f'{step}_details')
     
-    return render(request, 'accounts/family_details.html', {
-        'form': form,
-        'personal_detail': personal_detail
-    })
+    messages.success(request, 'Account details saved successfully!')
+    return redirect('account_summary', personal_id=personal_detail.id)
+
+def personal_details(request):
+    """Personal details form view (first onboarding step)"""
+    return _wizard_step(request, 'personal', 'accounts/personal_details.html', 'family_details')
+
+def family_details(request):
+    """Family details form view"""
+    return _wizard_step(request, 'family', 'accounts/family_details.html', 'nominee_details')
 
-def nominee_details(request, personal_id):
+def nominee_details(request):
     """Nominee details form view"""
-    personal_detail = get_object_or_404(PersonalDetails, id=personal_id)
-    
-    if request.method == 'POST':
-        form = NomineeDetailsForm(request.POST)
-        if form.is_valid():
-            nominee_detail = form.save(commit=False)
-            nominee_detail.personal_details = personal_detail
-            nominee_detail.save()
-            messages.success(request, 'Nominee details saved successfully!')
-            return redirect('account_details', personal_id=personal_id)
-        else:
-            messages.error(request, 'Please correct the errors below.')
-    else:
-        form = NomineeDetailsForm()
-    
-    return render(request, 'accounts/nominee_details.html', {
-        'form': form,
-        'personal_detail': personal_detail
-    })
+    return _wizard_step(request, 'nominee', 'accounts/nominee_details.html', 'account_details')
 
-def account_details(request, personal_id):
-    """Account details form view"""
-    personal_detail = get_object_or_404(PersonalDetails, id=personal_id)
-    
-    if request.method == 'POST':
-        form = AccountDetailsForm(request.POST)
-        if form.is_valid():
-            account_detail = form.save(commit=False)
-            account_detail.personal_details = personal_detail
-            account_detail.current_balance = account_detail.deposit_amount
-            account_detail.save()
-            messages.success(request, 'Account details saved successfully!')
-            return redirect('account_summary', personal_id=personal_id)
-        else:
-            messages.error(request, 'Please correct the errors below.')
-    else:
-        form = AccountDetailsForm()
-    
-    return render(request, 'accounts/account_details.html', {
-        'form': form,
-        'personal_detail': personal_detail
-    })
+def account_details(request):
+    """Account details form view; a valid submission creates the customer in one transaction"""
+    return _wizard_step(request, 'account', 'accounts/account_details.html')
+
+@require_POST
+def save_onboarding_draft(request, step):
+    """Autosave the fields of one onboarding step to the session draft without validating them"""
+    if step not in onboarding.STEP_FORMS:
+        raise Http404('Unknown onboarding step.')
+    onboarding.Draft(request.session).store(step, request.POST)
+    return JsonResponse({'saved': step})
 
 def account_summary(request, personal_id):
     """Account summary view"""
-    personal_detail = get_object_or_404(PersonalDetails, id=personal_id)
-    
-    try:
-        family_detail = personal_detail.family_details
-    except FamilyDetails.DoesNotExist:
-        family_detail = None
-    
-    try:
-        nominee_detail = personal_detail.nominee_details
-    except NomineeDetails.DoesNotExist:
-        nominee_detail = None
-    
-    try:
-        account_detail = personal_detail.account_details
-    except AccountDetails.DoesNotExist:
-        account_detail = None
-    
-    return render(request, 'accounts/account_summary.html', {
-        'personal_detail': personal_detail,
-        'family_detail': family_detail,
-        'nominee_detail': nominee_detail,
-        'account_detail': account_detail
-    })
+    return render(request, 'accounts/account_summary.html', _customer_or_404(personal_id))
 
 def dashboard(request):
-    """Dashboard view showing all accounts"""
-    accounts = PersonalDetails.objects.all().order_by('-created_at')
-    return render(request, 'accounts/dashboard.html', {'accounts': accounts})
+    """Dashboard view showing accounts one keyset page at a time"""
+    cursor = request.GET.get('after')
+    page_size = getattr(settings, 'DASHBOARD_PAGE_SIZE', 50)
+    queryset = PersonalDetails.objects.select_related('account_details').only(*DASHBOARD_COLUMNS)
+    accounts, next_cursor = keyset_page(queryset, cursor, page_size)
+
+    # The first page already holds the newest rows; deeper pages fetch them separately
+    if cursor:
+        recent = list(queryset.order_by('-created_at', '-id')[:5])
+    else:
+        recent = accounts[:5]
+
+    return render(request, 'accounts/dashboard.html', {
+        'accounts': accounts,
+        'recent_accounts': recent,
+        'stats': stats.dashboard_stats(),
+        'next_cursor': next_cursor,
+        'is_first_page': not cursor,
+    })
+
+@require_GET
+def dashboard_stats(request):
+    """Dashboard counters and breakdowns by account type, scheme, branch, status and approval"""
+    rollup = stats.read()
+    data = {
+        dimension: {
+            key: {'count': row['count'], 'deposit_total': str(row['deposit_total']), 'balance_total': str(row['balance_total'])}
+            for key, row in sorted(rows.items())
+        }
+        for dimension, rows in rollup.items()
+    }
+    return JsonResponse(data)
 
 def account_detail_view(request, personal_id):
     """Detailed view of a specific account"""
-    personal_detail = get_object_or_404(PersonalDetails, id=personal_id)
-    
-    try:
-        family_detail = personal_detail.family_details
-    except FamilyDetails.DoesNotExist:
-        family_detail = None
-    
-    try:
-        nominee_detail = personal_detail.nominee_details
-    except NomineeDetails.DoesNotExist:
-        nominee_detail = None
-    
-    try:
-        account_detail = personal_detail.account_details
-    except AccountDetails.DoesNotExist:
-        account_detail = None
-    
-    return render(request, 'accounts/account_detail.html', {
-        'personal_detail': personal_detail,
-        'family_detail': family_detail,
-        'nominee_detail': nominee_detail,
-        'account_detail': account_detail
-    })
+    return render(request, 'accounts/account_detail.html', _customer_or_404(personal_id))
 
 def edit_personal_details(request, personal_id):
     """Edit personal details"""
@@ -256,11 +256,15 @@ def edit_account_details(request, personal_id):
             form = AccountDetailsForm(request.POST)
         
         if form.is_valid():
+            is_new = account_detail is None
             account_detail = form.save(commit=False)
             account_detail.personal_details = personal_detail
-            if not account_detail.current_balance:
+            if is_new:
+                # The opening deposit is the new account's only ledger entry; later balances come from the ledger
                 account_detail.current_balance = account_detail.deposit_amount
             account_detail.save()
+            if is_new:
+                ledger.post_opening_entries([account_detail])
             messages.success(request, 'Account details updated successfully!')
             return redirect('account_detail_view', personal_id=personal_id)
         else:
@@ -279,24 +283,176 @@ def edit_account_details(request, personal_id):
 
 @csrf_exempt
 def search_accounts(request):
-    """Search accounts by account number or name"""
+    """Ranked typeahead search by account number, CIF ID, mobile number or name"""
     if request.method == 'POST':
         search_term = request.POST.get('search_term', '')
-        accounts = PersonalDetails.objects.filter(
-            models.Q(account_number__icontains=search_term) |
-            models.Q(first_name__icontains=search_term) |
-            models.Q(last_name__icontains=search_term)
-        )[:10]
         
-        results = []
-        for account in accounts:
-            results.append({
-                'id': account.id,
-                'name': f"{account.first_name} {account.last_name}",
-                'account_number': account.account_number,
-                'mobile': account.mobile_number
-            })
+        results = [api.search_result(account, score) for account, score in search.search(search_term, limit=10)]
         
         return JsonResponse({'results': results})
     
     return JsonResponse({'results': []})
+
+@staff_member_required
+@require_POST
+def import_customers(request):
+    """Bulk-import an uploaded CSV/NDJSON file of customers and report per-row errors"""
+    uploaded_file = request.FILES.get('file')
+    if not uploaded_file:
+        return JsonResponse({'error': 'Upload a CSV or NDJSON file as "file".'}, status=400)
+    
+    result = import_uploaded_file(
+        uploaded_file,
+        fmt=request.POST.get('format') or None,
+        dry_run=request.POST.get('dry_run') in ('1', 'true', 'on'),
+    )
+    return JsonResponse(result.as_dict())
+
+@staff_member_required
+@require_POST
+def post_ledger_entries(request):
+    """Post a JSON batch of deposits/withdrawals keyed by account number"""
+    try:
+        postings = json.loads(request.body).get('postings', [])
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'Send a JSON object with a "postings" list.'}, status=400)
+    if not isinstance(postings, list) or not all(isinstance(p, dict) for p in postings):
+        return JsonResponse({'error': '"postings" must be a list of objects.'}, status=400)
+    
+    account_ids = dict(
+        AccountDetails.objects.filter(
+            personal_details__account_number__in=[p.get('account_number') for p in postings]
+        ).values_list('personal_details__account_number', 'pk')
+    )
+    for posting in postings:
+        posting['account_id'] = account_ids.get(posting.get('account_number'))
+    
+    try:
+        entries = ledger.post_entries(postings)
+    except ValidationError as exc:
+        return JsonResponse({'errors': exc.message_dict}, status=400)
+    return JsonResponse({'posted': len(entries)})
+
+def _batch_body(request, *keys):
+    """Parse a JSON object body; returns (data, error response)"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict) or not any(key in data for key in keys):
+        names = ' and/or '.join(f'"{key}"' for key in keys)
+        return None, JsonResponse({'error': f'Send a JSON object with {names} lists.'}, status=400)
+    if not all(isinstance(data.get(key, []), list) for key in keys):
+        return None, JsonResponse({'error': f'{", ".join(keys)} must be lists.'}, status=400)
+    size = sum(len(data.get(key, [])) for key in keys)
+    if size > batch.max_items():
+        return None, JsonResponse({'error': f'At most {batch.max_items()} items per request.'}, status=400)
+    return data, None
+
+@staff_member_required
+@require_POST
+def batch_fetch_customers(request):
+    """Fetch many customers with all their details by id and/or account number in one query"""
+    data, error = _batch_body(request, 'ids', 'account_numbers')
+    if error:
+        return error
+    if not all(isinstance(pk, int) for pk in data.get('ids', [])):
+        return JsonResponse({'error': '"ids" must be integers.'}, status=400)
+    
+    results = batch.fetch(data.get('ids', []), [str(number) for number in data.get('account_numbers', [])])
+    unmasked = request.user.has_perm(encryption.VIEW_IDENTITY_PERMISSION)
+    for result in results:
+        if 'customer' in result:
+            result['customer'] = api.serialize_customer(result['customer'], unmasked)
+    return JsonResponse({'results': results})
+
+@staff_member_required
+@require_POST
+def batch_update_customers(request):
+    """Apply partial updates to many customers in one transaction, reporting a result per item"""
+    data, error = _batch_body(request, 'items')
+    if error:
+        return error
+    
+    try:
+        results = batch.update(data['items'])
+    except IntegrityError:
+        # A unique value was taken by a concurrent write after it was checked
+        return JsonResponse({'error': 'The batch conflicted with a concurrent update; retry it.'}, status=409)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    return JsonResponse({'counts': counts, 'results': results})
+
+@staff_member_required
+@require_POST
+def check_duplicates(request):
+    """Existing customers who look like the same person as the posted applicant details; nothing is saved"""
+    try:
+        data = json.loads(request.body)
+        applicant = PersonalDetails(**{field: data.get(field) for field in dedup.KEY_FIELDS - {'date_of_birth'}})
+        applicant.date_of_birth = date.fromisoformat(data['date_of_birth']) if data.get('date_of_birth') else None
+    except (ValueError, TypeError, AttributeError):
+        return JsonResponse({'error': 'Send a JSON object of personal details with date_of_birth as YYYY-MM-DD.'}, status=400)
+    
+    results = [
+        {
+            'id': other.pk,
+            'name': f"{other.first_name} {other.last_name}",
+            'date_of_birth': other.date_of_birth,
+            'pincode': other.pincode,
+            'score': score,
+            'reasons': reasons,
+        }
+        for other, score, reasons in dedup.find_candidates([applicant])[0]
+    ]
+    return JsonResponse({'results': results})
+
+@staff_member_required
+@require_GET
+def customer_history(request, personal_id):
+    """A customer's audited field changes newest-first; pass ``next`` back as ``cursor`` for older ones"""
+    try:
+        limit = min(max(int(request.GET.get('limit', 50)), 1), 500)
+    except ValueError:
+        return JsonResponse({'error': '"limit" must be a number.'}, status=400)
+    entries, next_cursor = audit.history(personal_id, request.GET.get('cursor'), limit)
+    results = [
+        {
+            'changed_at': entry.changed_at,
+            'changed_by': entry.changed_by,
+            'model': entry.model,
+            'object_id': entry.object_id,
+            'action': entry.action,
+            'field': entry.field,
+            'old': entry.old_value,
+            'new': entry.new_value,
+        }
+        for entry in entries
+    ]
+    return JsonResponse({'id': personal_id, 'results': results, 'next': next_cursor})
+
+@staff_member_required
+@require_GET
+def export_accounts(request):
+    """Stream the customer book as CSV or NDJSON, filtered by branch, account type and dates"""
+    fmt = request.GET.get('format', 'csv')
+    if fmt not in FORMATS:
+        return JsonResponse({'error': f'Unsupported format; use one of {", ".join(FORMATS)}.'}, status=400)
+    try:
+        filters = parse_filters(request.GET)
+    except ValueError:
+        return JsonResponse({'error': 'Dates must be YYYY-MM-DD.'}, status=400)
+    
+    content_type, extension = FORMATS[fmt]
+    unmasked = request.user.has_perm(encryption.VIEW_IDENTITY_PERMISSION)
+    response = StreamingHttpResponse(stream_export(fmt, unmasked=unmasked, **filters), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="accounts.{extension}"'
+    return response
+
+@require_GET
+def prometheus_metrics(request):
+    """Per-view latency, query and template histograms of this worker in Prometheus text format"""
+    if not metrics.is_authorized(request):
+        return HttpResponse('Unauthorized', status=401, content_type='text/plain')
+    return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,66 @@
+"""
+Primary/replica database routing.
+
+Reads go to the primary (``default``) unless ReplicaRoutingMiddleware has
+marked the current request as one of the read-heavy pages listed in
+DATABASE_REPLICA_VIEWS and a replica alias is configured. Writes always go
+to the primary, and a request that writes, or comes from a browser that
+wrote in the last DATABASE_REPLICA_PIN_SECONDS, reads from the primary so
+users see their own changes.
+"""
+
+import contextvars
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+# Only these apps' models are read from the replica; sessions and auth always use the primary
+REPLICA_APPS = {'accounts'}
+
+
+class RoutingState:
+    """Per-request routing decision, shared by reference so sync_to_async threads see updates"""
+
+    def __init__(self, pinned=False):
+        self.pinned = pinned
+        self.use_replica = False
+        self.wrote = False
+
+
+current_routing = contextvars.ContextVar('current_routing', default=None)
+
+
+def replica_alias():
+    """The configured replica alias, or None when DATABASES has no such entry"""
+    alias = getattr(settings, 'DATABASE_REPLICA_ALIAS', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = current_routing.get()
+        if state is None or not state.use_replica or state.pinned or state.wrote:
+            return None
+        if model._meta.app_label not in REPLICA_APPS:
+            return None
+        # Reads inside a transaction on the primary must see its uncommitted writes
+        if connections[PRIMARY].in_atomic_block:
+            return None
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = current_routing.get()
+        if state is not None and model._meta.app_label in REPLICA_APPS:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema from replication (or a copy of the file)
+        if db == replica_alias():
+            return False
+        return None
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import os
+import sys
 import dj_database_url
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -33,12 +34,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'accounts.metrics.MetricsMiddleware',  # first, so it times the whole request
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",  # for static files
+    "bank_system.middleware.AsyncWhiteNoiseMiddleware",  # WhiteNoise static files, async-capable for ASGI
+    "bank_system.middleware.ReplicaRoutingMiddleware",  # read-heavy views read from DATABASE_REPLICA_URL when set
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.audit.AuditUserMiddleware',  # credits audited record changes to the logged-in user
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -47,31 +51,56 @@ ROOT_URLCONF = 'bank_system.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates that reports render time to MetricsMiddleware
+        'BACKEND': 'accounts.metrics.InstrumentedDjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Templates are parsed once per process; the dev server's autoreloader resets the cache on edits
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
+# Reuse {% prerender %} fragments (navbar, blank onboarding forms) across requests; off in DEBUG so edits show
+TEMPLATE_PRERENDER = os.environ.get('TEMPLATE_PRERENDER', str(not DEBUG)).lower() in ('1', 'true', 'yes')
 
 WSGI_APPLICATION = 'bank_system.wsgi.application'
 
 
 # Database (Render provides DATABASE_URL)
+def _database(url, **options):
+    # sslmode only means something to network databases; SQLite rejects the option
+    return dj_database_url.parse(url, conn_max_age=600, ssl_require=not url.startswith('sqlite'), **options)
+
+
 DATABASES = {
-    "default": dj_database_url.config(
-        default=f"sqlite:///{os.path.join(BASE_DIR, 'db.sqlite3')}",
-        conn_max_age=600,
-        ssl_require=True
-    )
+    "default": _database(os.environ.get('DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'db.sqlite3')}")),
 }
 
+# Optional read replica for the read-heavy pages (bank_system.routers); without it every read uses default.
+# Locally, copy db.sqlite3 to another file and point DATABASE_REPLICA_URL at it.
+DATABASE_REPLICA_ALIAS = 'replica'
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES[DATABASE_REPLICA_ALIAS] = _database(
+        os.environ['DATABASE_REPLICA_URL'], test_options={'MIRROR': 'default'},
+    )
+DATABASE_ROUTERS = ['bank_system.routers.ReplicaRouter']
+DATABASE_REPLICA_VIEWS = [
+    'dashboard', 'dashboard_stats', 'search_accounts', 'export_accounts',
+    'account_summary', 'account_detail_view', 'api_search', 'api_customer', 'api_stats',
+]
+# How long a browser keeps reading from the primary after it writes (also bounds replica lag in caches)
+DATABASE_REPLICA_PIN_SECONDS = int(os.environ.get('DATABASE_REPLICA_PIN_SECONDS', '10'))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -92,6 +121,39 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+# Caches
+# The customer aggregate cache must be shared by every worker process so that
+# invalidations reach all of them: the file backend is the default, 'locmem'
+# suits a single process, and any Django cache backend path can be given.
+CUSTOMER_CACHE_BACKEND = {
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+}.get(os.environ.get('CUSTOMER_CACHE', 'file'), os.environ.get('CUSTOMER_CACHE'))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'customers': {
+        'BACKEND': CUSTOMER_CACHE_BACKEND,
+        'LOCATION': os.environ.get('CUSTOMER_CACHE_LOCATION', os.path.join(BASE_DIR, '.cache', 'customers')),
+        'TIMEOUT': int(os.environ.get('CUSTOMER_CACHE_TIMEOUT', '3600')),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+    # Rendered per-customer page fragments ({% cache %}), keyed on the customer's cache version
+    'template_fragments': {
+        'BACKEND': CUSTOMER_CACHE_BACKEND,
+        'LOCATION': os.environ.get('FRAGMENT_CACHE_LOCATION', (
+            os.path.join(BASE_DIR, '.cache', 'fragments') if CUSTOMER_CACHE_BACKEND.endswith('FileBasedCache')
+            else os.environ.get('CUSTOMER_CACHE_LOCATION', 'fragments')
+        )),
+        'TIMEOUT': int(os.environ.get('CUSTOMER_CACHE_TIMEOUT', '3600')),
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+CUSTOMER_CACHE_ALIAS = 'customers'
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
@@ -107,12 +169,85 @@ USE_TZ = True
 # Static files
 STATIC_URL = "/static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
+STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
+# collectstatic minifies, fingerprints and gzip/brotli-compresses the files (bank_system.storage);
+# WhiteNoise serves the fingerprinted names with an immutable, year-long Cache-Control
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "bank_system.storage.MinifiedManifestStaticFilesStorage"},
+}
+# Link unhashed static files when nothing has been collected (tests, benchmarks) instead of failing
+STATICFILES_MANIFEST_FALLBACK = os.environ.get('STATICFILES_MANIFEST_FALLBACK', 'false').lower() in ('1', 'true', 'yes')
 
 # Security & proxy (useful on Render/Railway behind proxy)
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 USE_X_FORWARDED_HOST = True
 CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', '').split(',') if os.getenv('CSRF_TRUSTED_ORIGINS') else []
 
+# Dashboard
+DASHBOARD_PAGE_SIZE = int(os.environ.get('DASHBOARD_PAGE_SIZE', '50'))
+
+# Bank-generated IDs (LEG/account/CIF/ASACASS numbers)
+ID_ALLOCATOR = os.environ.get('ID_ALLOCATOR', 'accounts.ids.BlockIdAllocator')
+ID_BLOCK_SIZE = int(os.environ.get('ID_BLOCK_SIZE', '100'))
+
+# Request metrics served at /metrics/; scrapers send "Authorization: Bearer <METRICS_TOKEN>" (without a
+# token they are only served when DEBUG is on)
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Aadhaar/PAN encryption (accounts.encryption): comma-separated Fernet keys, newest first, and the
+# HMAC key for their blind indexes. Production must set both; only DEBUG and test runs fall back to
+# keys derived from SECRET_KEY when they are unset.
+FIELD_ENCRYPTION_KEYS = [key for key in os.environ.get('FIELD_ENCRYPTION_KEYS', '').split(',') if key]
+BLIND_INDEX_KEY = os.environ.get('BLIND_INDEX_KEY', '')
+FIELD_ENCRYPTION_DERIVED_KEYS = DEBUG or sys.argv[1:2] == ['test']
+
+# Duplicate detection (accounts.dedup): pairs scoring at least the threshold are queued for review;
+# blocks with more customers than the limit are skipped by the batch scan
+DEDUP_THRESHOLD = float(os.environ.get('DEDUP_THRESHOLD', '0.75'))
+DEDUP_MAX_BLOCK_SIZE = int(os.environ.get('DEDUP_MAX_BLOCK_SIZE', '200'))
+
+# Pincode directory (accounts.pincodes), built with build_pincode_directory. PINCODE_VALIDATION is
+# "known" (the state must match pincodes found in the directory), "strict" (unknown pincodes are
+# rejected too; needs a complete directory) or "off"
+PINCODE_DIRECTORY_PATH = os.environ.get('PINCODE_DIRECTORY_PATH', os.path.join(BASE_DIR, 'accounts', 'data', 'pincodes.bin'))
+PINCODE_VALIDATION = os.environ.get('PINCODE_VALIDATION', 'known')
+
+# Background jobs (accounts.jobs), run by `manage.py run_workers`. Failed jobs are retried after
+# JOB_RETRY_BACKOFF seconds, doubling each time, up to JOB_MAX_ATTEMPTS tries; jobs held longer than
+# JOB_LOCK_TIMEOUT by a worker that died are taken over. JOB_QUEUE_EAGER runs jobs in the web process
+# right after commit, for development without workers.
+JOB_QUEUE_EAGER = os.environ.get('JOB_QUEUE_EAGER', 'false').lower() in ('1', 'true', 'yes')
+JOB_WORKER_CONCURRENCY = int(os.environ.get('JOB_WORKER_CONCURRENCY', '4'))
+JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', '10'))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', '1.0'))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_RETRY_BACKOFF = int(os.environ.get('JOB_RETRY_BACKOFF', '30'))
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', '300'))
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '7'))
+
+# Welcome emails queued at onboarding; the console backend prints them until SMTP is configured
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@bank.example.com')
+
+# Admin changelists of the customer tables: counts stop at ADMIN_EXACT_COUNT_LIMIT rows (bigger tables
+# show an estimate) and a search matches at most ADMIN_SEARCH_LIMIT customers
+ADMIN_EXACT_COUNT_LIMIT = int(os.environ.get('ADMIN_EXACT_COUNT_LIMIT', '10000'))
+ADMIN_SEARCH_LIMIT = int(os.environ.get('ADMIN_SEARCH_LIMIT', '1000'))
+
+# Most customers fetched or updated by one /api/customers/batch/ request
+BATCH_API_MAX_ITEMS = int(os.environ.get('BATCH_API_MAX_ITEMS', '500'))
+
+# Audit trail of customer record changes (accounts.audit): entries are buffered per process and written
+# every AUDIT_FLUSH_INTERVAL seconds or AUDIT_BATCH_SIZE entries; ones that cannot be written are spooled
+# to AUDIT_SPOOL_DIR until the database is back. AUDIT_WRITE_BEHIND=false writes them with the change, as
+# the test run does: buffered entries would outlive its database and end up in the real spool.
+AUDIT_WRITE_BEHIND = os.environ.get('AUDIT_WRITE_BEHIND', str(sys.argv[1:2] != ['test'])).lower() in ('1', 'true', 'yes')
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', '500'))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', '1.0'))
+AUDIT_SPOOL_DIR = os.environ.get('AUDIT_SPOOL_DIR', os.path.join(BASE_DIR, '.cache', 'audit-spool'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,196 @@
+"""
+Start-up warm-up for web workers.
+
+Django loads most of the application lazily: the URLconf (and with it
+every view module) on the first request that resolves a URL, each template
+on its first render, the translation catalogs, the static files manifest
+and the database connection on first use. ``warm_up()`` does all of that
+up front so a new worker's first request costs what any other request
+does. gunicorn.conf.py runs it once in the master after preloading the
+application, so forked workers start with everything in memory, and again
+in each worker to open that worker's connections (which must not be
+shared across a fork).
+
+``profile_startup()`` (``manage.py profile_startup``) measures a cold start
+in a fresh interpreter under ``python -X importtime``.
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+from django.template import engines
+from django.urls import get_resolver
+from django.utils import translation
+
+logger = logging.getLogger(__name__)
+
+
+def load_urls():
+    """Import the URLconf and every view module it names, and build the reverse lookup table"""
+    resolver = get_resolver()
+    # Populating the reverse table walks every include()
+    resolver.reverse_dict
+    return len(resolver.url_patterns)
+
+
+def template_names(directory):
+    """Templates under a template directory, by the name they are loaded with"""
+    names = []
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if filename.endswith('.html'):
+                names.append(os.path.relpath(os.path.join(root, filename), directory).replace(os.sep, '/'))
+    return sorted(names)
+
+
+def compile_templates():
+    """Parse the project templates (base.html, accounts/*) into the cached loader, with what they extend and include"""
+    compiled = 0
+    for engine in engines.all():
+        for directory in engine.dirs:
+            for name in template_names(directory):
+                engine.get_template(name)
+                compiled += 1
+    return compiled
+
+
+def render_onboarding_pages():
+    """
+    Render each onboarding step with a blank form, as a first visit would:
+    compiles the form widget templates and fills the {% prerender %} cache
+    (navbar and blank forms).
+    """
+    from django.contrib.auth.models import AnonymousUser
+    from django.http import HttpRequest
+    from django.template.loader import render_to_string
+
+    from accounts import onboarding
+
+    request = HttpRequest()
+    request.method = 'GET'
+    request.META = {'SERVER_NAME': 'localhost', 'SERVER_PORT': '80'}
+    request.user = AnonymousUser()
+    for step, form_class in onboarding.STEP_FORMS.items():
+        render_to_string(f'accounts/{step}_details.html', {'form': form_class(), 'blank_form': True}, request)
+    return len(onboarding.STEP_FORMS)
+
+
+def load_translations():
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.gettext('')
+    translation.deactivate()
+
+
+def load_static_manifest():
+    from django.contrib.staticfiles.storage import staticfiles_storage
+
+    # Manifest storages read staticfiles.json when first asked for a URL
+    return len(getattr(staticfiles_storage, 'hashed_files', {}))
+
+
+def prime_directories():
+    """In-memory lookup tables that are otherwise built by the first request needing them"""
+    from accounts import encryption, pincodes
+
+    encryption.get_fernet()
+    return len(pincodes.get_directory())
+
+
+def connect_databases():
+    """Open this thread's connection to every database (kept for CONN_MAX_AGE)"""
+    for alias in connections:
+        connections[alias].ensure_connection()
+    return len(connections.all())
+
+
+def connect_caches():
+    for alias in settings.CACHES:
+        caches[alias].get('warmup')
+    return len(settings.CACHES)
+
+
+# Shareable across a fork, so safe to run in the gunicorn master
+STEPS = [
+    ('urls', load_urls),
+    ('templates', compile_templates),
+    ('onboarding_pages', render_onboarding_pages),
+    ('translations', load_translations),
+    ('static_manifest', load_static_manifest),
+    ('directories', prime_directories),
+]
+# Per process (sockets and file handles): run in each worker
+CONNECT_STEPS = [
+    ('databases', connect_databases),
+    ('caches', connect_caches),
+]
+
+
+def warm_up(connect=True):
+    """
+    Run the warm-up steps, and with ``connect`` also open the database and
+    cache connections. Returns {step: milliseconds}; a step that fails is
+    logged and skipped, since a cold start beats no start.
+    """
+    timings = {}
+    for name, step in STEPS + (CONNECT_STEPS if connect else []):
+        started = time.perf_counter()
+        try:
+            step()
+        except Exception:
+            logger.warning('Warm-up step %s failed', name, exc_info=True)
+            continue
+        timings[name] = round((time.perf_counter() - started) * 1000, 3)
+    logger.info('Warmed up in %.1f ms: %s', sum(timings.values()), timings)
+    return timings
+
+
+# Run in the child interpreter: load the WSGI application the way gunicorn does, then warm up
+PROBE = """
+import json, time
+started = time.perf_counter()
+import bank_system.wsgi
+loaded = time.perf_counter()
+from bank_system import warmup
+timings = warmup.warm_up()
+print(json.dumps({'application_ms': (loaded - started) * 1000, 'warm_up': timings}))
+"""
+
+
+def parse_importtime(lines):
+    """(module, self us, cumulative us, depth) rows from ``-X importtime`` output"""
+    rows = []
+    for line in lines:
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(fields[0]), int(fields[1]), depth))
+    return rows
+
+
+def profile_startup():
+    """
+    Start a fresh interpreter that imports bank_system.wsgi and warms up,
+    under ``-X importtime``. Returns a dict with the wall time of the
+    application import, the warm-up step timings and the import rows.
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'bank_system.settings'))
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE], capture_output=True, text=True,
+        cwd=settings.BASE_DIR, env=env,
+    )
+    if result.returncode:
+        raise RuntimeError(f'Start-up probe failed:\n{result.stderr[-2000:]}')
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    report['imports'] = parse_importtime(result.stderr.splitlines())
+    return report
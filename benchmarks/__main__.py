@@ -0,0 +1,126 @@
+"""
+Run the benchmark suite in-process against a generated SQLite book:
+
+    python -m benchmarks --scale 10k
+    python -m benchmarks --scale 100k --scenario dashboard_first_page --compare .bench/baseline.json
+    python -m benchmarks --scale 10k --scenario none --concurrency 50
+    python -m benchmarks --scale 10k --scenario none --startup 5
+
+The book for each scale is generated once into .bench/bench-<scale>.sqlite3
+and reused by later runs; results are written as JSON.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Run the performance benchmarks.')
+    parser.add_argument('--scale', default='10k', help="Customers in the book: 10k, 100k, 1m or a number (default 10k)")
+    parser.add_argument('--iterations', type=int, default=30, help='Timed operations per scenario (default 30)')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed operations before each scenario (default 3)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the generated data (default 0)')
+    parser.add_argument('--scenario', action='append', dest='scenarios',
+                        help="Run only this scenario (repeatable); 'none' skips them all")
+    parser.add_argument('--db', help='SQLite file to use instead of .bench/bench-<scale>.sqlite3')
+    parser.add_argument('-o', '--output', help='Results file (default .bench/results-<scale>-<time>.json)')
+    parser.add_argument('--compare', metavar='BASELINE', help='Compare against an earlier results file')
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help='p50 slowdown ratio that counts as a regression (default 1.25)')
+    parser.add_argument('--concurrency', type=int, metavar='N',
+                        help='Also compare sync /search-accounts/ with async /api/search/ under bursts of N requests')
+    parser.add_argument('--rounds', type=int, default=10, help='Bursts per path for --concurrency (default 10)')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Sync worker threads standing in for gunicorn workers (default 4)')
+    parser.add_argument('--startup', type=int, metavar='RUNS',
+                        help='Also time the first requests of RUNS fresh processes, cold and warmed up')
+    parser.add_argument('--list', action='store_true', help='List the scenarios and exit')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    scale_name = args.scale.lower()
+
+    # The database has to be chosen before Django loads its settings
+    os.environ.setdefault('BENCH_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.bench'))
+    os.makedirs(os.environ['BENCH_DIR'], exist_ok=True)
+    os.environ['BENCH_DB'] = args.db or os.path.join(os.environ['BENCH_DIR'], f'bench-{scale_name}.sqlite3')
+    os.environ['DJANGO_SETTINGS_MODULE'] = 'benchmarks.settings'
+
+    import django
+    django.setup()
+    from django.core.management import call_command
+
+    from . import generator, runner
+    from .scenarios import SCENARIOS
+
+    if args.list:
+        print('\n'.join(SCENARIOS))
+        return 0
+    unknown = set(args.scenarios or []) - set(SCENARIOS) - {'none'}
+    if unknown:
+        print(f"Unknown scenario(s): {', '.join(sorted(unknown))}", file=sys.stderr)
+        return 2
+
+    call_command('migrate', verbosity=0)
+    count = generator.parse_scale(scale_name)
+    started = time.perf_counter()
+
+    def report(done, total):
+        print(f'\rGenerating customers: {done}/{total}', end='', flush=True)
+
+    added = generator.ensure_customers(count, seed=args.seed, progress=report)
+    meta = {'scale': scale_name}
+    if added:
+        elapsed = time.perf_counter() - started
+        meta['generated'] = added
+        meta['generate_rows_per_sec'] = round(added / elapsed, 1)
+        print(f'\nGenerated {added} customers in {elapsed:.1f}s')
+
+    def show(name, result):
+        print(f"{name:28} p50 {result['p50_ms']:9.2f} ms  p95 {result['p95_ms']:9.2f} ms  "
+              f"queries {result['queries_mean']:6.1f}  statuses {result['statuses']}")
+
+    results = runner.run(
+        [] if args.scenarios == ['none'] else args.scenarios, args.iterations, args.warmup, args.seed, meta,
+        progress=show, concurrency=args.concurrency, rounds=args.rounds, workers=args.workers,
+        startup=args.startup,
+    )
+    if 'concurrency' in results:
+        comparison = results['concurrency']
+        print(f"\nBursts of {comparison['concurrency']} searches x {comparison['rounds']} rounds:")
+        for path in ('sync', 'async'):
+            result = comparison[path]
+            print(f"{path:6} {result['throughput_rps']:8.1f} req/s  p50 {result['p50_ms']:9.2f} ms  "
+                  f"p95 {result['p95_ms']:9.2f} ms  p99 {result['p99_ms']:9.2f} ms")
+    if 'startup' in results:
+        print(f"\nStart-up over {args.startup} fresh processes (medians):")
+        for mode in ('cold', 'warm'):
+            result = results['startup'][mode]
+            first = '  '.join(f'{path} {ms:.1f}' for path, ms in result['first_request_ms'].items())
+            print(f"{mode:5} load {result['application_ms']:7.1f} ms  warm-up {result['warm_up_ms']:7.1f} ms  "
+                  f"all pages served after {result['time_to_all_pages_ms']:7.1f} ms  first requests (ms): {first}")
+    output = args.output or os.path.join(
+        os.environ['BENCH_DIR'], f"results-{scale_name}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    runner.save(results, output)
+    print(f'Results written to {output}')
+
+    if args.compare:
+        regressed = False
+        print(f'\nCompared with {args.compare}:')
+        for name, before, now, ratio, query_delta, is_regression in runner.compare(
+            runner.load(args.compare), results, args.threshold
+        ):
+            regressed |= is_regression
+            flag = 'REGRESSION' if is_regression else ''
+            print(f'{name:28} {before:9.2f} -> {now:9.2f} ms  x{ratio:5.2f}  queries {query_delta:+6.1f}  {flag}')
+        return 1 if regressed else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
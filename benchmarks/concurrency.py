@@ -0,0 +1,91 @@
+"""
+Sync vs async typeahead under bursts of concurrent requests.
+
+Each round fires ``concurrency`` searches at once. The sync path posts to
+/search-accounts/ through the WSGI handler on a pool of ``workers`` threads,
+like a sync gunicorn deployment with that many workers. The async path
+gathers GETs to /api/search/ through the ASGI handler on one event loop, as
+a single uvicorn process would. Latency is measured from the start of the
+round, so time spent queued for a free worker is included.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.test import AsyncClient, Client
+
+from .runner import percentile
+
+
+def _summary(latencies, elapsed, **extra):
+    latencies = sorted(latencies)
+    return {
+        **extra,
+        'requests': len(latencies),
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+    }
+
+
+def run_sync(terms, concurrency, rounds, workers):
+    local = threading.local()
+
+    def search(term):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = Client()
+        client.post('/search-accounts/', {'search_term': term})
+        return time.perf_counter()
+
+    latencies = []
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for round_number in range(rounds):
+            round_started = time.perf_counter()
+            batch = [terms[(round_number * concurrency + i) % len(terms)] for i in range(concurrency)]
+            latencies.extend((done - round_started) * 1000 for done in pool.map(search, batch))
+        # Worker threads opened their own database connections
+        list(pool.map(lambda _: connections.close_all(), range(workers)))
+    return _summary(latencies, time.perf_counter() - started, workers=workers)
+
+
+async def _async_rounds(terms, concurrency, rounds):
+    client = AsyncClient()
+
+    async def search(term):
+        await client.get('/api/search/', {'q': term})
+        return time.perf_counter()
+
+    latencies = []
+    for round_number in range(rounds):
+        round_started = time.perf_counter()
+        batch = [terms[(round_number * concurrency + i) % len(terms)] for i in range(concurrency)]
+        finished = await asyncio.gather(*(search(term) for term in batch))
+        latencies.extend((done - round_started) * 1000 for done in finished)
+    return latencies
+
+
+def run_async(terms, concurrency, rounds):
+    started = time.perf_counter()
+    latencies = asyncio.run(_async_rounds(terms, concurrency, rounds))
+    return _summary(latencies, time.perf_counter() - started, processes=1)
+
+
+def compare(context, concurrency=50, rounds=10, workers=4):
+    """Run both paths over the same search terms and return their summaries"""
+    terms = context['name_prefixes']
+    # One untimed round each so connection setup and imports don't count
+    run_sync(terms, concurrency, 1, workers)
+    run_async(terms, concurrency, 1)
+    return {
+        'concurrency': concurrency,
+        'rounds': rounds,
+        'sync': run_sync(terms, concurrency, rounds, workers),
+        'async': run_async(terms, concurrency, rounds),
+    }
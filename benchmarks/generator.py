@@ -0,0 +1,144 @@
+"""
+Synthetic customer book for benchmarks.
+
+Customers are derived from their index with a seeded RNG, so the same
+index always yields the same person and every unique column (mobile,
+email, Aadhaar, PAN) is unique by construction. Rows are written through
+the importer's chunk writer, so generated data gets bank IDs, opening
+ledger entries and search tokens exactly like imported customers; the
+jobs it queues (rollup counts, duplicate check) are run after each chunk.
+"""
+
+import random
+import string
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from accounts.importer import write_chunk
+from accounts.jobs import run_pending
+from accounts.models import PersonalDetails, FamilyDetails, NomineeDetails, AccountDetails
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+FIRST_NAMES = [
+    'Aarav', 'Vivaan', 'Aditya', 'Vihaan', 'Arjun', 'Sai', 'Reyansh', 'Krishna', 'Ishaan', 'Rohan',
+    'Ananya', 'Diya', 'Aadhya', 'Saanvi', 'Pari', 'Kavya', 'Meera', 'Priya', 'Lakshmi', 'Fatima',
+    'Rahul', 'Amit', 'Suresh', 'Ramesh', 'Deepak', 'Pooja', 'Neha', 'Sunita', 'Anjali', 'Imran',
+]
+LAST_NAMES = [
+    'Sharma', 'Verma', 'Gupta', 'Kumar', 'Singh', 'Patel', 'Reddy', 'Nair', 'Iyer', 'Rao',
+    'Das', 'Bose', 'Mehta', 'Joshi', 'Khan', 'Chopra', 'Malhotra', 'Pillai', 'Menon', 'Yadav',
+]
+# (city, state, pincode prefix)
+PLACES = [
+    ('Mumbai', 'Maharashtra', '400'), ('Pune', 'Maharashtra', '411'), ('Delhi', 'Delhi', '110'),
+    ('Bengaluru', 'Karnataka', '560'), ('Chennai', 'Tamil Nadu', '600'), ('Hyderabad', 'Telangana', '500'),
+    ('Kolkata', 'West Bengal', '700'), ('Ahmedabad', 'Gujarat', '380'), ('Jaipur', 'Rajasthan', '302'),
+    ('Lucknow', 'Uttar Pradesh', '226'), ('Kochi', 'Kerala', '682'), ('Bhopal', 'Madhya Pradesh', '462'),
+]
+STREETS = ['MG Road', 'Station Road', 'Gandhi Nagar', 'Nehru Street', 'Park Street', 'Lake View', 'Temple Road']
+RELATIONS = ['Spouse', 'Father', 'Mother', 'Son', 'Daughter', 'Brother', 'Sister']
+# (account type, weight); scheme types are drawn uniformly
+ACCOUNT_MIX = [('SAVINGS', 60), ('CURRENT', 20), ('FIXED_DEPOSIT', 12), ('RECURRING_DEPOSIT', 8)]
+SCHEMES = [code for code, _ in AccountDetails.SCHEME_TYPES]
+BRANCHES = [f'BR{n:04d}' for n in range(1, 41)]
+
+
+def parse_scale(value):
+    """'10k', '100k', '1m' or a plain number of customers"""
+    value = str(value).lower()
+    return SCALES[value] if value in SCALES else int(value)
+
+
+def _pan(index):
+    letters = []
+    n = index // 10_000
+    for _ in range(5):
+        n, r = divmod(n, 26)
+        letters.append(string.ascii_uppercase[r])
+    return ''.join(letters) + f'{index % 10_000:04d}' + string.ascii_uppercase[index % 26]
+
+
+def _mobile(rng):
+    return f'{rng.choice("6789")}{rng.randrange(10**9):09d}'
+
+
+def make_customer(index, seed=0):
+    """Unsaved instances of all four models for customer number ``index``"""
+    rng = random.Random(index * 7919 + seed)
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    city, state, prefix = rng.choice(PLACES)
+    born = date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 55))
+
+    personal = PersonalDetails(
+        first_name=first,
+        last_name=last,
+        date_of_birth=born,
+        gender=rng.choices('MFO', [49, 49, 2])[0],
+        # Unique columns encode the index; the rest is random noise
+        mobile_number=f'{6 + index // 10**9}{index % 10**9:09d}',
+        email_id=f'{first.lower()}.{last.lower()}.{index}@example.com',
+        address1=f'{rng.randrange(1, 999)} {rng.choice(STREETS)}',
+        address2=None if rng.random() < 0.6 else f'Near {rng.choice(STREETS)}',
+        pincode=f'{prefix}{rng.randrange(1000):03d}',
+        city=city,
+        state=state,
+        aadhar_number=f'{2 + index // 10**11}{index % 10**11:011d}',
+        pan_card_number=_pan(index),
+    )
+    family = FamilyDetails(
+        spouse_name=f'{rng.choice(FIRST_NAMES)} {last}' if rng.random() < 0.6 else None,
+        children_count=rng.choice([0, 0, 1, 2, 2, 3]),
+        father_name=f'{rng.choice(FIRST_NAMES)} {last}',
+        mother_name=f'{rng.choice(FIRST_NAMES)} {last}',
+        emergency_contact_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+        emergency_contact_relation=rng.choice(RELATIONS),
+        emergency_contact_mobile=_mobile(rng),
+    )
+    nominee = NomineeDetails(
+        nominee_name=f'{rng.choice(FIRST_NAMES)} {last}',
+        nominee_relation=rng.choice(RELATIONS),
+        nominee_date_of_birth=date(1950, 1, 1) + timedelta(days=rng.randrange(365 * 70)),
+        nominee_mobile_number=_mobile(rng),
+        nominee_address=personal.address1,
+        nominee_aadhar_number=f'{rng.randrange(2 * 10**11, 10**12)}',
+        nominee_pan_card_number=_pan(rng.randrange(10**9)),
+    )
+    account_type = rng.choices([t for t, _ in ACCOUNT_MIX], [w for _, w in ACCOUNT_MIX])[0]
+    deposit = Decimal(rng.choice([500, 1000, 5000, 10000, 25000, 100000])) + Decimal(rng.randrange(100)) / 100
+    account = AccountDetails(
+        account_type=account_type,
+        scheme_type=rng.choice(SCHEMES),
+        deposit_amount=deposit,
+        branch_code=rng.choice(BRANCHES),
+        is_approved=rng.random() < 0.8,
+    )
+    return {'personal': personal, 'family': family, 'nominee': nominee, 'account': account}
+
+
+def generate(count, start=0, chunk_size=2000, seed=0, progress=None):
+    """
+    Insert customers ``start`` .. ``start + count - 1``; returns rows per second.
+    ``progress(done, total)`` is called after every chunk.
+    """
+    started = time.perf_counter()
+    done = 0
+    for offset in range(start, start + count, chunk_size):
+        stop = min(offset + chunk_size, start + count)
+        write_chunk([(None, make_customer(index, seed)) for index in range(offset, stop)])
+        run_pending()
+        done += stop - offset
+        if progress:
+            progress(done, count)
+    elapsed = time.perf_counter() - started
+    return done / elapsed if elapsed else 0.0
+
+
+def ensure_customers(count, **kwargs):
+    """Top the database up to ``count`` generated customers; returns how many were added"""
+    existing = PersonalDetails.objects.count()
+    if existing >= count:
+        return 0
+    generate(count - existing, start=existing, **kwargs)
+    return count - existing
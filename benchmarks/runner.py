@@ -0,0 +1,158 @@
+import json
+import platform
+import subprocess
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+
+import django
+from django.db import connections
+from django.test import Client
+
+from .scenarios import SCENARIOS, build_context
+
+
+class QueryCounter:
+    """execute_wrapper hook counting the queries of one operation"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(timings, queries, statuses, requests):
+    timings = sorted(timings)
+    return {
+        'iterations': len(timings),
+        'requests_per_op': requests,
+        'mean_ms': round(sum(timings) / len(timings), 3) if timings else 0.0,
+        'min_ms': round(timings[0], 3) if timings else 0.0,
+        'p50_ms': round(percentile(timings, 0.50), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'max_ms': round(timings[-1], 3) if timings else 0.0,
+        'queries_mean': round(sum(queries) / len(queries), 2) if queries else 0.0,
+        'queries_max': max(queries, default=0),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+    }
+
+
+def run_scenario(name, context, iterations, warmup):
+    operation, staff, cleanup = SCENARIOS[name]
+    client = Client()
+    if staff:
+        client.force_login(context['staff'])
+
+    timings = []
+    queries = []
+    statuses = {}
+    requests = 0
+    for iteration in range(warmup + iterations):
+        counter = QueryCounter()
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            started = time.perf_counter()
+            responses = operation(client, context, iteration)
+            elapsed = (time.perf_counter() - started) * 1000
+        if iteration < warmup:
+            continue
+        timings.append(elapsed)
+        queries.append(counter.count)
+        requests = len(responses)
+        for response in responses:
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    if cleanup:
+        cleanup(context)
+    return summarize(timings, queries, statuses, requests)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scenarios=None, iterations=30, warmup=3, seed=0, meta=None, progress=None,
+        concurrency=None, rounds=10, workers=4, startup=None):
+    """
+    Run the named scenarios (default all) and return the results document.
+    With ``concurrency`` the sync and async search paths are also compared
+    under bursts of that many simultaneous requests; with ``startup`` that
+    many fresh processes are started cold and warmed up (benchmarks.startup).
+    """
+    context = build_context(seed)
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connections['default'].vendor,
+            'customers': context['total'],
+            'iterations': iterations,
+            'warmup': warmup,
+            'seed': seed,
+            **(meta or {}),
+        },
+        'scenarios': {},
+    }
+    for name in SCENARIOS if scenarios is None else scenarios:
+        results['scenarios'][name] = run_scenario(name, context, iterations, warmup)
+        if progress:
+            progress(name, results['scenarios'][name])
+    if concurrency:
+        from .concurrency import compare as compare_concurrency
+
+        results['concurrency'] = compare_concurrency(context, concurrency, rounds, workers)
+    if startup:
+        from .startup import measure as measure_startup
+
+        results['startup'] = measure_startup(context['personal_ids'], startup)
+    return results
+
+
+def compare(baseline, current, threshold=1.25):
+    """
+    Compare two results documents scenario by scenario. Returns a list of
+    (scenario, baseline p50, current p50, ratio, query delta, regressed)
+    where a regression is a p50 slower by more than ``threshold`` times or
+    any increase in queries per operation.
+    """
+    rows = []
+    for name, now in current['scenarios'].items():
+        before = baseline['scenarios'].get(name)
+        if before is None:
+            continue
+        ratio = now['p50_ms'] / before['p50_ms'] if before['p50_ms'] else float('inf')
+        query_delta = now['queries_mean'] - before['queries_mean']
+        rows.append((name, before['p50_ms'], now['p50_ms'], ratio, query_delta, ratio > threshold or query_delta > 0))
+    return rows
+
+
+def load(path):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def save(results, path):
+    with open(path, 'w') as handle:
+        json.dump(results, handle, indent=2)
+        handle.write('\n')
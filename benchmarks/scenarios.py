@@ -0,0 +1,139 @@
+"""
+Benchmark scenarios. Each one is a function ``(client, context, iteration)``
+performing one user-level operation through the Django test client; the
+runner times it and counts its queries. Responses are returned so the
+runner can record their status codes.
+"""
+
+from django.contrib.auth import get_user_model
+from django.db.models import Max, Min
+
+from accounts import onboarding
+from accounts.models import PersonalDetails
+from accounts.pagination import encode_cursor
+
+from .generator import make_customer
+
+# Onboarding creates customers from this index upwards, far above any generated book
+ONBOARDING_INDEX = 900_000_000
+SAMPLE_SIZE = 200
+STAFF_USERNAME = 'bench'
+
+
+def build_context(seed=0):
+    """Sample ids, search terms and a deep dashboard cursor from the current book"""
+    total = PersonalDetails.objects.count()
+    bounds = PersonalDetails.objects.aggregate(low=Min('pk'), high=Max('pk'))
+    low, high = bounds['low'] or 0, bounds['high'] or 0
+    step = max((high - low) // SAMPLE_SIZE, 1)
+    sample = list(
+        PersonalDetails.objects.filter(pk__in=range(low, high + 1, step)).order_by('pk')
+        .values_list('pk', 'first_name', 'account_number', 'mobile_number')[:SAMPLE_SIZE]
+    )
+    middle = (
+        PersonalDetails.objects.order_by('-created_at', '-id')
+        .values_list('created_at', 'id')[total // 2:total // 2 + 1]
+    )
+
+    User = get_user_model()
+    staff = User.objects.filter(username=STAFF_USERNAME).first()
+    if staff is None:
+        staff = User.objects.create_superuser(STAFF_USERNAME, 'bench@example.com', STAFF_USERNAME)
+    return {
+        'total': total,
+        'seed': seed,
+        'personal_ids': [row[0] for row in sample],
+        'name_prefixes': [row[1][:3] for row in sample],
+        'account_numbers': [row[2] for row in sample],
+        'mobiles': [row[3] for row in sample],
+        'deep_cursor': encode_cursor(*middle[0]) if middle else None,
+        'staff': staff,
+        'onboarded': [],
+    }
+
+
+def _pick(values, iteration):
+    return values[iteration % len(values)]
+
+
+def dashboard_first_page(client, context, iteration):
+    return [client.get('/dashboard/')]
+
+
+def dashboard_deep_page(client, context, iteration):
+    return [client.get('/dashboard/', {'after': context['deep_cursor']} if context['deep_cursor'] else {})]
+
+
+def search_name(client, context, iteration):
+    return [client.post('/search-accounts/', {'search_term': _pick(context['name_prefixes'], iteration)})]
+
+
+def search_account_number(client, context, iteration):
+    return [client.post('/search-accounts/', {'search_term': _pick(context['account_numbers'], iteration)})]
+
+
+def search_mobile(client, context, iteration):
+    return [client.post('/search-accounts/', {'search_term': _pick(context['mobiles'], iteration)[-6:]})]
+
+
+def account_summary(client, context, iteration):
+    """Rotates through the sample, so most views miss the customer cache"""
+    return [client.get(f"/account-summary/{_pick(context['personal_ids'], iteration)}/")]
+
+
+def account_detail_cached(client, context, iteration):
+    """The same customer every time, served from the customer cache after the first view"""
+    return [client.get(f"/account-detail/{context['personal_ids'][0]}/")]
+
+
+def _step_data(instance, step):
+    data = {}
+    for name in onboarding.STEP_FORMS[step].base_fields:
+        value = getattr(instance, name)
+        if value is not None:
+            data[name] = value.isoformat() if hasattr(value, 'isoformat') else str(value)
+    return data
+
+
+def onboarding_wizard(client, context, iteration):
+    """All four wizard steps for a fresh customer; the last one creates it"""
+    instances = make_customer(ONBOARDING_INDEX + context['seed'] * 100_000 + iteration, context['seed'])
+    responses = [
+        client.post(f'/{step}-details/', _step_data(instances[step], step))
+        for step in onboarding.STEP_ORDER
+    ]
+    context['onboarded'].append(instances['personal'].email_id)
+    return responses
+
+
+def cleanup_onboarding(context):
+    PersonalDetails.objects.filter(email_id__in=context['onboarded']).delete()
+    context['onboarded'] = []
+
+
+def admin_personal_changelist(client, context, iteration):
+    return [client.get('/admin/accounts/personaldetails/')]
+
+
+def admin_account_changelist(client, context, iteration):
+    return [client.get('/admin/accounts/accountdetails/')]
+
+
+def admin_personal_search(client, context, iteration):
+    return [client.get('/admin/accounts/personaldetails/', {'q': _pick(context['name_prefixes'], iteration)})]
+
+
+# name -> (operation, needs a staff login, cleanup run after the scenario)
+SCENARIOS = {
+    'dashboard_first_page': (dashboard_first_page, False, None),
+    'dashboard_deep_page': (dashboard_deep_page, False, None),
+    'search_name': (search_name, False, None),
+    'search_account_number': (search_account_number, False, None),
+    'search_mobile': (search_mobile, False, None),
+    'account_summary': (account_summary, False, None),
+    'account_detail_cached': (account_detail_cached, False, None),
+    'onboarding_wizard': (onboarding_wizard, False, cleanup_onboarding),
+    'admin_personal_changelist': (admin_personal_changelist, True, None),
+    'admin_account_changelist': (admin_account_changelist, True, None),
+    'admin_personal_search': (admin_personal_search, True, None),
+}
@@ -0,0 +1,97 @@
+"""
+Cold-start benchmark: how long a fresh web worker takes to serve its first
+requests, with and without bank_system.warmup.
+
+Each run starts a new interpreter (``python -m benchmarks.startup``) that
+loads the WSGI application the way a gunicorn worker does, optionally warms
+up, then requests a few pages twice through the test client. The first
+request to each page carries whatever the process has not loaded yet; the
+second shows the steady state. Runs alternate between cold and warmed
+processes and the medians are reported.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PATHS = ['/', '/personal-details/', '/dashboard/', '/account-summary/{personal_id}/']
+
+
+def child(warm, personal_id):
+    started = time.perf_counter()
+    from django.core.wsgi import get_wsgi_application
+
+    get_wsgi_application()
+    loaded = time.perf_counter()
+    if warm:
+        from bank_system import warmup
+
+        warmup.warm_up()
+    ready = time.perf_counter()
+
+    from django.test import Client
+
+    client = Client()
+    first, second = {}, {}
+    for template in PATHS:
+        path = template.format(personal_id=personal_id)
+        for timings in (first, second):
+            request_started = time.perf_counter()
+            response = client.get(path)
+            timings[template] = (time.perf_counter() - request_started) * 1000
+            if response.status_code >= 400:
+                raise SystemExit(f'{path} returned {response.status_code}')
+    return {
+        'application_ms': (loaded - started) * 1000,
+        'warm_up_ms': (ready - loaded) * 1000,
+        'first_request_ms': first,
+        'second_request_ms': second,
+    }
+
+
+def _median(runs, key):
+    return round(statistics.median(run[key] for run in runs), 3)
+
+
+def _summary(runs):
+    return {
+        'runs': len(runs),
+        'application_ms': _median(runs, 'application_ms'),
+        'warm_up_ms': _median(runs, 'warm_up_ms'),
+        'first_request_ms': {
+            path: round(statistics.median(run['first_request_ms'][path] for run in runs), 3) for path in PATHS
+        },
+        'second_request_ms': {
+            path: round(statistics.median(run['second_request_ms'][path] for run in runs), 3) for path in PATHS
+        },
+        # From process start until every page has been served once
+        'time_to_all_pages_ms': round(statistics.median(
+            run['application_ms'] + run['warm_up_ms'] + sum(run['first_request_ms'].values()) for run in runs
+        ), 3),
+    }
+
+
+def measure(personal_ids, runs=5):
+    """Median cold and warmed start-up timings over ``runs`` processes each"""
+    results = {'cold': [], 'warm': []}
+    for run in range(runs):
+        for mode in ('cold', 'warm'):
+            # A different customer per process, so the summary page is not served from the fragment cache
+            personal_id = personal_ids[(2 * run + (mode == 'warm')) % len(personal_ids)]
+            completed = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.startup', mode, str(personal_id)],
+                capture_output=True, text=True, env=dict(os.environ),
+                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            )
+            if completed.returncode:
+                raise RuntimeError(f'Start-up run failed:\n{completed.stderr[-2000:]}')
+            results[mode].append(json.loads(completed.stdout.strip().splitlines()[-1]))
+    return {mode: _summary(mode_runs) for mode, mode_runs in results.items()}
+
+
+if __name__ == '__main__':
+    # Child process: BENCH_DB and DJANGO_SETTINGS_MODULE come from the parent
+    print(json.dumps(child(sys.argv[1] == 'warm', int(sys.argv[2]))))
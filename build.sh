@@ -4,6 +4,7 @@ set -o errexit
 
 pip install -r requirements.txt
 
+# Minified, content-hashed and gzip/brotli-compressed copies of static/ plus their manifest
 python manage.py collectstatic --no-input
 python manage.py migrate
 
@@ -0,0 +1,45 @@
+"""
+gunicorn settings, read automatically from the working directory (Procfile,
+render.yaml). Workers come from WEB_CONCURRENCY as usual.
+
+The application is imported and warmed up (bank_system.warmup) once in the
+master before workers are forked, so each new worker starts with the views
+imported, the templates compiled and the lookup tables built, and only has
+to open its own database and cache connections before taking traffic. Set
+GUNICORN_PRELOAD=false to load the application in each worker instead (the
+workers then do the whole warm-up themselves).
+"""
+
+import gc
+import os
+
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() in ('1', 'true', 'yes')
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from django.db import connections
+
+    from bank_system import warmup
+
+    timings = warmup.warm_up(connect=False)
+    server.log.info('Warmed up the application in %.1f ms: %s', sum(timings.values()), timings)
+    # Forked workers must not inherit connections opened while warming up
+    connections.close_all()
+    # Leave the warmed-up objects out of garbage collection, whose passes would write to (and so copy) their memory in every worker
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    from bank_system import warmup
+
+    timings = warmup.warm_up()
+    worker.log.info('Worker %s ready in %.1f ms: %s', worker.pid, sum(timings.values()), timings)
+
+
+def worker_exit(server, worker):
+    from accounts import audit
+
+    # Buffered audit entries are written (or spooled) before the worker goes
+    audit.shutdown()
@@ -116,7 +116,34 @@ function initializeFormValidations() {
             if (this.value.length > 6) {
                 this.value = this.value.slice(0, 6);
             }
+            if (this.value.length === 6) {
+                autofillPlace(this);
+            }
+        });
+    });
+}
+
+function autofillPlace(pincodeField) {
+    // City/state come from the in-memory pincode directory; fields the user typed are left alone
+    const form = pincodeField.form;
+    if (!form) return;
+    const targets = ['city', 'state']
+        .map(part => form.querySelector(`[name="${pincodeField.name.replace('pincode', part)}"]`));
+    fetch(`/api/pincodes/${pincodeField.value}/`)
+    .then(response => response.ok ? response.json() : null)
+    .then(data => {
+        if (!data) return;
+        [data.city, data.state].forEach((value, i) => {
+            const target = targets[i];
+            if (target && (!target.value || target.dataset.autofilled)) {
+                target.value = value;
+                target.dataset.autofilled = 'true';
+                clearFieldError(target);
+            }
         });
+    })
+    .catch(error => {
+        console.error('Pincode lookup error:', error);
     });
 }
 
@@ -235,14 +262,8 @@ function initializeSearch() {
 }
 
 function performSearch(searchTerm) {
-    fetch('/search-accounts/', {
-        method: 'POST',
-        headers: {
-            'Content-Type': 'application/x-www-form-urlencoded',
-            'X-CSRFToken': getCookie('csrftoken')
-        },
-        body: `search_term=${encodeURIComponent(searchTerm)}`
-    })
+    // Served by the async API so typeahead bursts don't hold a worker each
+    fetch(`/api/search/?q=${encodeURIComponent(searchTerm)}`)
     .then(response => response.json())
     .then(data => {
         displaySearchResults(data.results);
@@ -374,6 +395,12 @@ function hideLoading(element, originalContent) {
 function initializeAutoSave() {
     const forms = document.querySelectorAll('form');
     forms.forEach(form => {
+        // Onboarding steps keep their draft on the server
+        if (form.dataset.draftUrl) {
+            initializeServerDraft(form);
+            return;
+        }
+        
         const formData = new FormData(form);
         const formKey = form.action || form.id || 'form_' + Math.random();
         
@@ -418,6 +445,24 @@ document.addEventListener('DOMContentLoaded', function() {
     initializeAutoSave();
 });
 
+// Save an onboarding step to the server-side draft shortly after typing stops
+function initializeServerDraft(form) {
+    let timer = null;
+    const saveDraft = () => {
+        fetch(form.dataset.draftUrl, {
+            method: 'POST',
+            body: new FormData(form),
+            headers: { 'X-Requested-With': 'XMLHttpRequest' }
+        }).catch(error => console.error('Draft save failed:', error));
+    };
+    
+    form.addEventListener('input', () => {
+        clearTimeout(timer);
+        timer = setTimeout(saveDraft, 1000);
+    });
+    form.addEventListener('submit', () => clearTimeout(timer));
+}
+
 // Smooth scrolling for anchor links
 document.querySelectorAll('a[href^="#"]').forEach(anchor => {
     anchor.addEventListener('click', function (e) {
@@ -437,10 +482,16 @@ function printAccountDetails() {
     window.print();
 }
 
-// Export functionality (placeholder)
+// Export functionality (streams the full customer book from the server)
 function exportAccountData(format = 'pdf') {
+    const serverFormats = { excel: 'csv', csv: 'csv', json: 'ndjson' };
+    const serverFormat = serverFormats[format];
+    if (!serverFormat) {
+        showNotification(`${format.toUpperCase()} export is not available yet. Use Export Excel for a CSV download.`, 'warning');
+        return;
+    }
     showNotification(`Exporting account data in ${format.toUpperCase()} format...`, 'info');
-    // Implementation would depend on backend support
+    window.location.href = `/export-accounts/?format=${serverFormat}`;
 }
 
 // Theme toggle (if needed)